@@ -0,0 +1,31 @@
+"""Add partial index on documents.approved_at
+
+Revision ID: add_approved_at_index
+Revises: add_multi_session_messages_session_id_index
+Create Date: 2026-10-15
+
+Backs the admin dashboard's "approved today" count
+(approved_at >= start of day), turning it into an index range scan over
+today's approvals instead of a sequential scan of documents.
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = 'add_approved_at_index'
+down_revision = 'add_multi_session_messages_session_id_index'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    with op.get_context().autocommit_block():
+        op.execute(
+            "CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_documents_approved_at "
+            "ON documents (approved_at DESC) WHERE is_approved = true"
+        )
+
+
+def downgrade() -> None:
+    with op.get_context().autocommit_block():
+        op.execute("DROP INDEX CONCURRENTLY IF EXISTS ix_documents_approved_at")
@@ -0,0 +1,36 @@
+"""Add unique lower(name) index on document_categories
+
+Revision ID: add_category_name_lower_index
+Revises: add_user_profiles_created_at_index
+Create Date: 2026-10-15
+
+Category names are unique case-insensitively. An expression index on
+lower(name) lets the database enforce that in a single index probe
+instead of the endpoints scanning with func.lower() first.
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'add_category_name_lower_index'
+down_revision = 'add_user_profiles_created_at_index'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    # document_categories may still be created lazily by the admin endpoints
+    if not sa.inspect(op.get_bind()).has_table('document_categories'):
+        return
+
+    with op.get_context().autocommit_block():
+        op.execute(
+            "CREATE UNIQUE INDEX CONCURRENTLY IF NOT EXISTS ix_document_categories_name_lower "
+            "ON document_categories (lower(name))"
+        )
+
+
+def downgrade() -> None:
+    with op.get_context().autocommit_block():
+        op.execute("DROP INDEX CONCURRENTLY IF EXISTS ix_document_categories_name_lower")
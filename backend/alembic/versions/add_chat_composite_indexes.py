@@ -0,0 +1,46 @@
+"""Add composite indexes for the chat read paths
+
+Revision ID: add_chat_composite_indexes
+Revises: add_multi_session_messages_created_index
+Create Date: 2026-10-15
+
+- multi_document_sessions (user_id, updated_at DESC): the session list
+  filters by user and orders by last update.
+- document_embeddings (document_id, page_number): full-document reads
+  fetch one document's chunks in page order.
+- chat_messages (session_id, created_at): chat history per session in
+  message order; session_id had no index at all.
+
+With these the ORDER BY is served by the index scan instead of a sort.
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = 'add_chat_composite_indexes'
+down_revision = 'add_multi_session_messages_created_index'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    with op.get_context().autocommit_block():
+        op.execute(
+            "CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_multi_document_sessions_user_updated "
+            "ON multi_document_sessions (user_id, updated_at DESC)"
+        )
+        op.execute(
+            "CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_document_embeddings_document_page "
+            "ON document_embeddings (document_id, page_number)"
+        )
+        op.execute(
+            "CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_chat_messages_session_created "
+            "ON chat_messages (session_id, created_at)"
+        )
+
+
+def downgrade() -> None:
+    with op.get_context().autocommit_block():
+        op.execute("DROP INDEX CONCURRENTLY IF EXISTS ix_chat_messages_session_created")
+        op.execute("DROP INDEX CONCURRENTLY IF EXISTS ix_document_embeddings_document_page")
+        op.execute("DROP INDEX CONCURRENTLY IF EXISTS ix_multi_document_sessions_user_updated")
@@ -0,0 +1,44 @@
+"""Add composite index for a user's latest chat session per document
+
+Revision ID: add_chat_sessions_user_updated_index
+Revises: add_user_profiles_admins_index
+Create Date: 2026-10-15
+
+- chat_sessions (user_id, document_id, updated_at DESC): chat history picks
+  the user's most recent session for a document; the index returns it as
+  the first entry of a range scan. It also serves every user_id-only
+  lookup, so ix_chat_sessions_user_id is dropped.
+- chat_sessions (document_id): deleting a document removes its sessions
+  and their messages by document_id, which had no index.
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = 'add_chat_sessions_user_updated_index'
+down_revision = 'add_user_profiles_admins_index'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    with op.get_context().autocommit_block():
+        op.execute(
+            "CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_chat_sessions_user_document_updated "
+            "ON chat_sessions (user_id, document_id, updated_at DESC)"
+        )
+        op.execute(
+            "CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_chat_sessions_document_id "
+            "ON chat_sessions (document_id)"
+        )
+        op.execute("DROP INDEX CONCURRENTLY IF EXISTS ix_chat_sessions_user_id")
+
+
+def downgrade() -> None:
+    with op.get_context().autocommit_block():
+        op.execute(
+            "CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_chat_sessions_user_id "
+            "ON chat_sessions (user_id)"
+        )
+        op.execute("DROP INDEX CONCURRENTLY IF EXISTS ix_chat_sessions_document_id")
+        op.execute("DROP INDEX CONCURRENTLY IF EXISTS ix_chat_sessions_user_document_updated")
@@ -0,0 +1,67 @@
+"""Create document_categories and the documents.document_type/category_id columns
+
+Revision ID: add_document_categories
+Revises: add_embedding_hnsw_index
+Create Date: 2026-10-15
+
+This schema used to be created lazily by ensure_categories_table and
+ensure_document_type_columns on admin requests. Every statement uses
+IF NOT EXISTS so databases that already went through that path upgrade
+cleanly.
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = 'add_document_categories'
+down_revision = 'add_embedding_hnsw_index'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.execute("""
+        CREATE TABLE IF NOT EXISTS document_categories (
+            id UUID PRIMARY KEY DEFAULT gen_random_uuid(),
+            name VARCHAR(100) UNIQUE NOT NULL,
+            description VARCHAR(500),
+            is_active BOOLEAN DEFAULT true,
+            created_at TIMESTAMP DEFAULT now(),
+            created_by UUID
+        )
+    """)
+    op.execute("CREATE INDEX IF NOT EXISTS ix_document_categories_name ON document_categories (name)")
+    op.execute("CREATE INDEX IF NOT EXISTS ix_document_categories_is_active ON document_categories (is_active)")
+    op.execute(
+        "CREATE UNIQUE INDEX IF NOT EXISTS ix_document_categories_name_lower "
+        "ON document_categories (lower(name))"
+    )
+
+    op.execute("""
+        ALTER TABLE documents
+            ADD COLUMN IF NOT EXISTS document_type VARCHAR(20) DEFAULT 'course',
+            ADD COLUMN IF NOT EXISTS category_id UUID REFERENCES document_categories(id)
+    """)
+
+    with op.get_context().autocommit_block():
+        op.execute(
+            "CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_documents_category_id "
+            "ON documents (category_id)"
+        )
+        op.execute(
+            "CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_documents_document_type "
+            "ON documents (document_type)"
+        )
+
+
+def downgrade() -> None:
+    with op.get_context().autocommit_block():
+        op.execute("DROP INDEX CONCURRENTLY IF EXISTS ix_documents_document_type")
+        op.execute("DROP INDEX CONCURRENTLY IF EXISTS ix_documents_category_id")
+
+    op.execute("""
+        ALTER TABLE documents
+            DROP COLUMN IF EXISTS category_id,
+            DROP COLUMN IF EXISTS document_type
+    """)
+    op.execute("DROP TABLE IF EXISTS document_categories")
@@ -0,0 +1,39 @@
+"""Add HNSW and document_id indexes on document_embeddings
+
+Revision ID: add_embedding_hnsw_index
+Revises: add_category_name_lower_index
+Create Date: 2026-10-15
+
+RAG lookups order chunks by cosine distance to the query embedding.
+Without an ANN index every lookup is a sequential scan plus sort over the
+embeddings. The HNSW index (vector_cosine_ops, matching cosine_distance)
+turns this into an approximate k-NN scan. The document_id btree serves
+the per-document filter and the full-document reads.
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = 'add_embedding_hnsw_index'
+down_revision = 'add_category_name_lower_index'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    with op.get_context().autocommit_block():
+        op.execute(
+            "CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_document_embeddings_document_id "
+            "ON document_embeddings (document_id)"
+        )
+        op.execute(
+            "CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_document_embeddings_embedding_hnsw "
+            "ON document_embeddings USING hnsw (embedding vector_cosine_ops) "
+            "WITH (m = 16, ef_construction = 64)"
+        )
+
+
+def downgrade() -> None:
+    with op.get_context().autocommit_block():
+        op.execute("DROP INDEX CONCURRENTLY IF EXISTS ix_document_embeddings_embedding_hnsw")
+        op.execute("DROP INDEX CONCURRENTLY IF EXISTS ix_document_embeddings_document_id")
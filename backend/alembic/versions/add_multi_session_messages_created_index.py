@@ -0,0 +1,31 @@
+"""Add (session_id, created_at) index on multi_session_messages
+
+Revision ID: add_multi_session_messages_created_index
+Revises: add_document_categories
+Create Date: 2026-10-15
+
+Session messages are always read per session in created_at order. The
+composite index returns them pre-sorted, so Postgres can skip the sort
+step; it also covers the plain session_id lookups.
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = 'add_multi_session_messages_created_index'
+down_revision = 'add_document_categories'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    with op.get_context().autocommit_block():
+        op.execute(
+            "CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_multi_session_messages_session_created "
+            "ON multi_session_messages (session_id, created_at)"
+        )
+
+
+def downgrade() -> None:
+    with op.get_context().autocommit_block():
+        op.execute("DROP INDEX CONCURRENTLY IF EXISTS ix_multi_session_messages_session_created")
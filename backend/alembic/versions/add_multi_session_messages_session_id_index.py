@@ -0,0 +1,32 @@
+"""Index multi_session_messages.session_id
+
+Revision ID: add_multi_session_messages_session_id_index
+Revises: add_pending_queue_index
+Create Date: 2026-10-15
+
+The FK column had no index, so every ON DELETE CASCADE from
+multi_document_sessions and every per-session message read was a
+sequential scan. New installs get the index from bc35b3193593; this
+revision backfills it on existing databases without blocking writes.
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = 'add_multi_session_messages_session_id_index'
+down_revision = 'add_pending_queue_index'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    with op.get_context().autocommit_block():
+        op.execute(
+            "CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_multi_session_messages_session_id "
+            "ON multi_session_messages (session_id)"
+        )
+
+
+def downgrade() -> None:
+    with op.get_context().autocommit_block():
+        op.execute("DROP INDEX CONCURRENTLY IF EXISTS ix_multi_session_messages_session_id")
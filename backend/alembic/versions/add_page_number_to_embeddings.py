@@ -23,11 +23,16 @@ def upgrade() -> None:
     op.add_column('document_embeddings',
         sa.Column('page_number', sa.Integer(), nullable=True, server_default='0')
     )
-    # Create index for efficient ordering by page_number
-    op.create_index('ix_document_embeddings_page_number',
-        'document_embeddings', ['page_number'])
+    # Create index for efficient ordering by page_number.
+    # Built CONCURRENTLY so large embedding tables stay writable during the build.
+    with op.get_context().autocommit_block():
+        op.execute(
+            "CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_document_embeddings_page_number "
+            "ON document_embeddings (page_number)"
+        )
 
 
 def downgrade() -> None:
-    op.drop_index('ix_document_embeddings_page_number', table_name='document_embeddings')
+    with op.get_context().autocommit_block():
+        op.execute("DROP INDEX CONCURRENTLY IF EXISTS ix_document_embeddings_page_number")
     op.drop_column('document_embeddings', 'page_number')
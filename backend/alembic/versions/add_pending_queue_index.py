@@ -0,0 +1,36 @@
+"""Add partial index for the pending-documents queue
+
+Revision ID: add_pending_queue_index
+Revises: add_page_number, add_flashcard_review_history
+Create Date: 2026-10-15
+
+The admin review queue filters on visibility='public', is_approved=false and
+status='completed' and orders by created_at. The single-column indexes on
+visibility / is_approved cannot serve that predicate and sort in one scan,
+so this partial composite index matches the query shape exactly.
+
+This revision also merges the two heads that branched off
+add_query_limit_columns.
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = 'add_pending_queue_index'
+down_revision = ('add_page_number', 'add_flashcard_review_history')
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    with op.get_context().autocommit_block():
+        op.execute(
+            "CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_documents_pending_queue "
+            "ON documents (created_at, id) "
+            "WHERE visibility = 'public' AND is_approved = false AND status = 'completed'"
+        )
+
+
+def downgrade() -> None:
+    with op.get_context().autocommit_block():
+        op.execute("DROP INDEX CONCURRENTLY IF EXISTS ix_documents_pending_queue")
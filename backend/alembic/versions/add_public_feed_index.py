@@ -0,0 +1,32 @@
+"""Add partial index for the public document feed
+
+Revision ID: add_public_feed_index
+Revises: add_chat_composite_indexes
+Create Date: 2026-10-15
+
+The community library lists public, approved, completed documents newest
+first. Like the pending queue, the predicate is fixed, so a partial index on
+created_at DESC serves the filter and the ORDER BY ... LIMIT in one scan.
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = 'add_public_feed_index'
+down_revision = 'add_chat_composite_indexes'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    with op.get_context().autocommit_block():
+        op.execute(
+            "CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_documents_public_feed "
+            "ON documents (created_at DESC) "
+            "WHERE visibility = 'public' AND is_approved = true AND status = 'completed'"
+        )
+
+
+def downgrade() -> None:
+    with op.get_context().autocommit_block():
+        op.execute("DROP INDEX CONCURRENTLY IF EXISTS ix_documents_public_feed")
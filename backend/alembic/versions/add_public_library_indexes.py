@@ -0,0 +1,44 @@
+"""Add partial indexes for the community library filters
+
+Revision ID: add_public_library_indexes
+Revises: add_public_feed_index
+Create Date: 2026-10-15
+
+All community library queries share the predicate visibility='public',
+is_approved=true and status='completed', so these are partial indexes on
+that predicate like ix_documents_public_feed:
+
+- (course_name, topic, document_type): list_courses groups by course,
+  list_course_topics and the course/topic filters of list_public_documents
+  look up one course (and topic).
+- (category_id, created_at DESC): the category filter of
+  list_public_documents, already in display order.
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = 'add_public_library_indexes'
+down_revision = 'add_public_feed_index'
+branch_labels = None
+depends_on = None
+
+PUBLIC_LIBRARY = "visibility = 'public' AND is_approved = true AND status = 'completed'"
+
+
+def upgrade() -> None:
+    with op.get_context().autocommit_block():
+        op.execute(
+            "CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_documents_public_course_topic "
+            f"ON documents (course_name, topic, document_type) WHERE {PUBLIC_LIBRARY}"
+        )
+        op.execute(
+            "CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_documents_public_category "
+            f"ON documents (category_id, created_at DESC) WHERE {PUBLIC_LIBRARY}"
+        )
+
+
+def downgrade() -> None:
+    with op.get_context().autocommit_block():
+        op.execute("DROP INDEX CONCURRENTLY IF EXISTS ix_documents_public_category")
+        op.execute("DROP INDEX CONCURRENTLY IF EXISTS ix_documents_public_course_topic")
@@ -34,23 +34,31 @@ def upgrade() -> None:
     op.add_column('documents', sa.Column('approved_at', sa.DateTime(), nullable=True))
     op.add_column('documents', sa.Column('approved_by', postgresql.UUID(as_uuid=True), nullable=True))
 
-    # Create indexes for efficient queries
-    op.create_index('ix_documents_course_name', 'documents', ['course_name'])
-    op.create_index('ix_documents_topic', 'documents', ['topic'])
-    op.create_index('ix_documents_visibility', 'documents', ['visibility'])
-    op.create_index('ix_documents_is_approved', 'documents', ['is_approved'])
+    # Update existing records to have default visibility (single pass over documents)
+    op.execute(
+        "UPDATE documents SET "
+        "visibility = COALESCE(visibility, 'private'), "
+        "is_approved = COALESCE(is_approved, false) "
+        "WHERE visibility IS NULL OR is_approved IS NULL"
+    )
 
-    # Update existing records to have default visibility
-    op.execute("UPDATE documents SET visibility = 'private' WHERE visibility IS NULL")
-    op.execute("UPDATE documents SET is_approved = false WHERE is_approved IS NULL")
+    # Create indexes for efficient queries.
+    # CONCURRENTLY avoids blocking writes to documents while the indexes build;
+    # it cannot run inside a transaction, hence the autocommit block.
+    with op.get_context().autocommit_block():
+        op.execute("CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_documents_course_name ON documents (course_name)")
+        op.execute("CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_documents_topic ON documents (topic)")
+        op.execute("CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_documents_visibility ON documents (visibility)")
+        op.execute("CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_documents_is_approved ON documents (is_approved)")
 
 
 def downgrade() -> None:
     # Remove indexes
-    op.drop_index('ix_documents_is_approved', table_name='documents')
-    op.drop_index('ix_documents_visibility', table_name='documents')
-    op.drop_index('ix_documents_topic', table_name='documents')
-    op.drop_index('ix_documents_course_name', table_name='documents')
+    with op.get_context().autocommit_block():
+        op.execute("DROP INDEX CONCURRENTLY IF EXISTS ix_documents_is_approved")
+        op.execute("DROP INDEX CONCURRENTLY IF EXISTS ix_documents_visibility")
+        op.execute("DROP INDEX CONCURRENTLY IF EXISTS ix_documents_topic")
+        op.execute("DROP INDEX CONCURRENTLY IF EXISTS ix_documents_course_name")
 
     # Remove columns
     op.drop_column('documents', 'approved_by')
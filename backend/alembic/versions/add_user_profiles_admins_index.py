@@ -0,0 +1,33 @@
+"""Add partial index over admin profiles
+
+Revision ID: add_user_profiles_admins_index
+Revises: add_public_library_indexes
+Create Date: 2026-10-15
+
+The setup endpoints ask whether any admin exists on every frontend load.
+ix_user_profiles_role indexes every profile; this partial index holds only
+the admin rows, so the existence check reads a page or two regardless of
+how many users there are. ix_user_profiles_role stays for the admin user
+list's role filter.
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = 'add_user_profiles_admins_index'
+down_revision = 'add_public_library_indexes'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    with op.get_context().autocommit_block():
+        op.execute(
+            "CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_user_profiles_admins "
+            "ON user_profiles (id) WHERE role = 'admin'"
+        )
+
+
+def downgrade() -> None:
+    with op.get_context().autocommit_block():
+        op.execute("DROP INDEX CONCURRENTLY IF EXISTS ix_user_profiles_admins")
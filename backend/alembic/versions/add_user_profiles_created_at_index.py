@@ -0,0 +1,31 @@
+"""Add (created_at, id) index on user_profiles
+
+Revision ID: add_user_profiles_created_at_index
+Revises: use_native_enums
+Create Date: 2026-10-15
+
+Backs keyset pagination of the admin user list, which orders by
+(created_at DESC, id DESC). A btree can be scanned backwards, so one
+ascending index serves the descending order.
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = 'add_user_profiles_created_at_index'
+down_revision = 'use_native_enums'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    with op.get_context().autocommit_block():
+        op.execute(
+            "CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_user_profiles_created_at_id "
+            "ON user_profiles (created_at, id)"
+        )
+
+
+def downgrade() -> None:
+    with op.get_context().autocommit_block():
+        op.execute("DROP INDEX CONCURRENTLY IF EXISTS ix_user_profiles_created_at_id")
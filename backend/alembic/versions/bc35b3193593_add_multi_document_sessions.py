@@ -19,6 +19,10 @@ depends_on: Union[str, Sequence[str], None] = None
 
 def upgrade() -> None:
     """Upgrade schema."""
+    # Secondary indexes are declared on the tables themselves so they are
+    # built together with each (still empty) table instead of as separate
+    # CREATE INDEX steps afterwards.
+
     # Create multi_document_sessions table
     op.create_table('multi_document_sessions',
         sa.Column('id', sa.UUID(), nullable=False),
@@ -26,11 +30,11 @@ def upgrade() -> None:
         sa.Column('title', sa.String(length=255), nullable=False),
         sa.Column('created_at', sa.DateTime(), nullable=True),
         sa.Column('updated_at', sa.DateTime(), nullable=True),
-        sa.PrimaryKeyConstraint('id')
+        sa.PrimaryKeyConstraint('id'),
+        sa.Index('ix_multi_document_sessions_id', 'id'),
+        sa.Index('ix_multi_document_sessions_user_id', 'user_id')
     )
-    op.create_index(op.f('ix_multi_document_sessions_id'), 'multi_document_sessions', ['id'], unique=False)
-    op.create_index(op.f('ix_multi_document_sessions_user_id'), 'multi_document_sessions', ['user_id'], unique=False)
-    
+
     # Create multi_session_messages table
     op.create_table('multi_session_messages',
         sa.Column('id', sa.UUID(), nullable=False),
@@ -39,10 +43,12 @@ def upgrade() -> None:
         sa.Column('message', sa.Text(), nullable=False),
         sa.Column('created_at', sa.DateTime(), nullable=True),
         sa.ForeignKeyConstraint(['session_id'], ['multi_document_sessions.id'], ondelete='CASCADE'),
-        sa.PrimaryKeyConstraint('id')
+        sa.PrimaryKeyConstraint('id'),
+        sa.Index('ix_multi_session_messages_id', 'id'),
+        # FK column: lets ON DELETE CASCADE and per-session reads use an index
+        sa.Index('ix_multi_session_messages_session_id', 'session_id')
     )
-    op.create_index(op.f('ix_multi_session_messages_id'), 'multi_session_messages', ['id'], unique=False)
-    
+
     # Create multi_session_documents (many-to-many) table
     op.create_table('multi_session_documents',
         sa.Column('session_id', sa.UUID(), nullable=False),
@@ -55,9 +61,7 @@ def upgrade() -> None:
 
 def downgrade() -> None:
     """Downgrade schema."""
+    # Dropping a table drops its indexes with it
     op.drop_table('multi_session_documents')
-    op.drop_index(op.f('ix_multi_session_messages_id'), table_name='multi_session_messages')
     op.drop_table('multi_session_messages')
-    op.drop_index(op.f('ix_multi_document_sessions_user_id'), table_name='multi_document_sessions')
-    op.drop_index(op.f('ix_multi_document_sessions_id'), table_name='multi_document_sessions')
     op.drop_table('multi_document_sessions')
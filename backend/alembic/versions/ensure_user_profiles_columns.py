@@ -0,0 +1,35 @@
+"""Ensure user_profiles has its full column set
+
+Revision ID: ensure_user_profiles_columns
+Revises: store_embeddings_as_halfvec
+Create Date: 2026-10-15
+
+The user_profiles revisions (remove/re-add email, full_name, query limit
+columns) are applied as written. This revision only makes sure every
+column they add is present, in one ALTER TABLE so the ACCESS EXCLUSIVE
+lock is taken once. ADD COLUMN IF NOT EXISTS makes it a no-op on
+databases that already have them.
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = 'ensure_user_profiles_columns'
+down_revision = 'store_embeddings_as_halfvec'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.execute("""
+        ALTER TABLE user_profiles
+            ADD COLUMN IF NOT EXISTS full_name VARCHAR(100),
+            ADD COLUMN IF NOT EXISTS email VARCHAR(255),
+            ADD COLUMN IF NOT EXISTS daily_query_count INTEGER NOT NULL DEFAULT 0,
+            ADD COLUMN IF NOT EXISTS last_query_date DATE
+    """)
+
+
+def downgrade() -> None:
+    # The columns belong to the earlier revisions, whose downgrades drop them
+    pass
@@ -0,0 +1,53 @@
+"""Store document embeddings as halfvec(768)
+
+Revision ID: store_embeddings_as_halfvec
+Revises: add_chat_sessions_user_updated_index
+Create Date: 2026-10-15
+
+vector(768) takes 3 KiB per row; halfvec (fp16, pgvector >= 0.7) halves
+that for both the table and the HNSW index, so more of the index stays in
+memory and each k-NN scan reads half the bytes. Cosine ranking over
+Gemini embeddings is unaffected at fp16 precision.
+
+The HNSW index is built for vector_cosine_ops, so it is dropped before the
+column type changes and rebuilt with halfvec_cosine_ops afterwards. The
+ALTER rewrites the table under an exclusive lock.
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = 'store_embeddings_as_halfvec'
+down_revision = 'add_chat_sessions_user_updated_index'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    with op.get_context().autocommit_block():
+        op.execute("DROP INDEX CONCURRENTLY IF EXISTS ix_document_embeddings_embedding_hnsw")
+    op.execute(
+        "ALTER TABLE document_embeddings "
+        "ALTER COLUMN embedding TYPE halfvec(768) USING embedding::halfvec(768)"
+    )
+    with op.get_context().autocommit_block():
+        op.execute(
+            "CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_document_embeddings_embedding_hnsw "
+            "ON document_embeddings USING hnsw (embedding halfvec_cosine_ops) "
+            "WITH (m = 16, ef_construction = 64)"
+        )
+
+
+def downgrade() -> None:
+    with op.get_context().autocommit_block():
+        op.execute("DROP INDEX CONCURRENTLY IF EXISTS ix_document_embeddings_embedding_hnsw")
+    op.execute(
+        "ALTER TABLE document_embeddings "
+        "ALTER COLUMN embedding TYPE vector(768) USING embedding::vector(768)"
+    )
+    with op.get_context().autocommit_block():
+        op.execute(
+            "CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_document_embeddings_embedding_hnsw "
+            "ON document_embeddings USING hnsw (embedding vector_cosine_ops) "
+            "WITH (m = 16, ef_construction = 64)"
+        )
@@ -0,0 +1,82 @@
+"""Store visibility, status and role as PostgreSQL enums
+
+Revision ID: use_native_enums
+Revises: add_approved_at_index
+Create Date: 2026-10-15
+
+documents.visibility, documents.status and user_profiles.role were
+VARCHAR(20). Native enums are stored as 4-byte values and compared as
+integers, which shrinks their indexes and speeds up the equality filters
+used by the library, admin queue and role checks.
+
+Each table is altered in a single ALTER TABLE so the rewrite (and its
+ACCESS EXCLUSIVE lock) happens once per table.
+
+The partial ix_documents_pending_queue index is dropped before the type
+change and recreated after it. Otherwise the rebuild keeps its predicate
+as text comparisons (visibility::text = 'public'::text), which the
+planner can't match against enum filters.
+"""
+from alembic import op
+
+
+PENDING_QUEUE_INDEX = (
+    "CREATE INDEX IF NOT EXISTS ix_documents_pending_queue "
+    "ON documents (created_at, id) "
+    "WHERE visibility = 'public' AND is_approved = false AND status = 'completed'"
+)
+
+
+# revision identifiers, used by Alembic.
+revision = 'use_native_enums'
+down_revision = 'add_approved_at_index'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.execute("CREATE TYPE document_visibility AS ENUM ('private', 'public')")
+    op.execute("CREATE TYPE document_status AS ENUM ('pending', 'processing', 'completed', 'failed')")
+    op.execute("CREATE TYPE user_role AS ENUM ('user', 'teacher', 'admin')")
+
+    op.execute("DROP INDEX IF EXISTS ix_documents_pending_queue")
+    op.execute("""
+        ALTER TABLE documents
+            ALTER COLUMN visibility DROP DEFAULT,
+            ALTER COLUMN status DROP DEFAULT,
+            ALTER COLUMN visibility TYPE document_visibility USING visibility::document_visibility,
+            ALTER COLUMN status TYPE document_status USING status::document_status,
+            ALTER COLUMN visibility SET DEFAULT 'private',
+            ALTER COLUMN status SET DEFAULT 'pending'
+    """)
+    op.execute(PENDING_QUEUE_INDEX)
+    op.execute("""
+        ALTER TABLE user_profiles
+            ALTER COLUMN role DROP DEFAULT,
+            ALTER COLUMN role TYPE user_role USING role::user_role,
+            ALTER COLUMN role SET DEFAULT 'user'
+    """)
+
+
+def downgrade() -> None:
+    op.execute("""
+        ALTER TABLE user_profiles
+            ALTER COLUMN role DROP DEFAULT,
+            ALTER COLUMN role TYPE VARCHAR(20) USING role::text,
+            ALTER COLUMN role SET DEFAULT 'user'
+    """)
+    op.execute("DROP INDEX IF EXISTS ix_documents_pending_queue")
+    op.execute("""
+        ALTER TABLE documents
+            ALTER COLUMN visibility DROP DEFAULT,
+            ALTER COLUMN status DROP DEFAULT,
+            ALTER COLUMN visibility TYPE VARCHAR(20) USING visibility::text,
+            ALTER COLUMN status TYPE VARCHAR USING status::text,
+            ALTER COLUMN visibility SET DEFAULT 'private',
+            ALTER COLUMN status SET DEFAULT 'pending'
+    """)
+    op.execute(PENDING_QUEUE_INDEX)
+
+    op.execute("DROP TYPE user_role")
+    op.execute("DROP TYPE document_status")
+    op.execute("DROP TYPE document_visibility")
@@ -4,13 +4,17 @@ Admin management endpoints.
 Handles document approval workflow and admin dashboard statistics.
 Only users with admin role can access these endpoints.
 """
-from typing import Optional
+import base64
+import time
+from typing import List, Optional
 from datetime import datetime
-from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi import APIRouter, Depends, HTTPException, Query, Response
 from pydantic import BaseModel
-from sqlalchemy import func, text, inspect
+from sqlalchemy import and_, func, select, tuple_
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.orm import Session
-from app.services.auth import get_current_user
+from app.services.auth import get_current_user, get_current_user_id
 from app.db.session import get_db
 from app.models.document import Document, DocumentEmbedding, VisibilityType, DocumentCategory
 from app.models.chat import ChatSession, ChatMessage
@@ -20,33 +24,6 @@ import uuid
 router = APIRouter()
 
 
-def table_exists(db, table_name: str) -> bool:
-    """Check if a table exists in the database."""
-    try:
-        inspector = inspect(db.bind)
-        return table_name in inspector.get_table_names()
-    except Exception:
-        return False
-
-
-def ensure_user_profiles_table(db):
-    """Create user_profiles table if it doesn't exist."""
-    if not table_exists(db, 'user_profiles'):
-        db.execute(text("""
-            CREATE TABLE IF NOT EXISTS user_profiles (
-                id UUID PRIMARY KEY DEFAULT gen_random_uuid(),
-                user_id UUID UNIQUE NOT NULL,
-                full_name VARCHAR(100),
-                role VARCHAR(20) NOT NULL DEFAULT 'user',
-                created_at TIMESTAMP DEFAULT now(),
-                updated_at TIMESTAMP DEFAULT now()
-            )
-        """))
-        db.execute(text("CREATE INDEX IF NOT EXISTS ix_user_profiles_user_id ON user_profiles (user_id)"))
-        db.execute(text("CREATE INDEX IF NOT EXISTS ix_user_profiles_role ON user_profiles (role)"))
-        db.commit()
-
-
 # ============================================================================
 # Pydantic Schemas
 # ============================================================================
@@ -62,15 +39,18 @@ class AdminStats(BaseModel):
 
 class DocumentPreview(BaseModel):
     """Preview information for pending documents."""
-    id: str
+    id: uuid.UUID
     title: str
     course_name: Optional[str]
     topic: Optional[str]
-    user_id: str
+    user_id: uuid.UUID
     file_url: str
-    created_at: str
+    created_at: Optional[datetime]
     status: str
 
+    class Config:
+        from_attributes = True
+
 
 class ApprovalResponse(BaseModel):
     """Response after approval/rejection action."""
@@ -86,12 +66,15 @@ class UserRoleUpdate(BaseModel):
 
 class UserProfileResponse(BaseModel):
     """Schema for user profile response."""
-    id: str
-    user_id: str
+    id: uuid.UUID
+    user_id: uuid.UUID
     full_name: Optional[str]
     email: Optional[str]
     role: str
-    created_at: str
+    created_at: Optional[datetime]
+
+    class Config:
+        from_attributes = True
 
 
 # ============================================================================
@@ -104,41 +87,95 @@ def get_or_create_user_profile(db, user_id: uuid.UUID, email: str = None, full_n
 
     This ensures every user has a profile record for role management.
     """
-    # Ensure table exists
-    ensure_user_profiles_table(db)
-
     profile = db.query(UserProfile).filter(UserProfile.id == user_id).first()
 
     if not profile:
-        profile = UserProfile(
+        # Single INSERT ... ON CONFLICT DO NOTHING so concurrent first requests
+        # for the same user cannot race into a unique violation.
+        stmt = pg_insert(UserProfile).values(
             id=user_id,
             email=email,
             full_name=full_name,
             role=UserRole.USER.value
-        )
-        db.add(profile)
+        ).on_conflict_do_nothing(index_elements=[UserProfile.id]).returning(UserProfile)
+        profile = db.execute(
+            select(UserProfile).from_statement(stmt)
+        ).scalar_one_or_none()
         db.commit()
-        db.refresh(profile)
-    else:
+
+        if profile is None:
+            # Another request created it first
+            profile = db.query(UserProfile).filter(UserProfile.id == user_id).one()
+    elif full_name and profile.full_name != full_name:
         # Sync full_name if changed
-        updated = False
-        if full_name and profile.full_name != full_name:
-            profile.full_name = full_name
-            updated = True
-        if updated:
-            db.commit()
-            db.refresh(profile)
+        profile.full_name = full_name
+        db.commit()
 
     return profile
 
 
-def verify_admin_role(db, current_user: dict) -> UserProfile:
+def _encode_cursor(created_at: datetime, row_id: uuid.UUID) -> str:
+    """Encode a keyset pagination position as an opaque string."""
+    raw = f"{created_at.isoformat()}|{row_id}"
+    return base64.urlsafe_b64encode(raw.encode()).decode()
+
+
+def _decode_cursor(cursor: str) -> tuple[datetime, uuid.UUID]:
+    """Decode a cursor produced by _encode_cursor. Raises 400 on bad input."""
+    try:
+        created_at, row_id = base64.urlsafe_b64decode(cursor.encode()).decode().split("|")
+        return datetime.fromisoformat(created_at), uuid.UUID(row_id)
+    except (ValueError, UnicodeDecodeError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+
+def _set_next_cursor(response: Response, rows: list, limit: int) -> None:
+    """Expose the next page position in the X-Next-Cursor header on full pages."""
+    if len(rows) == limit and rows[-1].created_at:
+        response.headers["X-Next-Cursor"] = _encode_cursor(rows[-1].created_at, rows[-1].id)
+
+
+# Short-lived in-process cache of confirmed admins (user_id -> expiry).
+# Only positive results are cached so promotions take effect immediately.
+# Each worker process has its own copy: a demotion clears the entry only in
+# the worker that handled it, elsewhere it lasts until the TTL runs out.
+ADMIN_CACHE_TTL_SECONDS = 30
+ADMIN_CACHE_MAX_SIZE = 1024
+_admin_cache: dict[uuid.UUID, float] = {}
+
+
+def _is_cached_admin(user_id: uuid.UUID) -> bool:
+    expires_at = _admin_cache.get(user_id)
+    if expires_at is None:
+        return False
+    if expires_at < time.monotonic():
+        _admin_cache.pop(user_id, None)
+        return False
+    return True
+
+
+def _cache_admin(user_id: uuid.UUID) -> None:
+    _admin_cache.pop(user_id, None)
+    if len(_admin_cache) >= ADMIN_CACHE_MAX_SIZE:
+        # Evict the oldest entry (dicts keep insertion order)
+        _admin_cache.pop(next(iter(_admin_cache)), None)
+    _admin_cache[user_id] = time.monotonic() + ADMIN_CACHE_TTL_SECONDS
+
+
+def verify_admin_role(db, user_id: uuid.UUID) -> None:
     """
     Verify that the current user has admin privileges.
 
-    Returns the user profile if admin, raises HTTPException otherwise.
+    Raises HTTPException if the user is not an admin. Confirmed admins are
+    cached for ADMIN_CACHE_TTL_SECONDS so back-to-back admin requests skip
+    the lookup.
+
+    Accepted risk: the cache is per worker process, so with several workers
+    a demoted admin keeps admin access on the other workers for up to
+    ADMIN_CACHE_TTL_SECONDS after the demotion.
     """
-    user_id = uuid.UUID(current_user.get("sub"))
+    if _is_cached_admin(user_id):
+        return
 
     profile = get_or_create_user_profile(db, user_id)
 
@@ -148,7 +185,7 @@ def verify_admin_role(db, current_user: dict) -> UserProfile:
             detail="Admin access required. Contact system administrator to request admin privileges."
         )
 
-    return profile
+    _cache_admin(user_id)
 
 
 # ============================================================================
@@ -156,8 +193,9 @@ def verify_admin_role(db, current_user: dict) -> UserProfile:
 # ============================================================================
 
 @router.get("/me", response_model=UserProfileResponse)
-async def get_my_profile(
+def get_my_profile(
     current_user: dict = Depends(get_current_user),
+    user_id: uuid.UUID = Depends(get_current_user_id),
     db: Session = Depends(get_db)
 ):
     """
@@ -165,61 +203,71 @@ async def get_my_profile(
 
     Creates a profile if one doesn't exist.
     """
-    user_id = uuid.UUID(current_user.get("sub"))
     email = current_user.get("email")
     full_name = None  # name already stored in DB from registration
 
-    profile = get_or_create_user_profile(db, user_id, email=email, full_name=full_name)
-
-    return UserProfileResponse(
-        id=str(profile.id),
-        user_id=str(profile.user_id),
-        full_name=profile.full_name,
-        email=profile.email,
-        role=profile.role,
-        created_at=profile.created_at.isoformat() if profile.created_at else ""
-    )
+    return get_or_create_user_profile(db, user_id, email=email, full_name=full_name)
 
 
-@router.get("/users")
-async def list_users(
+@router.get("/users", response_model=List[UserProfileResponse])
+def list_users(
+    response: Response,
     role: Optional[str] = Query(None, description="Filter by role"),
     limit: int = Query(50, le=100),
     offset: int = Query(0, ge=0),
-    current_user: dict = Depends(get_current_user),
+    cursor: Optional[str] = Query(None, description="X-Next-Cursor value from the previous page"),
+    current_user_id: uuid.UUID = Depends(get_current_user_id),
     db: Session = Depends(get_db)
 ):
     """
     List all user profiles. Admin only.
-    """
-    verify_admin_role(db, current_user)
 
-    query = db.query(UserProfile)
+    Pass the X-Next-Cursor header of a page as `cursor` to fetch the next one;
+    keyset pagination keeps deep pages as cheap as the first.
+    """
+    verify_admin_role(db, current_user_id)
+
+    # Column-only query: rows come back as tuples, no ORM hydration
+    query = db.query(
+        UserProfile.id,
+        UserProfile.id.label("user_id"),  # id doubles as user_id
+        UserProfile.full_name,
+        UserProfile.email,
+        UserProfile.role,
+        UserProfile.created_at
+    )
 
     if role:
+        # role is a native enum column: an unknown value would be a DB error
+        valid_roles = [r.value for r in UserRole]
+        if role not in valid_roles:
+            raise HTTPException(
+                status_code=400,
+                detail=f"Invalid role. Must be one of: {', '.join(valid_roles)}"
+            )
         query = query.filter(UserProfile.role == role)
 
-    profiles = query.order_by(UserProfile.created_at.desc()).offset(offset).limit(limit).all()
+    query = query.order_by(UserProfile.created_at.desc(), UserProfile.id.desc())
 
-    # Email and full_name are stored in DB from registration
-    return [
-        UserProfileResponse(
-            id=str(p.id),
-            user_id=str(p.user_id),
-            full_name=p.full_name,
-            email=p.email,
-            role=p.role,
-            created_at=p.created_at.isoformat() if p.created_at else ""
+    if cursor:
+        cursor_ts, cursor_id = _decode_cursor(cursor)
+        query = query.filter(
+            tuple_(UserProfile.created_at, UserProfile.id) < (cursor_ts, cursor_id)
         )
-        for p in profiles
-    ]
+    else:
+        query = query.offset(offset)
+
+    # Email and full_name are stored in DB from registration
+    rows = query.limit(limit).all()
+    _set_next_cursor(response, rows, limit)
+    return rows
 
 
 @router.put("/users/{user_id}/role")
-async def update_user_role(
-    user_id: str,
+def update_user_role(
+    user_id: uuid.UUID,
     role_update: UserRoleUpdate,
-    current_user: dict = Depends(get_current_user),
+    current_user_id: uuid.UUID = Depends(get_current_user_id),
     db: Session = Depends(get_db)
 ):
     """
@@ -227,7 +275,7 @@ async def update_user_role(
 
     Available roles: 'user', 'teacher', 'admin'
     """
-    verify_admin_role(db, current_user)
+    verify_admin_role(db, current_user_id)
 
     valid_roles = [UserRole.USER.value, UserRole.TEACHER.value, UserRole.ADMIN.value]
     if role_update.role not in valid_roles:
@@ -236,8 +284,7 @@ async def update_user_role(
             detail=f"Invalid role. Must be one of: {', '.join(valid_roles)}"
         )
 
-    target_user_id = uuid.UUID(user_id)
-    profile = db.query(UserProfile).filter(UserProfile.id == target_user_id).first()
+    profile = db.query(UserProfile).filter(UserProfile.id == user_id).first()
 
     if not profile:
         raise HTTPException(status_code=404, detail="User profile not found")
@@ -245,10 +292,13 @@ async def update_user_role(
     profile.role = role_update.role
     profile.updated_at = datetime.utcnow()
     db.commit()
+    # Only this worker's cache: other workers may still treat a demoted
+    # admin as admin for up to ADMIN_CACHE_TTL_SECONDS (see verify_admin_role)
+    _admin_cache.pop(user_id, None)
 
     return {
         "message": f"User role updated to {role_update.role}",
-        "user_id": user_id,
+        "user_id": str(user_id),
         "new_role": role_update.role
     }
 
@@ -258,8 +308,8 @@ async def update_user_role(
 # ============================================================================
 
 @router.get("/stats", response_model=AdminStats)
-async def get_admin_stats(
-    current_user: dict = Depends(get_current_user),
+def get_admin_stats(
+    current_user_id: uuid.UUID = Depends(get_current_user_id),
     db: Session = Depends(get_db)
 ):
     """
@@ -267,39 +317,39 @@ async def get_admin_stats(
 
     Returns counts for pending documents, approvals, and totals.
     """
-    verify_admin_role(db, current_user)
+    verify_admin_role(db, current_user_id)
 
-    # Pending documents count
-    pending_count = db.query(func.count(Document.id)).filter(
+    today = datetime.utcnow().date()
+    pending_filter = and_(
         Document.visibility == VisibilityType.PUBLIC.value,
         Document.is_approved == False,
         Document.status == "completed"
-    ).scalar()
-
-    # Approved today count
-    today = datetime.utcnow().date()
-    approved_today = db.query(func.count(Document.id)).filter(
-        Document.approved_at >= datetime(today.year, today.month, today.day)
-    ).scalar()
-
-    # Total documents
-    total_documents = db.query(func.count(Document.id)).scalar()
-
-    # Total public approved documents
-    total_public = db.query(func.count(Document.id)).filter(
+    )
+    public_filter = and_(
         Document.visibility == VisibilityType.PUBLIC.value,
         Document.is_approved == True
-    ).scalar()
+    )
 
-    # Total unique users (from profiles)
-    total_users = db.query(func.count(UserProfile.id)).scalar()
+    # Single scan over documents using FILTER clauses; the user count rides
+    # along as a scalar subquery so the whole dashboard is one round-trip.
+    stats = db.query(
+        func.count(Document.id).filter(pending_filter).label("pending"),
+        func.count(Document.id).filter(
+            # is_approved matches the ix_documents_approved_at partial index
+            Document.is_approved == True,
+            Document.approved_at >= datetime(today.year, today.month, today.day)
+        ).label("approved_today"),
+        func.count(Document.id).label("total"),
+        func.count(Document.id).filter(public_filter).label("total_public"),
+        db.query(func.count(UserProfile.id)).scalar_subquery().label("users"),
+    ).one()
 
     return AdminStats(
-        pending_count=pending_count or 0,
-        approved_today_count=approved_today or 0,
-        total_documents=total_documents or 0,
-        total_public_documents=total_public or 0,
-        total_users=total_users or 0
+        pending_count=stats.pending or 0,
+        approved_today_count=stats.approved_today or 0,
+        total_documents=stats.total or 0,
+        total_public_documents=stats.total_public or 0,
+        total_users=stats.users or 0
     )
 
 
@@ -307,11 +357,13 @@ async def get_admin_stats(
 # Pending Documents Queue
 # ============================================================================
 
-@router.get("/documents/pending")
-async def list_pending_documents(
+@router.get("/documents/pending", response_model=List[DocumentPreview])
+def list_pending_documents(
+    response: Response,
     limit: int = Query(50, le=100),
     offset: int = Query(0, ge=0),
-    current_user: dict = Depends(get_current_user),
+    cursor: Optional[str] = Query(None, description="X-Next-Cursor value from the previous page"),
+    current_user_id: uuid.UUID = Depends(get_current_user_id),
     db: Session = Depends(get_db)
 ):
     """
@@ -320,28 +372,27 @@ async def list_pending_documents(
     Only shows public documents that are:
     - Not yet approved
     - Processing is completed (ready for review)
+
+    Pass the X-Next-Cursor header of a page as `cursor` to fetch the next one.
     """
-    verify_admin_role(db, current_user)
+    verify_admin_role(db, current_user_id)
 
-    documents = db.query(Document).filter(
+    # Matches ix_documents_pending_queue (created_at, id) partial index
+    query = db.query(Document).filter(
         Document.visibility == VisibilityType.PUBLIC.value,
         Document.is_approved == False,
         Document.status == "completed"
-    ).order_by(Document.created_at.asc()).offset(offset).limit(limit).all()
-
-    return [
-        DocumentPreview(
-            id=str(doc.id),
-            title=doc.title,
-            course_name=doc.course_name,
-            topic=doc.topic,
-            user_id=str(doc.user_id),
-            file_url=doc.file_url,
-            created_at=doc.created_at.isoformat() if doc.created_at else "",
-            status=doc.status
-        )
-        for doc in documents
-    ]
+    ).order_by(Document.created_at.asc(), Document.id.asc())
+
+    if cursor:
+        cursor_ts, cursor_id = _decode_cursor(cursor)
+        query = query.filter(tuple_(Document.created_at, Document.id) > (cursor_ts, cursor_id))
+    else:
+        query = query.offset(offset)
+
+    documents = query.limit(limit).all()
+    _set_next_cursor(response, documents, limit)
+    return documents
 
 
 # ============================================================================
@@ -349,9 +400,9 @@ async def list_pending_documents(
 # ============================================================================
 
 @router.put("/documents/{document_id}/approve", response_model=ApprovalResponse)
-async def approve_document(
-    document_id: str,
-    current_user: dict = Depends(get_current_user),
+def approve_document(
+    document_id: uuid.UUID,
+    current_user_id: uuid.UUID = Depends(get_current_user_id),
     db: Session = Depends(get_db)
 ):
     """
@@ -359,12 +410,9 @@ async def approve_document(
 
     After approval, the document becomes visible in public library searches.
     """
-    verify_admin_role(db, current_user)
-
-    doc_uuid = uuid.UUID(document_id)
-    admin_uuid = uuid.UUID(current_user.get("sub"))
+    verify_admin_role(db, current_user_id)
 
-    document = db.query(Document).filter(Document.id == doc_uuid).first()
+    document = db.query(Document).filter(Document.id == document_id).first()
 
     if not document:
         raise HTTPException(status_code=404, detail="Document not found")
@@ -383,21 +431,21 @@ async def approve_document(
 
     document.is_approved = True
     document.approved_at = datetime.utcnow()
-    document.approved_by = admin_uuid
+    document.approved_by = current_user_id
 
     db.commit()
 
     return ApprovalResponse(
         message="Document approved successfully",
-        document_id=document_id,
+        document_id=str(document_id),
         new_status="approved"
     )
 
 
 @router.put("/documents/{document_id}/reject", response_model=ApprovalResponse)
-async def reject_document(
-    document_id: str,
-    current_user: dict = Depends(get_current_user),
+def reject_document(
+    document_id: uuid.UUID,
+    current_user_id: uuid.UUID = Depends(get_current_user_id),
     db: Session = Depends(get_db)
 ):
     """
@@ -405,31 +453,27 @@ async def reject_document(
 
     The document is deleted from the system.
     """
-    verify_admin_role(db, current_user)
-
-    doc_uuid = uuid.UUID(document_id)
+    verify_admin_role(db, current_user_id)
 
-    document = db.query(Document).filter(Document.id == doc_uuid).first()
+    document = db.query(Document).filter(Document.id == document_id).first()
 
     if not document:
         raise HTTPException(status_code=404, detail="Document not found")
 
     # Delete related records
     db.query(DocumentEmbedding).filter(
-        DocumentEmbedding.document_id == doc_uuid
+        DocumentEmbedding.document_id == document_id
     ).delete(synchronize_session=False)
 
-    sessions = db.query(ChatSession).filter(
-        ChatSession.document_id == doc_uuid
-    ).all()
-
-    for session in sessions:
-        db.query(ChatMessage).filter(
-            ChatMessage.session_id == session.id
-        ).delete(synchronize_session=False)
+    # Delete messages of every chat session on this document in one statement
+    db.query(ChatMessage).filter(
+        ChatMessage.session_id.in_(
+            db.query(ChatSession.id).filter(ChatSession.document_id == document_id)
+        )
+    ).delete(synchronize_session=False)
 
     db.query(ChatSession).filter(
-        ChatSession.document_id == doc_uuid
+        ChatSession.document_id == document_id
     ).delete(synchronize_session=False)
 
     db.delete(document)
@@ -437,15 +481,15 @@ async def reject_document(
 
     return ApprovalResponse(
         message="Document rejected and deleted",
-        document_id=document_id,
+        document_id=str(document_id),
         new_status="rejected"
     )
 
 
 @router.get("/documents/{document_id}")
-async def get_document_for_review(
-    document_id: str,
-    current_user: dict = Depends(get_current_user),
+def get_document_for_review(
+    document_id: uuid.UUID,
+    current_user_id: uuid.UUID = Depends(get_current_user_id),
     db: Session = Depends(get_db)
 ):
     """
@@ -453,10 +497,9 @@ async def get_document_for_review(
 
     Returns complete document information including file URL for preview.
     """
-    verify_admin_role(db, current_user)
+    verify_admin_role(db, current_user_id)
 
-    doc_uuid = uuid.UUID(document_id)
-    document = db.query(Document).filter(Document.id == doc_uuid).first()
+    document = db.query(Document).filter(Document.id == document_id).first()
 
     if not document:
         raise HTTPException(status_code=404, detail="Document not found")
@@ -483,81 +526,48 @@ class CategoryUpdate(BaseModel):
 
 class CategoryResponse(BaseModel):
     """Schema for category response."""
-    id: str
+    id: uuid.UUID
     name: str
     description: Optional[str]
     is_active: bool
-    created_at: str
+    created_at: Optional[datetime]
     document_count: int = 0
 
 
-def ensure_categories_table(db):
-    """Create document_categories table if it doesn't exist."""
-    if not table_exists(db, 'document_categories'):
-        db.execute(text("""
-            CREATE TABLE IF NOT EXISTS document_categories (
-                id UUID PRIMARY KEY DEFAULT gen_random_uuid(),
-                name VARCHAR(100) UNIQUE NOT NULL,
-                description VARCHAR(500),
-                is_active BOOLEAN DEFAULT true,
-                created_at TIMESTAMP DEFAULT now(),
-                created_by UUID
-            )
-        """))
-        db.execute(text("CREATE INDEX IF NOT EXISTS ix_document_categories_name ON document_categories (name)"))
-        db.execute(text("CREATE INDEX IF NOT EXISTS ix_document_categories_is_active ON document_categories (is_active)"))
-        db.commit()
-
-
-def ensure_document_type_columns(db):
-    """Add document_type and category_id columns to documents table if they don't exist."""
-    try:
-        result = db.execute(text("SELECT column_name FROM information_schema.columns WHERE table_name = 'documents'"))
-        existing_columns = [row[0] for row in result]
-
-        if 'document_type' not in existing_columns:
-            db.execute(text("ALTER TABLE documents ADD COLUMN IF NOT EXISTS document_type VARCHAR(20) DEFAULT 'course'"))
-        if 'category_id' not in existing_columns:
-            db.execute(text("ALTER TABLE documents ADD COLUMN IF NOT EXISTS category_id UUID REFERENCES document_categories(id)"))
-            db.execute(text("CREATE INDEX IF NOT EXISTS ix_documents_category_id ON documents (category_id)"))
-            db.execute(text("CREATE INDEX IF NOT EXISTS ix_documents_document_type ON documents (document_type)"))
-        db.commit()
-    except Exception as e:
-        print(f"Warning: Could not ensure document type columns: {e}")
-        db.rollback()
+def _category_with_count_query(db):
+    """Query yielding (DocumentCategory, document_count) rows; caller adds GROUP BY."""
+    return db.query(
+        DocumentCategory,
+        func.count(Document.id)
+    ).outerjoin(Document, Document.category_id == DocumentCategory.id)
 
 
-@router.get("/categories")
-async def list_categories(
+@router.get("/categories", response_model=List[CategoryResponse])
+def list_categories(
     include_inactive: bool = Query(False, description="Include inactive categories"),
-    current_user: dict = Depends(get_current_user),
+    current_user_id: uuid.UUID = Depends(get_current_user_id),
     db: Session = Depends(get_db)
 ):
     """
     List all document categories. Admin only.
     """
-    verify_admin_role(db, current_user)
-    ensure_categories_table(db)
-    ensure_document_type_columns(db)
+    verify_admin_role(db, current_user_id)
 
-    query = db.query(DocumentCategory)
+    # One aggregate query instead of a COUNT per category
+    query = _category_with_count_query(db)
     if not include_inactive:
         query = query.filter(DocumentCategory.is_active == True)
 
-    categories = query.order_by(DocumentCategory.name).all()
+    rows = query.group_by(DocumentCategory.id).order_by(DocumentCategory.name).all()
 
     result = []
-    for cat in categories:
-        doc_count = db.query(func.count(Document.id)).filter(
-            Document.category_id == cat.id
-        ).scalar() or 0
-
+    for cat, doc_count in rows:
         result.append(CategoryResponse(
-            id=str(cat.id),
+            id=cat.id,
             name=cat.name,
             description=cat.description,
             is_active=cat.is_active,
-            created_at=cat.created_at.isoformat() if cat.created_at else "",
+            created_at=cat.created_at,
             document_count=doc_count
         ))
 
@@ -565,81 +575,73 @@ async def list_categories(
 
 
 @router.post("/categories", response_model=CategoryResponse)
-async def create_category(
+def create_category(
     category: CategoryCreate,
-    current_user: dict = Depends(get_current_user),
+    current_user_id: uuid.UUID = Depends(get_current_user_id),
     db: Session = Depends(get_db)
 ):
     """
     Create a new document category. Admin only.
     """
-    verify_admin_role(db, current_user)
-    ensure_categories_table(db)
-    ensure_document_type_columns(db)
+    verify_admin_role(db, current_user_id)
 
-    # Check if category already exists
-    existing = db.query(DocumentCategory).filter(
-        func.lower(DocumentCategory.name) == func.lower(category.name)
-    ).first()
-
-    if existing:
+    # One INSERT ... ON CONFLICT against the lower(name) index: no duplicate
+    # pre-check and no race between check and insert
+    stmt = pg_insert(DocumentCategory).values(
+        name=category.name,
+        description=category.description,
+        is_active=True,
+        created_by=current_user_id
+    ).on_conflict_do_nothing(
+        index_elements=[func.lower(DocumentCategory.name)]
+    ).returning(DocumentCategory)
+    new_category = db.execute(
+        select(DocumentCategory).from_statement(stmt)
+    ).scalar_one_or_none()
+
+    if new_category is None:
+        db.rollback()
         raise HTTPException(
             status_code=400,
             detail=f"Category '{category.name}' already exists"
         )
 
-    admin_uuid = uuid.UUID(current_user.get("sub"))
-
-    new_category = DocumentCategory(
-        name=category.name,
-        description=category.description,
-        is_active=True,
-        created_by=admin_uuid
-    )
-
-    db.add(new_category)
-    db.commit()
-    db.refresh(new_category)
-
-    return CategoryResponse(
-        id=str(new_category.id),
+    # Build the response from the RETURNING row before commit expires it
+    response = CategoryResponse(
+        id=new_category.id,
         name=new_category.name,
         description=new_category.description,
         is_active=new_category.is_active,
-        created_at=new_category.created_at.isoformat() if new_category.created_at else "",
+        created_at=new_category.created_at,
         document_count=0
     )
+    db.commit()
+
+    return response
 
 
 @router.put("/categories/{category_id}", response_model=CategoryResponse)
-async def update_category(
-    category_id: str,
+def update_category(
+    category_id: uuid.UUID,
     category_update: CategoryUpdate,
-    current_user: dict = Depends(get_current_user),
+    current_user_id: uuid.UUID = Depends(get_current_user_id),
     db: Session = Depends(get_db)
 ):
     """
     Update a document category. Admin only.
     """
-    verify_admin_role(db, current_user)
+    verify_admin_role(db, current_user_id)
 
-    cat_uuid = uuid.UUID(category_id)
-    category = db.query(DocumentCategory).filter(DocumentCategory.id == cat_uuid).first()
+    row = _category_with_count_query(db).filter(
+        DocumentCategory.id == category_id
+    ).group_by(DocumentCategory.id).first()
 
-    if not category:
+    if not row:
         raise HTTPException(status_code=404, detail="Category not found")
 
+    category, doc_count = row
+
     if category_update.name is not None:
-        # Check for duplicate name
-        existing = db.query(DocumentCategory).filter(
-            func.lower(DocumentCategory.name) == func.lower(category_update.name),
-            DocumentCategory.id != cat_uuid
-        ).first()
-        if existing:
-            raise HTTPException(
-                status_code=400,
-                detail=f"Category '{category_update.name}' already exists"
-            )
         category.name = category_update.name
 
     if category_update.description is not None:
@@ -648,27 +650,30 @@ async def update_category(
     if category_update.is_active is not None:
         category.is_active = category_update.is_active
 
-    db.commit()
+    try:
+        db.commit()
+    except IntegrityError:
+        db.rollback()
+        raise HTTPException(
+            status_code=400,
+            detail=f"Category '{category_update.name}' already exists"
+        )
     db.refresh(category)
 
-    doc_count = db.query(func.count(Document.id)).filter(
-        Document.category_id == cat_uuid
-    ).scalar() or 0
-
     return CategoryResponse(
-        id=str(category.id),
+        id=category.id,
         name=category.name,
         description=category.description,
         is_active=category.is_active,
-        created_at=category.created_at.isoformat() if category.created_at else "",
+        created_at=category.created_at,
         document_count=doc_count
     )
 
 
 @router.delete("/categories/{category_id}")
-async def delete_category(
-    category_id: str,
-    current_user: dict = Depends(get_current_user),
+def delete_category(
+    category_id: uuid.UUID,
+    current_user_id: uuid.UUID = Depends(get_current_user_id),
     db: Session = Depends(get_db)
 ):
     """
@@ -676,19 +681,19 @@ async def delete_category(
 
     Categories with documents cannot be deleted - deactivate them instead.
     """
-    verify_admin_role(db, current_user)
+    verify_admin_role(db, current_user_id)
 
-    cat_uuid = uuid.UUID(category_id)
-    category = db.query(DocumentCategory).filter(DocumentCategory.id == cat_uuid).first()
+    # Fetch the category together with its document count
+    row = _category_with_count_query(db).filter(
+        DocumentCategory.id == category_id
+    ).group_by(DocumentCategory.id).first()
 
-    if not category:
+    if not row:
         raise HTTPException(status_code=404, detail="Category not found")
 
-    # Check if category has documents
-    doc_count = db.query(func.count(Document.id)).filter(
-        Document.category_id == cat_uuid
-    ).scalar() or 0
+    category, doc_count = row
 
+    # Check if category has documents
     if doc_count > 0:
         raise HTTPException(
             status_code=400,
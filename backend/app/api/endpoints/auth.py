@@ -3,6 +3,8 @@ Authentication endpoints — register, login, me.
 
 Fully self-hosted JWT auth replacing the old Supabase integration.
 """
+import uuid
+
 from fastapi import APIRouter, Depends, HTTPException, status
 from pydantic import BaseModel, EmailStr, Field
 from sqlalchemy.orm import Session
@@ -52,7 +54,7 @@ class MeResponse(BaseModel):
 # ---------------------------------------------------------------------------
 
 @router.post("/register", response_model=AuthResponse)
-async def register(req: RegisterRequest, db: Session = Depends(get_db)):
+def register(req: RegisterRequest, db: Session = Depends(get_db)):
     """
     Create a new user account and return a JWT token.
     """
@@ -90,7 +92,7 @@ async def register(req: RegisterRequest, db: Session = Depends(get_db)):
 
 
 @router.post("/login", response_model=AuthResponse)
-async def login(req: LoginRequest, db: Session = Depends(get_db)):
+def login(req: LoginRequest, db: Session = Depends(get_db)):
     """
     Authenticate with email + password and return a JWT token.
     """
@@ -116,15 +118,13 @@ async def login(req: LoginRequest, db: Session = Depends(get_db)):
 
 
 @router.get("/me", response_model=MeResponse)
-async def get_me(
+def get_me(
     current_user: dict = Depends(get_current_user),
     db: Session = Depends(get_db),
 ):
     """
     Return the currently authenticated user's profile.
     """
-    import uuid
-
     user_id = uuid.UUID(current_user["sub"])
     user = db.query(UserProfile).filter(UserProfile.id == user_id).first()
 
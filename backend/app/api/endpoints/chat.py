@@ -1,19 +1,30 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, Request, Response, status
+from fastapi.responses import ORJSONResponse, StreamingResponse
+import asyncio
+import datetime
+import functools
+import hashlib
+import logging
 import uuid
+import orjson
 from pydantic import BaseModel, Field
 from typing import Optional, List, Literal
-from sqlalchemy.orm import Session, selectinload
-from sqlalchemy import func
-from app.services.auth import get_current_user
-from app.db.session import get_db
+from sqlalchemy.orm import Session, raiseload
+from sqlalchemy import Integer, and_, bindparam, func, select, text, true
+from sqlalchemy.dialects.postgresql import ARRAY, UUID
+from pgvector.sqlalchemy import HALFVEC
+from app.services.auth import get_current_user_id, get_current_user_profile
+from app.db.session import SessionLocal, get_db
 from app.models.chat import ChatSession, ChatMessage, MultiDocumentSession, MultiSessionMessage, multi_session_documents
 from app.models.document import Document, DocumentEmbedding
 from app.models.user import UserProfile, UserRole
 from app.services.gemini_service import gemini_service
 from app.services.ai_service import ai_service, ModelUnavailableError
-from app.services.query_limit import check_query_limit, increment_query_count, get_query_status
+from app.api.utils import parse_uuid
+from app.services.query_limit import DAILY_QUERY_LIMIT, ProfileNotFoundError, claim_query_slot, release_query_slot, get_query_status
 
 router = APIRouter()
+logger = logging.getLogger(__name__)
 
 
 class ChatRequest(BaseModel):
@@ -49,11 +60,21 @@ class MultiSessionMessageRequest(BaseModel):
     model: Literal["deepseek", "gemma"] = "deepseek"  # Default: DeepSeek (economic)
 
 
-def _parse_uuid(value: str | None, field_name: str) -> uuid.UUID:
-    try:
-        return uuid.UUID(value)  # type: ignore[arg-type]
-    except (TypeError, ValueError):
-        raise HTTPException(status_code=400, detail=f"Invalid {field_name}")
+def _make_etag(*parts) -> str:
+    """Strong ETag from the cheap values that change whenever the payload does."""
+    key = ":".join(str(part) for part in parts)
+    return '"' + hashlib.blake2b(key.encode(), digest_size=16).hexdigest() + '"'
+
+
+def _not_modified(request: Request, etag: str) -> Response | None:
+    """Return a 304 response when the client's If-None-Match already has etag."""
+    if_none_match = request.headers.get("if-none-match")
+    if not if_none_match:
+        return None
+    candidates = {tag.strip().removeprefix("W/") for tag in if_none_match.split(",")}
+    if etag in candidates or "*" in candidates:
+        return Response(status_code=304, headers={"ETag": etag})
+    return None
 
 
 # =============================================================================
@@ -68,66 +89,260 @@ TOKEN_THRESHOLDS = {
 }
 
 
-async def get_document_token_count(doc_id: uuid.UUID, db: Session) -> int:
+# Character budget for the combined multi-document context
+MULTI_DOC_CONTEXT_CHARS = {
+    "deepseek": 50000,
+    "gemma": 120000
+}
+
+
+def cap_join(parts, cap: int, sep: str = "\n\n") -> str:
+    """Join parts, stopping at cap characters instead of building and slicing."""
+    out = []
+    total = 0
+    for part in parts:
+        if out:
+            if total + len(sep) >= cap:
+                break
+            total += len(sep)
+        room = cap - total
+        if len(part) >= room:
+            out.append(part[:room])
+            break
+        out.append(part)
+        total += len(part)
+    return sep.join(out)
+
+
+def build_multi_doc_context(docs: list[tuple[str, str]], cap: int) -> str:
+    """
+    Combine (title, content) pairs into one labelled context of at most cap chars.
+
+    Each document gets a fair share of the budget; space a short document
+    doesn't use is handed on to the longer ones, so no single document can
+    crowd the rest out.
     """
-    Estimate total token count for a document.
-    Uses character count / 4 as approximation (~4 chars per token).
+    docs = [(title, content) for title, content in docs if content]
+    if not docs:
+        return ""
+
+    sep = "\n---\n"
+    headers = [f"[KAYNAK: {title}]\n" for title, _ in docs]
+
+    # Labels and separators come out of the budget first
+    overhead = sum(len(h) + 1 for h in headers) + len(sep) * (len(docs) - 1)
+    budgets = {}
+    remaining = max(cap - overhead, 0)
+    by_length = sorted(range(len(docs)), key=lambda i: len(docs[i][1]))
+    for pos, i in enumerate(by_length):
+        share = remaining // (len(docs) - pos)
+        budgets[i] = min(len(docs[i][1]), share)
+        remaining -= budgets[i]
+
+    blocks = (
+        f"{headers[i]}{content[:budgets[i]]}\n"
+        for i, (_, content) in enumerate(docs)
+    )
+    return cap_join(blocks, cap, sep=sep)
+
+
+# HNSW candidate list size for RAG lookups. Results are filtered to one
+# document after the index scan, so keep this well above the LIMIT.
+HNSW_EF_SEARCH = 100
+
+# pgvector >= 0.8 can keep scanning the HNSW graph until enough rows pass the
+# document_id filter (iterative index scans). Detected once per process.
+_hnsw_iterative_scan: bool | None = None
+
+
+def _supports_iterative_scan(db: Session) -> bool:
+    global _hnsw_iterative_scan
+    if _hnsw_iterative_scan is None:
+        version = db.execute(
+            text("SELECT extversion FROM pg_extension WHERE extname = 'vector'")
+        ).scalar()
+        try:
+            major, minor = (int(part) for part in version.split(".")[:2])
+            _hnsw_iterative_scan = (major, minor) >= (0, 8)
+        except (AttributeError, ValueError):
+            _hnsw_iterative_scan = False
+    return _hnsw_iterative_scan
+
+
+def _set_hnsw_ef_search(db: Session) -> None:
+    """Apply the HNSW search settings for the current transaction."""
+    settings_sql = f"SET LOCAL hnsw.ef_search = {HNSW_EF_SEARCH}"
+    if _supports_iterative_scan(db):
+        # Without this a per-document filter can leave fewer than LIMIT rows
+        # once the ef_search candidates from other documents are dropped
+        settings_sql += "; SET LOCAL hnsw.iterative_scan = strict_order"
+    db.execute(text(settings_sql))
+
+
+@functools.lru_cache(maxsize=None)
+def _multi_doc_chunks_stmt(by_similarity: bool):
+    """
+    Top-k chunks per document in one statement.
+
+    A LATERAL subquery runs the per-document ORDER BY ... LIMIT for every id
+    in :doc_ids, so each document still gets its own HNSW index scan
+    (a ROW_NUMBER() window over the whole IN set would not). Built once per
+    ordering; :doc_ids is a single uuid[] bind so the compiled form is
+    reused whatever the number of documents. Ranks by cosine distance to
+    :query_embedding, or by page order when by_similarity is False.
+    """
+    ids = func.unnest(
+        bindparam("doc_ids", type_=ARRAY(UUID(as_uuid=True)))
+    ).table_valued("id").render_derived(name="d")
+    if by_similarity:
+        rank = DocumentEmbedding.embedding.cosine_distance(
+            bindparam("query_embedding", type_=HALFVEC(768))
+        )
+    else:
+        rank = DocumentEmbedding.page_number
+    top = (
+        select(DocumentEmbedding.content, rank.label("rank"))
+        .where(DocumentEmbedding.document_id == ids.c.id)
+        .order_by(rank)
+        .limit(bindparam("k", type_=Integer))
+        .lateral("e")
+    )
+    return (
+        select(ids.c.id.label("doc_id"), top.c.content)
+        .select_from(ids)
+        .join(top, true())
+        .order_by(ids.c.id, top.c.rank)
+    )
+
+
+async def get_document_size(
+    doc_id: uuid.UUID,
+    token_threshold: int,
+    db: Session
+) -> tuple[int, list[str] | None]:
+    """
+    Estimate a document's token count (~4 chars per token) and, when it is
+    under token_threshold, fetch its chunk texts in page order in the same
+    round trip. Larger documents only return the count, so RAG-mode
+    documents don't ship their full text.
+
+    Doesn't check access: call it only once the user is known to be allowed
+    to read the document, since small documents come back in full.
+
+    Returns:
+        tuple[int, list[str] | None]: (estimated_tokens, chunk texts or None)
     """
-    total_chars = db.query(func.sum(func.length(DocumentEmbedding.content))).filter(
-        DocumentEmbedding.document_id == doc_id
-    ).scalar() or 0
-    return total_chars // 4
+    total = select(
+        func.coalesce(func.sum(func.length(DocumentEmbedding.content)), 0).label("chars")
+    ).where(DocumentEmbedding.document_id == doc_id).cte("total")
+
+    rows = db.execute(
+        select(total.c.chars, DocumentEmbedding.content)
+        .select_from(total)
+        .outerjoin(DocumentEmbedding, and_(
+            DocumentEmbedding.document_id == doc_id,
+            total.c.chars < token_threshold * 4
+        ))
+        .order_by(DocumentEmbedding.page_number)
+    ).all()
+
+    estimated_tokens = rows[0].chars // 4
+    if estimated_tokens >= token_threshold:
+        return estimated_tokens, None
+    return estimated_tokens, [row.content for row in rows if row.content is not None]
+
+
+async def get_documents_token_count(doc_ids: list[uuid.UUID], db: Session) -> int:
+    """Estimate the combined token count of several documents in one query."""
+    doc_char_counts = {doc_id: 0 for doc_id in doc_ids}
+    doc_char_counts.update(db.query(
+        DocumentEmbedding.document_id,
+        func.coalesce(func.sum(func.length(DocumentEmbedding.content)), 0)
+    ).filter(
+        DocumentEmbedding.document_id.in_(doc_ids)
+    ).group_by(DocumentEmbedding.document_id).all())
+
+    return sum(doc_char_counts.values()) // 4
+
+
+async def start_query_embedding(question: str) -> asyncio.Task:
+    """Start the query embedding RPC so it can overlap with DB work."""
+    task = asyncio.create_task(gemini_service.generate_query_embedding(question))
+    # Yield once so the RPC is submitted before the caller blocks on sync DB calls
+    await asyncio.sleep(0)
+    return task
+
+
+async def _resolve_query_embedding(
+    question: str,
+    query_embedding_task: asyncio.Task | None
+) -> list[float]:
+    if query_embedding_task is not None:
+        return await query_embedding_task
+    return await gemini_service.generate_query_embedding(question)
 
 
 async def get_smart_context(
     doc_id: uuid.UUID,
     question: str,
     db: Session,
-    model: str = "deepseek"
+    model: str = "deepseek",
+    estimated_tokens: int | None = None,
+    query_embedding_task: asyncio.Task | None = None,
+    full_chunks: list[str] | None = None
 ) -> tuple[str, str]:
     """
     Smart context selection based on document size.
-    
+
+    estimated_tokens, full_chunks and query_embedding_task may be supplied
+    by a caller that already ran get_document_size and started the
+    embedding RPC.
+
     Returns:
         tuple[str, str]: (context, mode) where mode is "full" or "rag"
     """
-    # Check token count (lightweight query)
-    estimated_tokens = await get_document_token_count(doc_id, db)
     threshold = TOKEN_THRESHOLDS.get(model, 25000)
 
+    # Size probe; small documents come back with their text in the same query
+    if estimated_tokens is None:
+        estimated_tokens, full_chunks = await get_document_size(doc_id, threshold, db)
+
     if estimated_tokens < threshold:
-        # FULL DOCUMENT MODE - Get all chunks ordered by page_number
-        all_chunks = db.query(DocumentEmbedding).filter(
-            DocumentEmbedding.document_id == doc_id
-        ).order_by(DocumentEmbedding.page_number).all()
+        # FULL DOCUMENT MODE - All chunks ordered by page_number
+        # Only the text column: the 768-d vector is never read here
+        if full_chunks is None:
+            full_chunks = [c for (c,) in db.query(DocumentEmbedding.content).filter(
+                DocumentEmbedding.document_id == doc_id
+            ).order_by(DocumentEmbedding.page_number).all()]
 
-        if not all_chunks:
+        if not full_chunks:
             return "", "empty"
 
-        full_content = "\n\n".join([c.content for c in all_chunks if c.content])
-        print(f"[Chat] FULL mode: {estimated_tokens} tokens, threshold: {threshold}")
+        full_content = "\n\n".join(c for c in full_chunks if c)
+        logger.info("[Chat] FULL mode: %d tokens, threshold: %d", estimated_tokens, threshold)
         return full_content, "full"
 
     else:
         # RAG MODE - Semantic search for most relevant chunks
-        query_embedding = await gemini_service.generate_query_embedding(question)
+        query_embedding = await _resolve_query_embedding(question, query_embedding_task)
 
-        if query_embedding and any(query_embedding):
-            relevant_chunks = db.query(DocumentEmbedding).filter(
+        if query_embedding:
+            _set_hnsw_ef_search(db)
+            relevant_chunks = db.query(DocumentEmbedding.content).filter(
                 DocumentEmbedding.document_id == doc_id
             ).order_by(
                 DocumentEmbedding.embedding.cosine_distance(query_embedding)
             ).limit(5).all()
 
-            context = "\n\n".join([c.content for c in relevant_chunks if c.content])
+            context = "\n\n".join(c.content for c in relevant_chunks if c.content)
         else:
             # Fallback: first 5 chunks by page order
-            fallback_chunks = db.query(DocumentEmbedding).filter(
+            fallback_chunks = db.query(DocumentEmbedding.content).filter(
                 DocumentEmbedding.document_id == doc_id
             ).order_by(DocumentEmbedding.page_number).limit(5).all()
-            context = "\n\n".join([c.content for c in fallback_chunks if c.content])
+            context = "\n\n".join(c.content for c in fallback_chunks if c.content)
 
-        print(f"[Chat] RAG mode: {estimated_tokens} tokens, threshold: {threshold}")
+        logger.info("[Chat] RAG mode: %d tokens, threshold: %d", estimated_tokens, threshold)
         return context, "rag"
 
 
@@ -135,118 +350,138 @@ async def get_smart_context_multi(
     doc_ids: list[uuid.UUID],
     question: str,
     db: Session,
-    model: str = "deepseek"
+    model: str = "deepseek",
+    total_tokens: int | None = None,
+    query_embedding_task: asyncio.Task | None = None
 ) -> tuple[dict[uuid.UUID, str], str]:
     """
     Smart context selection for multiple documents.
-    
+
     Returns:
         tuple[dict, str]: (doc_contexts dict, mode)
     """
-    # Calculate total token count across all documents
-    total_tokens = 0
-    doc_char_counts = {}
-
-    for doc_id in doc_ids:
-        chars = db.query(func.sum(func.length(DocumentEmbedding.content))).filter(
-            DocumentEmbedding.document_id == doc_id
-        ).scalar() or 0
-        doc_char_counts[doc_id] = chars
-        total_tokens += chars // 4
+    # Calculate total token count across all documents (one grouped query)
+    if total_tokens is None:
+        total_tokens = await get_documents_token_count(doc_ids, db)
 
     # Multi-doc threshold: 1.5x single doc threshold
     threshold = int(TOKEN_THRESHOLDS.get(model, 25000) * 1.5)
 
     if total_tokens < threshold:
         # FULL MODE - Get entire content from all documents
-        doc_contexts = {}
-        for doc_id in doc_ids:
-            chunks = db.query(DocumentEmbedding).filter(
-                DocumentEmbedding.document_id == doc_id
-            ).order_by(DocumentEmbedding.page_number).all()
+        chunks = db.query(
+            DocumentEmbedding.document_id,
+            DocumentEmbedding.content
+        ).filter(
+            DocumentEmbedding.document_id.in_(doc_ids)
+        ).order_by(DocumentEmbedding.document_id, DocumentEmbedding.page_number).all()
+
+        chunks_by_doc: dict[uuid.UUID, list[str]] = {doc_id: [] for doc_id in doc_ids}
+        for doc_id, content in chunks:
+            if content:
+                chunks_by_doc[doc_id].append(content)
 
-            doc_contexts[doc_id] = "\n\n".join([c.content for c in chunks if c.content])
+        # build_multi_doc_context never takes more than the model's cap from
+        # one document, so stop joining a long document once it is reached
+        max_chars = MULTI_DOC_CONTEXT_CHARS.get(model, 50000)
+        doc_contexts = {doc_id: cap_join(parts, max_chars) for doc_id, parts in chunks_by_doc.items()}
 
-        print(f"[MultiChat] FULL mode: {total_tokens} tokens, threshold: {threshold}")
+        logger.info("[MultiChat] FULL mode: %d tokens, threshold: %d", total_tokens, threshold)
         return doc_contexts, "full"
 
     else:
         # RAG MODE - Get top 3 relevant chunks from each document
-        query_embedding = await gemini_service.generate_query_embedding(question)
+        query_embedding = await _resolve_query_embedding(question, query_embedding_task)
         doc_contexts = {}
 
-        for doc_id in doc_ids:
-            if query_embedding and any(query_embedding):
-                chunks = db.query(DocumentEmbedding).filter(
-                    DocumentEmbedding.document_id == doc_id
-                ).order_by(
-                    DocumentEmbedding.embedding.cosine_distance(query_embedding)
-                ).limit(3).all()
-            else:
-                chunks = db.query(DocumentEmbedding).filter(
-                    DocumentEmbedding.document_id == doc_id
-                ).order_by(DocumentEmbedding.page_number).limit(3).all()
-
-            doc_contexts[doc_id] = "\n\n".join([c.content for c in chunks if c.content])
-
-        print(f"[MultiChat] RAG mode: {total_tokens} tokens, threshold: {threshold}")
+        if query_embedding:
+            _set_hnsw_ef_search(db)
+            rows = db.execute(
+                _multi_doc_chunks_stmt(True),
+                {"doc_ids": doc_ids, "query_embedding": query_embedding, "k": 3}
+            ).all()
+        else:
+            # Fallback: first 3 chunks of each document by page order
+            rows = db.execute(
+                _multi_doc_chunks_stmt(False),
+                {"doc_ids": doc_ids, "k": 3}
+            ).all()
+
+        chunks_by_doc: dict[uuid.UUID, list[str]] = {doc_id: [] for doc_id in doc_ids}
+        for row in rows:
+            if row.content:
+                chunks_by_doc[row.doc_id].append(row.content)
+
+        for doc_id, chunks in chunks_by_doc.items():
+            doc_contexts[doc_id] = "\n\n".join(chunks)
+
+        logger.info("[MultiChat] RAG mode: %d tokens, threshold: %d", total_tokens, threshold)
         return doc_contexts, "rag"
 
 
+def _claim_query_slot_or_429(user_uuid: uuid.UUID, db: Session) -> tuple[dict, str]:
+    """Take one of today's queries for the user or raise 429 if none are left."""
+    try:
+        claimed = claim_query_slot(user_uuid, db)
+    except ProfileNotFoundError:
+        # Profiles are created at registration; no row means no account
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Could not validate credentials",
+            headers={"WWW-Authenticate": "Bearer"},
+        )
+    if claimed is None:
+        raise HTTPException(
+            status_code=429,
+            detail={
+                "message": "Günlük sorgu limitinize ulaştınız",
+                "remaining": 0,
+                "limit": DAILY_QUERY_LIMIT,
+                "reset": "Yarın sıfırlanacak"
+            }
+        )
+    return claimed
+
+
+def _refund_query_slot(user_uuid: uuid.UUID, db: Session) -> None:
+    """Discard the failed request's pending writes and return its query slot."""
+    try:
+        db.rollback()
+        release_query_slot(user_uuid, db)
+    except Exception:
+        logger.exception("Could not refund query slot for user %s", user_uuid)
+
+
 @router.get("/query-status")
-async def get_user_query_status(
-    current_user: dict = Depends(get_current_user),
-    db: Session = Depends(get_db)
+def get_user_query_status(
+    user_profile: UserProfile = Depends(get_current_user_profile)
 ):
     """Get the current user's daily query status."""
-    user_uuid = _parse_uuid(current_user.get("sub"), "user identifier")
-    
-    user_profile = db.query(UserProfile).filter(UserProfile.id == user_uuid).first()
-    if not user_profile:
-        user_profile = UserProfile(user_id=user_uuid)
-        db.add(user_profile)
-        db.commit()
-        db.refresh(user_profile)
-    
     status = get_query_status(user_profile)
     return status
 
 
-@router.post("/message")
-async def chat_message(
+async def _prepare_chat_turn(
     request: ChatRequest,
-    current_user: dict = Depends(get_current_user),
-    db: Session = Depends(get_db)
-):
-    try:
-        user_uuid = _parse_uuid(current_user.get("sub"), "user identifier")
-
-        # Check daily query limit first
-        user_profile = db.query(UserProfile).filter(UserProfile.id == user_uuid).first()
-        if not user_profile:
-            user_profile = UserProfile(user_id=user_uuid)
-            db.add(user_profile)
-            db.commit()
-            db.refresh(user_profile)
-        
-        limit_status = check_query_limit(user_profile, db)
-        if not limit_status["allowed"]:
-            raise HTTPException(
-                status_code=429, 
-                detail={
-                    "message": "Günlük sorgu limitinize ulaştınız",
-                    "remaining": 0,
-                    "limit": limit_status["limit"],
-                    "reset": "Yarın sıfırlanacak"
-                }
-            )
+    user_uuid: uuid.UUID,
+    is_admin: bool,
+    db: Session
+) -> tuple[uuid.UUID, str, str]:
+    """
+    Resolve or create the chat session, stage the user message and build
+    the document context. Nothing is committed here.
 
+    Returns:
+        tuple[uuid.UUID, str, str]: (session_id, context, context_mode)
+    """
+    embed_task: asyncio.Task | None = None
+    try:
         session: ChatSession | None = None
         document_uuid: uuid.UUID | None = None
 
         # 1. Get or Create Session with strict ownership checks
         if request.session_id:
-            session_uuid = _parse_uuid(request.session_id, "session id")
+            session_uuid = parse_uuid(request.session_id, "session id")
             session = db.query(ChatSession).filter(ChatSession.id == session_uuid).first()
             if not session:
                 raise HTTPException(status_code=404, detail="Session not found")
@@ -257,65 +492,117 @@ async def chat_message(
             if request.document_id and str(document_uuid) != request.document_id:
                 raise HTTPException(status_code=400, detail="Session does not match the requested document")
         else:
-            document_uuid = _parse_uuid(request.document_id, "document id")
-            document = db.query(Document).filter(Document.id == document_uuid).first()
+            document_uuid = parse_uuid(request.document_id, "document id")
+
+        if session is None:
+            document = db.query(
+                Document.id,
+                Document.title,
+                Document.accessible_to(user_uuid).label("accessible")
+            ).filter(Document.id == document_uuid).first()
             if not document:
                 raise HTTPException(status_code=404, detail="Document not found")
 
             # Check if user has access (Owner OR Public & Approved OR Admin)
-            is_owner = document.user_id == user_uuid
-            is_public_approved = (document.visibility == 'public' and document.is_approved)
-            is_admin = user_profile and user_profile.role == UserRole.ADMIN
-
-            if not is_owner and not is_public_approved and not is_admin:
+            if not document.accessible and not is_admin:
                  raise HTTPException(status_code=403, detail="Access denied")
 
+        # Only once access is settled: large documents use RAG, so start the
+        # query embedding now and let it overlap with the message inserts
+        # below (small documents bring back their text in the same query)
+        estimated_tokens, full_chunks = await get_document_size(
+            document_uuid, TOKEN_THRESHOLDS.get(request.model, 25000), db
+        )
+        if full_chunks is None:
+            embed_task = await start_query_embedding(request.message)
 
+        if session is None:
+            # Assign the id client-side so the session and first message
+            # go out in one commit without a refresh round-trip
             session = ChatSession(
+                id=uuid.uuid4(),
                 user_id=user_uuid,
                 document_id=document.id,
                 title=document.title or "New Chat"
             )
             db.add(session)
-            db.commit()
-            db.refresh(session)
 
-        # 2. Save User Message
+        session_id = session.id
+
+        # 2. Stage the user message (and the new session, if any). Nothing is
+        # committed until the answer is ready, so a failed request leaves no
+        # half-written conversation behind.
         user_msg = ChatMessage(
-            session_id=session.id,
+            session_id=session_id,
             sender="user",
-            message=request.message
+            message=request.message,
+            # Stamp now so it sorts before the AI reply written in the same flush
+            created_at=datetime.datetime.utcnow()
         )
         db.add(user_msg)
-        db.commit()
 
         # 3. Get smart context (full doc for small docs, RAG for large docs)
         context, context_mode = await get_smart_context(
-            doc_id=session.document_id,
+            doc_id=document_uuid,
             question=request.message,
             db=db,
-            model=request.model
+            model=request.model,
+            estimated_tokens=estimated_tokens,
+            query_embedding_task=embed_task,
+            full_chunks=full_chunks
         )
 
         if not context and context_mode == "empty":
             raise HTTPException(status_code=404, detail="Document has no content")
 
-        ai_response_text = await ai_service.generate_answer(request.message, context, request.model)
+        return session_id, context, context_mode
+    finally:
+        # Don't leave the embedding RPC running if we bailed out early
+        if embed_task is not None and not embed_task.done():
+            embed_task.cancel()
+
+
+@router.post("/message")
+async def chat_message(
+    request: ChatRequest,
+    user_uuid: uuid.UUID = Depends(get_current_user_id),
+    db: Session = Depends(get_db)
+):
+    ai_task: asyncio.Task | None = None
+    query_status: dict | None = None
+    answered = False
+    try:
+        # Check daily query limit first (atomically takes a slot and
+        # returns the user's role in the same round trip)
+        query_status, role = _claim_query_slot_or_429(user_uuid, db)
+
+        session_id, context, context_mode = await _prepare_chat_turn(
+            request, user_uuid, role == UserRole.ADMIN.value, db
+        )
+
+        # Start the model call, then write the session and user message while
+        # it runs; the AI round-trip dwarfs the flush, which is hidden behind it
+        ai_task = asyncio.create_task(
+            ai_service.generate_answer(request.message, context, request.model)
+        )
+        await asyncio.sleep(0)
+        db.flush()
+        ai_response_text = await ai_task
 
         # 4. Save AI Message
         ai_msg = ChatMessage(
-            session_id=session.id,
+            session_id=session_id,
             sender="ai",
             message=ai_response_text
         )
         db.add(ai_msg)
-        db.commit()
 
-        # 5. Increment query count after successful response
-        query_status = increment_query_count(user_profile, db)
+        # 5. One commit writes the session and both messages
+        db.commit()
+        answered = True
 
         return {
-            "session_id": str(session.id),
+            "session_id": str(session_id),
             "message": ai_response_text,
             "sender": "ai",
             "context_mode": context_mode,  # NEW: Indicate which mode was used
@@ -334,19 +621,102 @@ async def chat_message(
     except HTTPException:
         raise
     except Exception as e:
-        import traceback
-        traceback.print_exc()
+        logger.exception("Chat request failed")
+        raise HTTPException(status_code=500, detail=f"Internal Server Error: {str(e)}")
+    finally:
+        # Don't leave the model RPC running if we bailed out early
+        if ai_task is not None and not ai_task.done():
+            ai_task.cancel()
+        if query_status is not None and not answered:
+            _refund_query_slot(user_uuid, db)
+
+
+def _sse(event: str, data: dict) -> bytes:
+    """Encode one server-sent event."""
+    return b"event: " + event.encode() + b"\ndata: " + orjson.dumps(data) + b"\n\n"
+
+
+@router.post("/message/stream")
+async def chat_message_stream(
+    request: ChatRequest,
+    user_uuid: uuid.UUID = Depends(get_current_user_id),
+    db: Session = Depends(get_db)
+):
+    """
+    Same as /message, but the answer is streamed as server-sent events.
+
+    Events: ``meta`` (session_id, context_mode, query_limit), then one
+    ``delta`` per text chunk, then ``done`` once the answer is saved, or
+    ``error`` if the model fails mid-stream.
+    """
+    query_status, role = _claim_query_slot_or_429(user_uuid, db)
+    try:
+        session_id, context, context_mode = await _prepare_chat_turn(
+            request, user_uuid, role == UserRole.ADMIN.value, db
+        )
+        # The response body outlives this request-scoped session, so the
+        # session and user message are committed before streaming starts
+        db.commit()
+    except HTTPException:
+        _refund_query_slot(user_uuid, db)
+        raise
+    except Exception as e:
+        logger.exception("Chat stream setup failed")
+        _refund_query_slot(user_uuid, db)
         raise HTTPException(status_code=500, detail=f"Internal Server Error: {str(e)}")
 
+    async def _events():
+        parts: list[str] = []
+        answered = False
+        try:
+            yield _sse("meta", {
+                "session_id": session_id,
+                "context_mode": context_mode,
+                "query_limit": query_status
+            })
+            async for delta in ai_service.stream_answer(request.message, context, request.model):
+                parts.append(delta)
+                yield _sse("delta", {"text": delta})
+
+            with SessionLocal() as write_db:
+                write_db.add(ChatMessage(
+                    session_id=session_id,
+                    sender="ai",
+                    message="".join(parts).strip()
+                ))
+                write_db.commit()
+            answered = True
+            yield _sse("done", {"session_id": session_id})
+        except ModelUnavailableError as e:
+            yield _sse("error", {
+                "error": "model_unavailable",
+                "model": e.model,
+                "message": e.message
+            })
+        except Exception:
+            logger.exception("Chat stream failed")
+            yield _sse("error", {"error": "internal"})
+        finally:
+            # Also runs when the client disconnects mid-answer
+            if not answered:
+                with SessionLocal() as refund_db:
+                    _refund_query_slot(user_uuid, refund_db)
+
+    return StreamingResponse(
+        _events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
 
 @router.get("/history/{document_id}")
-async def get_chat_history(
+def get_chat_history(
     document_id: str,
-    current_user: dict = Depends(get_current_user),
+    request: Request,
+    user_uuid: uuid.UUID = Depends(get_current_user_id),
     db: Session = Depends(get_db)
 ):
-    user_uuid = uuid.UUID(current_user.get("sub"))
-    doc_uuid = uuid.UUID(document_id)
+    doc_uuid = parse_uuid(document_id, "document id")
 
     # Get the latest session for this document and user
     session = db.query(ChatSession).filter(
@@ -357,28 +727,39 @@ async def get_chat_history(
     if not session:
         return {"session_id": None, "messages": []}
 
+    # Messages are append-only, so their count and newest timestamp identify
+    # the history; answer polls for an unchanged history with 304
+    last_message_at, message_count = db.query(
+        func.max(ChatMessage.created_at),
+        func.count(ChatMessage.id)
+    ).filter(ChatMessage.session_id == session.id).one()
+    etag = _make_etag(session.id, last_message_at, message_count)
+    not_modified = _not_modified(request, etag)
+    if not_modified:
+        return not_modified
+
     # Get messages for this session
-    messages = db.query(ChatMessage).filter(
+    messages = db.query(
+        ChatMessage.id,
+        ChatMessage.sender,
+        ChatMessage.message,
+        ChatMessage.created_at
+    ).filter(
         ChatMessage.session_id == session.id
     ).order_by(ChatMessage.created_at.asc()).all()
 
-    return {
-        "session_id": str(session.id),
-        "messages": [
-            {
-                "id": str(msg.id),
-                "sender": msg.sender,
-                "message": msg.message,
-                "created_at": msg.created_at
-            } for msg in messages
-        ]
-    }
+    # Returned as a response object so FastAPI skips the jsonable_encoder
+    # pass; orjson serializes the UUIDs and datetimes natively
+    return ORJSONResponse(content={
+        "session_id": session.id,
+        "messages": [msg._asdict() for msg in messages]
+    }, headers={"ETag": etag})
 
 
 @router.post("/multi-document")
 async def multi_document_chat(
     request: MultiDocumentChatRequest,
-    current_user: dict = Depends(get_current_user),
+    user_uuid: uuid.UUID = Depends(get_current_user_id),
     db: Session = Depends(get_db)
 ):
     """
@@ -388,28 +769,13 @@ async def multi_document_chat(
     combining contexts from all selected documents for richer AI responses.
     Maximum 10 documents can be selected at once.
     """
+    embed_task: asyncio.Task | None = None
+    query_status: dict | None = None
+    answered = False
     try:
-        user_uuid = _parse_uuid(current_user.get("sub"), "user identifier")
-        
-        # Check daily query limit
-        user_profile = db.query(UserProfile).filter(UserProfile.id == user_uuid).first()
-        if not user_profile:
-            user_profile = UserProfile(user_id=user_uuid)
-            db.add(user_profile)
-            db.commit()
-            db.refresh(user_profile)
-        
-        limit_status = check_query_limit(user_profile, db)
-        if not limit_status["allowed"]:
-            raise HTTPException(
-                status_code=429, 
-                detail={
-                    "message": "Günlük sorgu limitinize ulaştınız",
-                    "remaining": 0,
-                    "limit": limit_status["limit"],
-                    "reset": "Yarın sıfırlanacak"
-                }
-            )
+        # Check daily query limit (atomically takes a slot and returns the role)
+        query_status, role = _claim_query_slot_or_429(user_uuid, db)
+        is_admin = role == UserRole.ADMIN.value
         
         # Validate document count
         if len(request.document_ids) == 0:
@@ -417,48 +783,54 @@ async def multi_document_chat(
         if len(request.document_ids) > 10:
             raise HTTPException(status_code=400, detail="Maximum 10 documents can be selected at once")
         
-        # Parse and validate all document IDs
+        parsed_ids = [(doc_id, parse_uuid(doc_id, "document id")) for doc_id in request.document_ids]
+
+        # Validate all documents with a single IN query
+        documents_by_id = {
+            row.id: row for row in db.query(
+                Document.id,
+                Document.title,
+                Document.accessible_to(user_uuid).label("accessible")
+            ).filter(Document.id.in_([uid for _, uid in parsed_ids])).all()
+        }
+
         doc_uuids = []
         document_titles = {}
-        for doc_id in request.document_ids:
-            doc_uuid = _parse_uuid(doc_id, "document id")
-            document = db.query(Document).filter(Document.id == doc_uuid).first()
-            
+        for doc_id, doc_uuid in parsed_ids:
+            document = documents_by_id.get(doc_uuid)
+
             if not document:
                 raise HTTPException(status_code=404, detail=f"Document not found: {doc_id}")
-            
+
             # Check access rights for each document
-            is_owner = document.user_id == user_uuid
-            is_public_approved = (document.visibility == 'public' and document.is_approved)
-            is_admin = user_profile and user_profile.role == UserRole.ADMIN
-            
-            if not is_owner and not is_public_approved and not is_admin:
+            if not document.accessible and not is_admin:
                 raise HTTPException(status_code=403, detail=f"Access denied to document: {doc_id}")
-            
+
             doc_uuids.append(doc_uuid)
             document_titles[str(doc_uuid)] = document.title
-        
+
+        # Only for documents the user may read: size them, and for RAG start
+        # the query embedding so it overlaps with the context queries
+        total_tokens = await get_documents_token_count(doc_uuids, db)
+        if total_tokens >= int(TOKEN_THRESHOLDS.get(request.model, 25000) * 1.5):
+            embed_task = await start_query_embedding(request.message)
+
         # Get smart context (full doc for small docs, RAG for large docs)
         doc_contexts, context_mode = await get_smart_context_multi(
             doc_ids=doc_uuids,
             question=request.message,
             db=db,
-            model=request.model
+            model=request.model,
+            total_tokens=total_tokens,
+            query_embedding_task=embed_task
         )
         
-        # Build combined context with source labels
-        all_contexts = []
-        for doc_uuid in doc_uuids:
-            content = doc_contexts.get(doc_uuid, "")
-            if content:
-                title = document_titles[str(doc_uuid)]
-                all_contexts.append(f"[KAYNAK: {title}]\n{content}\n")
-        
-        combined_context = "\n---\n".join(all_contexts)
-        
-        # Apply model-based character limit (safety limit even in full mode)
-        max_chars = 120000 if request.model == "gemma" else 50000
-        combined_context = combined_context[:max_chars]
+        # Build combined context with source labels, capped per model
+        # (safety limit even in full mode)
+        combined_context = build_multi_doc_context(
+            [(document_titles[str(doc_uuid)], doc_contexts.get(doc_uuid, "")) for doc_uuid in doc_uuids],
+            MULTI_DOC_CONTEXT_CHARS.get(request.model, 50000)
+        )
         
         # Use cache-optimized method for DeepSeek
         ai_response_text = await ai_service.generate_answer_multi_doc(
@@ -467,9 +839,8 @@ async def multi_document_chat(
             model=request.model
         )
         
-        # Increment query count after successful response
-        query_status = increment_query_count(user_profile, db)
-        
+        answered = True
+
         return {
             "message": ai_response_text,
             "sender": "ai",
@@ -482,9 +853,13 @@ async def multi_document_chat(
     except HTTPException:
         raise
     except Exception as e:
-        import traceback
-        traceback.print_exc()
+        logger.exception("Multi-document chat request failed")
         raise HTTPException(status_code=500, detail=f"Internal Server Error: {str(e)}")
+    finally:
+        if embed_task is not None and not embed_task.done():
+            embed_task.cancel()
+        if query_status is not None and not answered:
+            _refund_query_slot(user_uuid, db)
 
 
 # ============================================================================
@@ -492,110 +867,207 @@ async def multi_document_chat(
 # ============================================================================
 
 @router.post("/multi-document/session")
-async def create_multi_session(
+def create_multi_session(
     request: CreateMultiSessionRequest,
-    current_user: dict = Depends(get_current_user),
+    user_uuid: uuid.UUID = Depends(get_current_user_id),
     db: Session = Depends(get_db)
 ):
     """Create a new multi-document chat session."""
-    user_uuid = _parse_uuid(current_user.get("sub"), "user identifier")
-    
+    parsed_ids = [(doc_id, parse_uuid(doc_id, "document id")) for doc_id in request.document_ids]
+
+    # Load every requested document in one IN query
+    documents_by_id = {
+        row.Document.id: row for row in db.query(
+            Document,
+            Document.accessible_to(user_uuid).label("accessible")
+        ).filter(
+            Document.id.in_([uid for _, uid in parsed_ids])
+        ).all()
+    }
+
+    # The role only matters for documents the user can't otherwise see, so
+    # it is looked up at most once and only when such a document shows up
+    is_admin: bool | None = None
+
     # Validate all document IDs
     doc_uuids = []
-    for doc_id in request.document_ids:
-        doc_uuid = _parse_uuid(doc_id, "document id")
-        document = db.query(Document).filter(Document.id == doc_uuid).first()
-        
-        if not document:
+    for doc_id, doc_uuid in parsed_ids:
+        row = documents_by_id.get(doc_uuid)
+
+        if not row:
             raise HTTPException(status_code=404, detail=f"Document not found: {doc_id}")
-        
+        document = row.Document
+
         # Check access rights
-        is_owner = document.user_id == user_uuid
-        is_public_approved = (document.visibility == 'public' and document.is_approved)
-        
-        user_profile = db.query(UserProfile).filter(UserProfile.id == user_uuid).first()
-        is_admin = user_profile and user_profile.role == UserRole.ADMIN
-        
-        if not is_owner and not is_public_approved and not is_admin:
-            raise HTTPException(status_code=403, detail=f"Access denied to document: {doc_id}")
-        
+        if not row.accessible:
+            if is_admin is None:
+                role = db.query(UserProfile.role).filter(UserProfile.id == user_uuid).scalar()
+                is_admin = role == UserRole.ADMIN.value
+            if not is_admin:
+                raise HTTPException(status_code=403, detail=f"Access denied to document: {doc_id}")
+
         doc_uuids.append(document)
     
-    # Create session
+    # Create session; id and timestamp are set here so no refresh is needed
+    now = datetime.datetime.utcnow()
     session = MultiDocumentSession(
+        id=uuid.uuid4(),
         user_id=user_uuid,
-        title=request.title
+        title=request.title,
+        created_at=now,
+        updated_at=now
     )
     session.documents = doc_uuids
     db.add(session)
-    db.commit()
-    db.refresh(session)
-    
-    return {
+
+    # Built before the commit, which would expire every loaded document
+    response = {
         "id": str(session.id),
         "title": session.title,
         "document_count": len(doc_uuids),
         "documents": [{"id": str(doc.id), "title": doc.title} for doc in doc_uuids],
-        "created_at": session.created_at.isoformat()
+        "created_at": now.isoformat()
     }
+    db.commit()
+    return response
 
 
 @router.get("/multi-document/sessions")
-async def list_multi_sessions(
-    current_user: dict = Depends(get_current_user),
+def list_multi_sessions(
+    request: Request,
+    response: Response,
+    user_uuid: uuid.UUID = Depends(get_current_user_id),
     db: Session = Depends(get_db)
 ):
     """List all multi-document sessions for the current user."""
-    user_uuid = _parse_uuid(current_user.get("sub"), "user identifier")
+
+    # Sending a message or renaming bumps updated_at; the counts cover
+    # created/deleted sessions and documents removed from a session
+    doc_link_count = select(func.count()).select_from(multi_session_documents).join(
+        MultiDocumentSession, MultiDocumentSession.id == multi_session_documents.c.session_id
+    ).where(MultiDocumentSession.user_id == user_uuid).scalar_subquery()
+    last_updated_at, session_count, link_count = db.query(
+        func.max(MultiDocumentSession.updated_at),
+        func.count(MultiDocumentSession.id),
+        doc_link_count
+    ).filter(MultiDocumentSession.user_id == user_uuid).one()
+    etag = _make_etag(user_uuid, last_updated_at, session_count, link_count)
+    not_modified = _not_modified(request, etag)
+    if not_modified:
+        return not_modified
+    response.headers["ETag"] = etag
     
-    # Eager loading ile N+1 sorununu çözüyoruz
-    sessions = db.query(MultiDocumentSession).options(
-        selectinload(MultiDocumentSession.documents),
-        selectinload(MultiDocumentSession.messages)
+    # Mesaj sayısı için sadece COUNT çekiyoruz, mesaj satırlarını yüklemiyoruz
+    msg_counts = db.query(
+        MultiSessionMessage.session_id,
+        func.count().label("message_count")
+    ).join(
+        MultiDocumentSession, MultiDocumentSession.id == MultiSessionMessage.session_id
+    ).filter(
+        MultiDocumentSession.user_id == user_uuid
+    ).group_by(MultiSessionMessage.session_id).subquery()
+
+    sessions = db.query(
+        MultiDocumentSession.id,
+        MultiDocumentSession.title,
+        MultiDocumentSession.created_at,
+        MultiDocumentSession.updated_at,
+        func.coalesce(msg_counts.c.message_count, 0)
+    ).outerjoin(
+        msg_counts, msg_counts.c.session_id == MultiDocumentSession.id
     ).filter(
         MultiDocumentSession.user_id == user_uuid
     ).order_by(MultiDocumentSession.updated_at.desc()).all()
-    
-    return [
-        {
-            "id": str(s.id),
-            "title": s.title,
-            "document_count": len(s.documents),
-            "documents": [{"id": str(d.id), "title": d.title} for d in s.documents],
-            "created_at": s.created_at.isoformat(),
-            "updated_at": s.updated_at.isoformat(),
-            "message_count": len(s.messages)
-        }
-        for s in sessions
-    ]
+
+    # Only id/title are rendered, so fetch those columns for all sessions in
+    # one query instead of hydrating full Document rows
+    session_docs = {}
+    for sid, doc_id, doc_title in db.query(
+        multi_session_documents.c.session_id,
+        Document.id,
+        Document.title
+    ).join(
+        Document, Document.id == multi_session_documents.c.document_id
+    ).join(
+        MultiDocumentSession, MultiDocumentSession.id == multi_session_documents.c.session_id
+    ).filter(
+        MultiDocumentSession.user_id == user_uuid
+    ):
+        session_docs.setdefault(sid, []).append({"id": str(doc_id), "title": doc_title})
+
+    result = []
+    for sid, title, created_at, updated_at, message_count in sessions:
+        documents = session_docs.get(sid, [])
+        result.append({
+            "id": str(sid),
+            "title": title,
+            "document_count": len(documents),
+            "documents": documents,
+            "created_at": created_at.isoformat(),
+            "updated_at": updated_at.isoformat(),
+            "message_count": message_count
+        })
+    return result
 
 
 @router.get("/multi-document/session/{session_id}")
-async def get_multi_session(
+def get_multi_session(
     session_id: str,
-    current_user: dict = Depends(get_current_user),
+    request: Request,
+    response: Response,
+    user_uuid: uuid.UUID = Depends(get_current_user_id),
     db: Session = Depends(get_db)
 ):
     """Get a multi-document session with its messages."""
-    user_uuid = _parse_uuid(current_user.get("sub"), "user identifier")
-    session_uuid = _parse_uuid(session_id, "session id")
-    
-    # Eager loading ile N+1 sorununu çözüyoruz
-    session = db.query(MultiDocumentSession).options(
-        selectinload(MultiDocumentSession.documents),
-        selectinload(MultiDocumentSession.messages)
+    session_uuid = parse_uuid(session_id, "session id")
+
+    # Session row plus a cheap version probe before loading documents and messages
+    message_count = select(func.count()).where(
+        MultiSessionMessage.session_id == session_uuid
+    ).scalar_subquery()
+    document_count = select(func.count()).select_from(multi_session_documents).where(
+        multi_session_documents.c.session_id == session_uuid
+    ).scalar_subquery()
+    session = db.query(
+        MultiDocumentSession.title,
+        MultiDocumentSession.created_at,
+        MultiDocumentSession.updated_at,
+        message_count.label("message_count"),
+        document_count.label("document_count")
     ).filter(
         MultiDocumentSession.id == session_uuid,
         MultiDocumentSession.user_id == user_uuid
     ).first()
-    
+
     if not session:
         raise HTTPException(status_code=404, detail="Session not found")
+
+    etag = _make_etag(session_uuid, session.updated_at, session.message_count, session.document_count)
+    not_modified = _not_modified(request, etag)
+    if not_modified:
+        return not_modified
+    response.headers["ETag"] = etag
+
+    # Column-only reads; messages come back in created_at order straight
+    # from the (session_id, created_at) index
+    documents = db.query(Document.id, Document.title).join(
+        multi_session_documents, multi_session_documents.c.document_id == Document.id
+    ).filter(
+        multi_session_documents.c.session_id == session_uuid
+    ).all()
+    messages = db.query(
+        MultiSessionMessage.id,
+        MultiSessionMessage.sender,
+        MultiSessionMessage.message,
+        MultiSessionMessage.created_at
+    ).filter(
+        MultiSessionMessage.session_id == session_uuid
+    ).order_by(MultiSessionMessage.created_at).all()
     
     return {
-        "id": str(session.id),
+        "id": str(session_uuid),
         "title": session.title,
-        "documents": [{"id": str(d.id), "title": d.title} for d in session.documents],
+        "documents": [{"id": str(d.id), "title": d.title} for d in documents],
         "messages": [
             {
                 "id": str(m.id),
@@ -603,7 +1075,7 @@ async def get_multi_session(
                 "message": m.message,
                 "created_at": m.created_at.isoformat()
             }
-            for m in sorted(session.messages, key=lambda x: x.created_at)
+            for m in messages
         ],
         "created_at": session.created_at.isoformat(),
         "updated_at": session.updated_at.isoformat()
@@ -611,17 +1083,16 @@ async def get_multi_session(
 
 
 @router.patch("/multi-document/session/{session_id}")
-async def update_multi_session(
+def update_multi_session(
     session_id: str,
     request: UpdateMultiSessionRequest,
-    current_user: dict = Depends(get_current_user),
+    user_uuid: uuid.UUID = Depends(get_current_user_id),
     db: Session = Depends(get_db)
 ):
     """Update session title."""
-    user_uuid = _parse_uuid(current_user.get("sub"), "user identifier")
-    session_uuid = _parse_uuid(session_id, "session id")
+    session_uuid = parse_uuid(session_id, "session id")
     
-    session = db.query(MultiDocumentSession).filter(
+    session = db.query(MultiDocumentSession).options(raiseload("*")).filter(
         MultiDocumentSession.id == session_uuid,
         MultiDocumentSession.user_id == user_uuid
     ).first()
@@ -631,20 +1102,18 @@ async def update_multi_session(
     
     session.title = request.title
     db.commit()
-    db.refresh(session)
     
-    return {"id": str(session.id), "title": session.title}
+    return {"id": str(session_uuid), "title": request.title}
 
 
 @router.delete("/multi-document/session/{session_id}")
-async def delete_multi_session(
+def delete_multi_session(
     session_id: str,
-    current_user: dict = Depends(get_current_user),
+    user_uuid: uuid.UUID = Depends(get_current_user_id),
     db: Session = Depends(get_db)
 ):
     """Delete a multi-document session."""
-    user_uuid = _parse_uuid(current_user.get("sub"), "user identifier")
-    session_uuid = _parse_uuid(session_id, "session id")
+    session_uuid = parse_uuid(session_id, "session id")
     
     session = db.query(MultiDocumentSession).filter(
         MultiDocumentSession.id == session_uuid,
@@ -664,83 +1133,93 @@ async def delete_multi_session(
 async def send_multi_session_message(
     session_id: str,
     request: MultiSessionMessageRequest,
-    current_user: dict = Depends(get_current_user),
+    user_uuid: uuid.UUID = Depends(get_current_user_id),
     db: Session = Depends(get_db)
 ):
     """Send a message in a multi-document session."""
-    user_uuid = _parse_uuid(current_user.get("sub"), "user identifier")
-    session_uuid = _parse_uuid(session_id, "session id")
-    
-    # Check daily query limit
-    user_profile = db.query(UserProfile).filter(UserProfile.id == user_uuid).first()
-    if not user_profile:
-        user_profile = UserProfile(user_id=user_uuid)
-        db.add(user_profile)
-        db.commit()
-        db.refresh(user_profile)
-    
-    limit_status = check_query_limit(user_profile, db)
-    if not limit_status["allowed"]:
-        raise HTTPException(
-            status_code=429, 
-            detail={
-                "message": "Günlük sorgu limitinize ulaştınız",
-                "remaining": 0,
-                "limit": limit_status["limit"],
-                "reset": "Yarın sıfırlanacak"
-            }
-        )
-    
-    # Eager loading ile documents'ı önceden yükle (N+1 sorunu çözümü)
-    session = db.query(MultiDocumentSession).options(
-        selectinload(MultiDocumentSession.documents)
-    ).filter(
+    session_uuid = parse_uuid(session_id, "session id")
+
+    # Check daily query limit (atomically takes a slot)
+    query_status, _ = _claim_query_slot_or_429(user_uuid, db)
+    try:
+        return await _answer_multi_session_message(session_uuid, request, user_uuid, query_status, db)
+    except Exception:
+        _refund_query_slot(user_uuid, db)
+        raise
+
+
+async def _answer_multi_session_message(
+    session_uuid: uuid.UUID,
+    request: MultiSessionMessageRequest,
+    user_uuid: uuid.UUID,
+    query_status: dict,
+    db: Session
+) -> dict:
+    """Body of send_multi_session_message, run once a query slot is held."""
+    session = db.query(MultiDocumentSession).options(raiseload("*")).filter(
         MultiDocumentSession.id == session_uuid,
         MultiDocumentSession.user_id == user_uuid
     ).first()
     
     if not session:
         raise HTTPException(status_code=404, detail="Session not found")
-    
-    # Save user message
+
+    # Only id and title of the session's documents are needed: one join
+    # query instead of hydrating full Document rows through the relationship
+    document_titles = dict(db.query(Document.id, Document.title).join(
+        multi_session_documents, multi_session_documents.c.document_id == Document.id
+    ).filter(
+        multi_session_documents.c.session_id == session_uuid
+    ).all())
+
+    # Stage the user message; it is written while the model call runs
     user_msg = MultiSessionMessage(
         session_id=session.id,
         sender="user",
-        message=request.message
+        message=request.message,
+        # Stamp now so it sorts before the AI reply written in the same flush
+        created_at=datetime.datetime.utcnow()
     )
     db.add(user_msg)
-    db.commit()
-    
+
     # Get smart context from session documents (full doc for small docs, RAG for large)
-    doc_ids = [doc.id for doc in session.documents]
-    document_titles = {str(doc.id): doc.title for doc in session.documents}
-    
-    doc_contexts, context_mode = await get_smart_context_multi(
-        doc_ids=doc_ids,
-        question=request.message,
-        db=db,
-        model=request.model
-    )
-    
-    # Build combined context with source labels
-    all_contexts = []
-    for doc in session.documents:
-        content = doc_contexts.get(doc.id, "")
-        if content:
-            all_contexts.append(f"[KAYNAK: {doc.title}]\n{content}\n")
-    
-    combined_context = "\n---\n".join(all_contexts)
-    
-    # Apply model-based character limit
-    max_chars = 120000 if request.model == "gemma" else 50000
-    combined_context = combined_context[:max_chars]
-
-    # Use cache-optimized method for DeepSeek
-    ai_response_text = await ai_service.generate_answer_multi_doc(
-        question=request.message,
-        combined_context=combined_context,
-        model=request.model
-    )
+    doc_ids = list(document_titles)
+
+    embed_task: asyncio.Task | None = None
+    ai_task: asyncio.Task | None = None
+    try:
+        total_tokens = await get_documents_token_count(doc_ids, db)
+        if total_tokens >= int(TOKEN_THRESHOLDS.get(request.model, 25000) * 1.5):
+            embed_task = await start_query_embedding(request.message)
+
+        doc_contexts, context_mode = await get_smart_context_multi(
+            doc_ids=doc_ids,
+            question=request.message,
+            db=db,
+            model=request.model,
+            total_tokens=total_tokens,
+            query_embedding_task=embed_task
+        )
+
+        # Build combined context with source labels, capped per model
+        combined_context = build_multi_doc_context(
+            [(title, doc_contexts.get(doc_id, "")) for doc_id, title in document_titles.items()],
+            MULTI_DOC_CONTEXT_CHARS.get(request.model, 50000)
+        )
+
+        # Start the model call, then flush the user message while it runs
+        ai_task = asyncio.create_task(ai_service.generate_answer_multi_doc(
+            question=request.message,
+            combined_context=combined_context,
+            model=request.model
+        ))
+        await asyncio.sleep(0)
+        db.flush()
+        ai_response_text = await ai_task
+    finally:
+        for task in (embed_task, ai_task):
+            if task is not None and not task.done():
+                task.cancel()
 
     # Save AI message
     ai_msg = MultiSessionMessage(
@@ -750,16 +1229,12 @@ async def send_multi_session_message(
     )
     db.add(ai_msg)
     
-    # Update session timestamp
-    import datetime
+    # Update session timestamp; one commit writes both messages
     session.updated_at = datetime.datetime.utcnow()
     db.commit()
-    
-    # Increment query count after successful response
-    query_status = increment_query_count(user_profile, db)
-    
+
     return {
-        "session_id": str(session.id),
+        "session_id": str(session_uuid),
         "message": ai_response_text,
         "sender": "ai",
         "context_mode": context_mode,  # NEW: Indicate which mode was used
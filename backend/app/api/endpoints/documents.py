@@ -4,12 +4,15 @@ Document management endpoints.
 Handles document upload, retrieval, and management operations.
 Supports both private and public documents with admin approval workflow.
 """
+from pathlib import Path
 from typing import Optional, List
 from fastapi import APIRouter, UploadFile, File, Depends, BackgroundTasks, HTTPException, Query
 from pydantic import BaseModel, Field
-from sqlalchemy import text, inspect
-from sqlalchemy.orm import Session, joinedload
-from app.services.auth import get_current_user
+from sqlalchemy import and_, func, or_
+from sqlalchemy.orm import Session
+from app.api.utils import parse_uuid
+from app.services.auth import get_current_user, get_current_user_id, get_current_user_profile
+from app.core.config import settings
 from app.db.session import get_db
 from app.models.document import Document, DocumentEmbedding, VisibilityType, DocumentType, DocumentCategory
 from app.models.chat import ChatSession, ChatMessage
@@ -20,38 +23,6 @@ import uuid
 router = APIRouter()
 
 
-
-
-def ensure_document_columns(db):
-    """Add social feature columns to documents table if they don't exist."""
-    try:
-        # Check if columns exist by trying to query them
-        result = db.execute(text("SELECT column_name FROM information_schema.columns WHERE table_name = 'documents'"))
-        existing_columns = [row[0] for row in result]
-
-        columns_to_add = []
-        if 'course_name' not in existing_columns:
-            columns_to_add.append("ADD COLUMN IF NOT EXISTS course_name VARCHAR(100)")
-        if 'topic' not in existing_columns:
-            columns_to_add.append("ADD COLUMN IF NOT EXISTS topic VARCHAR(200)")
-        if 'visibility' not in existing_columns:
-            columns_to_add.append("ADD COLUMN IF NOT EXISTS visibility VARCHAR(20) DEFAULT 'private'")
-        if 'is_approved' not in existing_columns:
-            columns_to_add.append("ADD COLUMN IF NOT EXISTS is_approved BOOLEAN DEFAULT false")
-        if 'approved_at' not in existing_columns:
-            columns_to_add.append("ADD COLUMN IF NOT EXISTS approved_at TIMESTAMP")
-        if 'approved_by' not in existing_columns:
-            columns_to_add.append("ADD COLUMN IF NOT EXISTS approved_by UUID")
-
-        if columns_to_add:
-            for col in columns_to_add:
-                db.execute(text(f"ALTER TABLE documents {col}"))
-            db.commit()
-    except Exception as e:
-        print(f"Warning: Could not ensure document columns: {e}")
-        db.rollback()
-
-
 # ============================================================================
 # Pydantic Schemas
 # ============================================================================
@@ -127,9 +98,6 @@ async def upload_document(
     db: Session = Depends(get_db)
 ):
     """Upload a document file directly to the server disk and return the URL."""
-    import os
-    from pathlib import Path
-    from app.core.config import settings
 
     # Sanitize filename
     sanitized_name = file.filename.replace(" ", "_")
@@ -154,10 +122,10 @@ async def upload_document(
 
 
 @router.post("/")
-async def create_document(
+def create_document(
     doc_in: DocumentCreate,
     background_tasks: BackgroundTasks,
-    current_user: dict = Depends(get_current_user),
+    user_uuid: uuid.UUID = Depends(get_current_user_id),
     db: Session = Depends(get_db)
 ):
     """
@@ -170,9 +138,6 @@ async def create_document(
     - "course": For course documents (requires course_name)
     - "non_course": For non-course documents (requires category_id)
     """
-    # Ensure new columns exist
-    ensure_document_columns(db)
-
     # Validate document type specific fields
     if doc_in.document_type == DocumentType.NON_COURSE.value:
         if not doc_in.category_id:
@@ -198,7 +163,6 @@ async def create_document(
     is_course_doc = doc_in.document_type == DocumentType.COURSE.value
     
     if is_public and is_course_doc:
-        user_uuid = uuid.UUID(current_user.get("sub"))
         user_profile = db.query(UserProfile).filter(UserProfile.id == user_uuid).first()
         
         # Check if user has teacher or admin role
@@ -213,7 +177,7 @@ async def create_document(
     is_approved = not is_public  # Private docs are auto-approved
 
     db_doc = Document(
-        user_id=uuid.UUID(current_user.get("sub")),
+        user_id=user_uuid,
         title=doc_in.title,
         file_url=doc_in.file_url,
         status="pending",
@@ -245,18 +209,33 @@ async def create_document(
 # ============================================================================
 
 @router.get("/")
-async def list_documents(
-    current_user: dict = Depends(get_current_user),
+def list_documents(
+    user_uuid: uuid.UUID = Depends(get_current_user_id),
     db: Session = Depends(get_db)
 ):
     """List all documents owned by the current user."""
-    user_uuid = uuid.UUID(current_user.get("sub"))
-    documents = db.query(Document).filter(Document.user_id == user_uuid).all()
-    return documents
+    # Plain column rows serialize to the same fields without hydrating Document objects
+    rows = db.query(
+        Document.id,
+        Document.user_id,
+        Document.title,
+        Document.file_url,
+        Document.status,
+        Document.created_at,
+        Document.document_type,
+        Document.course_name,
+        Document.topic,
+        Document.category_id,
+        Document.visibility,
+        Document.is_approved,
+        Document.approved_at,
+        Document.approved_by
+    ).filter(Document.user_id == user_uuid).all()
+    return [row._asdict() for row in rows]
 
 
 @router.get("/public")
-async def list_public_documents(
+def list_public_documents(
     document_type: Optional[str] = Query(None, description="Filter by document type (course/non_course)"),
     course_name: Optional[str] = Query(None, description="Filter by course name (for course docs)"),
     topic: Optional[str] = Query(None, description="Filter by topic (for course docs)"),
@@ -271,9 +250,23 @@ async def list_public_documents(
     Only documents with visibility='public' and is_approved=True are returned.
     Supports filtering by document_type, course name, topic, and category.
     """
-    # Eager loading ile N+1 sorununu çözüyoruz - category'yi önceden yükle
-    query = db.query(Document).options(
-        joinedload(Document.category)
+    # Only the returned columns plus the category name, in one outer join
+    query = db.query(
+        Document.id,
+        Document.user_id,
+        Document.title,
+        Document.file_url,
+        Document.status,
+        Document.document_type,
+        Document.course_name,
+        Document.topic,
+        Document.category_id,
+        DocumentCategory.name.label("category_name"),
+        Document.visibility,
+        Document.is_approved,
+        Document.created_at
+    ).outerjoin(
+        DocumentCategory, Document.category_id == DocumentCategory.id
     ).filter(
         Document.visibility == VisibilityType.PUBLIC.value,
         Document.is_approved == True,
@@ -291,7 +284,6 @@ async def list_public_documents(
 
     documents = query.order_by(Document.created_at.desc()).offset(offset).limit(limit).all()
 
-    # Category zaten eager loading ile yüklendi, artık N+1 yok
     return [
         {
             "id": str(doc.id),
@@ -303,7 +295,7 @@ async def list_public_documents(
             "course_name": doc.course_name,
             "topic": doc.topic,
             "category_id": str(doc.category_id) if doc.category_id else None,
-            "category_name": doc.category.name if doc.category else None,
+            "category_name": doc.category_name,
             "visibility": doc.visibility,
             "is_approved": doc.is_approved,
             "created_at": doc.created_at.isoformat() if doc.created_at else ""
@@ -313,14 +305,12 @@ async def list_public_documents(
 
 
 @router.get("/courses")
-async def list_courses(db: Session = Depends(get_db)):
+def list_courses(db: Session = Depends(get_db)):
     """
     List all available courses with their document counts.
 
     Only returns courses that have approved public course documents.
     """
-    from sqlalchemy import func
-
     results = db.query(
         Document.course_name,
         func.count(func.distinct(Document.topic)).label('topic_count'),
@@ -344,14 +334,12 @@ async def list_courses(db: Session = Depends(get_db)):
 
 
 @router.get("/courses/{course_name}/topics")
-async def list_course_topics(course_name: str, db: Session = Depends(get_db)):
+def list_course_topics(course_name: str, db: Session = Depends(get_db)):
     """
     List all topics for a specific course.
 
     Only returns topics that have approved public documents.
     """
-    from sqlalchemy import func
-
     results = db.query(
         Document.topic,
         func.count(Document.id).label('document_count')
@@ -370,85 +358,81 @@ async def list_course_topics(course_name: str, db: Session = Depends(get_db)):
 
 
 @router.get("/suggestions/all")
-async def get_course_suggestions(db: Session = Depends(get_db)):
+def get_course_suggestions(db: Session = Depends(get_db)):
     """
     Get all unique course names and topics for autocomplete suggestions.
     
     Returns all courses and topics from the database (not just approved public ones)
     to help teachers avoid name conflicts and select existing courses/topics.
     """
-    from sqlalchemy import func, distinct
-    
-    # Get all unique course names
-    course_results = db.query(
-        distinct(Document.course_name)
-    ).filter(
-        Document.course_name.isnot(None),
-        Document.course_name != ""
-    ).all()
-    
-    # Get all unique topics with their associated course names
-    topic_results = db.query(
+    # One distinct (course, topic) scan feeds all three projections
+    rows = db.query(
         Document.course_name,
         Document.topic
     ).filter(
-        Document.topic.isnot(None),
-        Document.topic != ""
+        or_(
+            and_(Document.course_name.isnot(None), Document.course_name != ""),
+            and_(Document.topic.isnot(None), Document.topic != "")
+        )
     ).distinct().all()
-    
-    # Build course -> topics mapping
+
+    courses = {}
+    topics = {}
     course_topics = {}
-    for course, topic in topic_results:
+    for course, topic in rows:
         if course:
-            if course not in course_topics:
-                course_topics[course] = []
-            if topic and topic not in course_topics[course]:
-                course_topics[course].append(topic)
-    
+            courses[course] = None
+        if topic:
+            topics[topic] = None
+            if course:
+                course_topics.setdefault(course, []).append(topic)
+
     return {
-        "courses": [r[0] for r in course_results if r[0]],
-        "topics": list(set([r.topic for r in topic_results if r.topic])),
+        "courses": list(courses),
+        "topics": list(topics),
         "course_topics": course_topics  # Topics grouped by course
     }
 
 
 @router.get("/categories/list")
-async def list_public_categories(db: Session = Depends(get_db)):
+def list_public_categories(db: Session = Depends(get_db)):
     """
     List all active document categories.
 
     This endpoint is public and used in upload forms for non-course documents.
     """
-    from sqlalchemy import func
-
-    categories = db.query(DocumentCategory).filter(
-        DocumentCategory.is_active == True
-    ).order_by(DocumentCategory.name).all()
-
-    # Get document counts for each category
-    result = []
-    for cat in categories:
-        doc_count = db.query(func.count(Document.id)).filter(
-            Document.category_id == cat.id,
+    # Public document counts for every category in one grouped outer join
+    rows = db.query(
+        DocumentCategory.id,
+        DocumentCategory.name,
+        DocumentCategory.description,
+        func.count(Document.id)
+    ).outerjoin(
+        Document, and_(
+            Document.category_id == DocumentCategory.id,
             Document.visibility == VisibilityType.PUBLIC.value,
             Document.is_approved == True,
             Document.status == "completed"
-        ).scalar() or 0
+        )
+    ).filter(
+        DocumentCategory.is_active == True
+    ).group_by(DocumentCategory.id).order_by(DocumentCategory.name).all()
 
-        result.append({
-            "id": str(cat.id),
-            "name": cat.name,
-            "description": cat.description,
+    return [
+        {
+            "id": str(cat_id),
+            "name": name,
+            "description": description,
             "document_count": doc_count
-        })
-
-    return result
+        }
+        for cat_id, name, description, doc_count in rows
+    ]
 
 
 @router.get("/{document_id}")
-async def get_document(
+def get_document(
     document_id: str,
-    current_user: dict = Depends(get_current_user),
+    user_uuid: uuid.UUID = Depends(get_current_user_id),
     db: Session = Depends(get_db)
 ):
     """
@@ -458,27 +442,22 @@ async def get_document(
     - Their own documents (any visibility)
     - Approved public documents from other users
     """
-    user_uuid = uuid.UUID(current_user.get("sub"))
-    doc_uuid = uuid.UUID(document_id)
+    doc_uuid = parse_uuid(document_id, "document id")
 
-    document = db.query(Document).filter(Document.id == doc_uuid).first()
+    row = db.query(
+        Document,
+        Document.accessible_to(user_uuid).label("accessible")
+    ).filter(Document.id == doc_uuid).first()
 
-    if not document:
+    if not row:
         raise HTTPException(status_code=404, detail="Document not found")
+    document = row.Document
 
-    # Check access rights
-    is_owner = document.user_id == user_uuid
-    is_public_approved = (
-        document.visibility == VisibilityType.PUBLIC.value and
-        document.is_approved
-    )
-
-    # Check if user is admin
-    user_profile = db.query(UserProfile).filter(UserProfile.id == user_uuid).first()
-    is_admin = user_profile and user_profile.role == UserRole.ADMIN
-
-    if not is_owner and not is_public_approved and not is_admin:
-        raise HTTPException(status_code=403, detail="Access denied")
+    # Only look up the role when ownership/visibility didn't already decide it
+    if not row.accessible:
+        role = db.query(UserProfile.role).filter(UserProfile.id == user_uuid).scalar()
+        if role != UserRole.ADMIN.value:
+            raise HTTPException(status_code=403, detail="Access denied")
 
     return document
 
@@ -488,15 +467,14 @@ async def get_document(
 # ============================================================================
 
 @router.patch("/{document_id}")
-async def update_document(
+def update_document(
     document_id: str,
     doc_update: DocumentUpdate,
-    current_user: dict = Depends(get_current_user),
+    user_uuid: uuid.UUID = Depends(get_current_user_id),
     db: Session = Depends(get_db)
 ):
     """Update document metadata. Only the owner can update."""
-    user_uuid = uuid.UUID(current_user.get("sub"))
-    doc_uuid = uuid.UUID(document_id)
+    doc_uuid = parse_uuid(document_id, "document id")
 
     document = db.query(Document).filter(
         Document.id == doc_uuid,
@@ -520,19 +498,16 @@ async def update_document(
 
 
 @router.delete("/{document_id}")
-async def delete_document(
+def delete_document(
     document_id: str,
-    current_user: dict = Depends(get_current_user),
+    user_profile: UserProfile = Depends(get_current_user_profile),
     db: Session = Depends(get_db)
 ):
     """Delete a document and all related data. Only the owner can delete."""
-    # Parse UUIDs
-    user_uuid = uuid.UUID(current_user.get("sub"))
-    doc_uuid = uuid.UUID(document_id)
+    user_uuid = user_profile.id
+    doc_uuid = parse_uuid(document_id, "document id")
 
-    # Check if user is admin
-    user_profile = db.query(UserProfile).filter(UserProfile.id == user_uuid).first()
-    is_admin = user_profile and user_profile.role == UserRole.ADMIN
+    is_admin = user_profile.role == UserRole.ADMIN.value
 
     if is_admin:
         document = db.query(Document).filter(Document.id == doc_uuid).first()
@@ -550,14 +525,10 @@ async def delete_document(
         DocumentEmbedding.document_id == doc_uuid
     ).delete(synchronize_session=False)
 
-    sessions = db.query(ChatSession).filter(
-        ChatSession.document_id == doc_uuid
-    ).all()
-
-    for session in sessions:
-        db.query(ChatMessage).filter(
-            ChatMessage.session_id == session.id
-        ).delete(synchronize_session=False)
+    doc_sessions = db.query(ChatSession.id).filter(ChatSession.document_id == doc_uuid)
+    db.query(ChatMessage).filter(
+        ChatMessage.session_id.in_(doc_sessions.scalar_subquery())
+    ).delete(synchronize_session=False)
 
     db.query(ChatSession).filter(
         ChatSession.document_id == doc_uuid
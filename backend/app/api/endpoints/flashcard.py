@@ -301,7 +301,7 @@ async def generate_flashcards_from_library(
 
 
 @router.post("/")
-async def create_manual_set(
+def create_manual_set(
     request: FlashcardCreateRequest,
     current_user: dict = Depends(get_current_user),
     db: Session = Depends(get_db)
@@ -339,7 +339,7 @@ async def create_manual_set(
 
 
 @router.get("/")
-async def list_my_sets(
+def list_my_sets(
     limit: int = Query(50, le=100),
     offset: int = Query(0, ge=0),
     current_user: dict = Depends(get_current_user),
@@ -351,7 +351,7 @@ async def list_my_sets(
 
 
 @router.get("/public")
-async def list_public_flashcard_sets(
+def list_public_flashcard_sets(
     limit: int = Query(50, le=100),
     offset: int = Query(0, ge=0),
     db: Session = Depends(get_db)
@@ -361,7 +361,7 @@ async def list_public_flashcard_sets(
 
 
 @router.get("/{set_id}")
-async def get_set(
+def get_set(
     set_id: str,
     current_user: dict = Depends(get_current_user),
     db: Session = Depends(get_db)
@@ -377,7 +377,7 @@ async def get_set(
 
 
 @router.post("/{set_id}/cards")
-async def add_card(
+def add_card(
     set_id: str,
     request: FlashcardAddCardRequest,
     current_user: dict = Depends(get_current_user),
@@ -401,7 +401,7 @@ async def add_card(
 
 
 @router.put("/card/{card_id}")
-async def update_card_endpoint(
+def update_card_endpoint(
     card_id: str,
     request: FlashcardUpdateCardRequest,
     current_user: dict = Depends(get_current_user),
@@ -425,7 +425,7 @@ async def update_card_endpoint(
 
 
 @router.delete("/card/{card_id}")
-async def delete_card_endpoint(
+def delete_card_endpoint(
     card_id: str,
     current_user: dict = Depends(get_current_user),
     db: Session = Depends(get_db)
@@ -442,7 +442,7 @@ async def delete_card_endpoint(
 
 
 @router.delete("/{set_id}")
-async def delete_set_endpoint(
+def delete_set_endpoint(
     set_id: str,
     current_user: dict = Depends(get_current_user),
     db: Session = Depends(get_db)
@@ -459,7 +459,7 @@ async def delete_set_endpoint(
 
 
 @router.patch("/{set_id}/share")
-async def toggle_share(
+def toggle_share(
     set_id: str,
     request: FlashcardShareRequest,
     current_user: dict = Depends(get_current_user),
@@ -476,7 +476,7 @@ async def toggle_share(
 
 
 @router.post("/card/{card_id}/review")
-async def review_card_endpoint(
+def review_card_endpoint(
     card_id: str,
     request: FlashcardReviewRequest,
     current_user: dict = Depends(get_current_user),
@@ -493,7 +493,7 @@ async def review_card_endpoint(
 
 
 @router.get("/{set_id}/study")
-async def get_study_set(
+def get_study_set(
     set_id: str,
     current_user: dict = Depends(get_current_user),
     db: Session = Depends(get_db)
@@ -509,7 +509,7 @@ async def get_study_set(
 
 
 @router.get("/{set_id}/difficult")
-async def get_set_difficult_cards_endpoint(
+def get_set_difficult_cards_endpoint(
     set_id: str,
     limit: int = Query(50, le=100),
     current_user: dict = Depends(get_current_user),
@@ -526,7 +526,7 @@ async def get_set_difficult_cards_endpoint(
 
 
 @router.get("/{set_id}/all")
-async def get_all_cards_endpoint(
+def get_all_cards_endpoint(
     set_id: str,
     current_user: dict = Depends(get_current_user),
     db: Session = Depends(get_db)
@@ -542,7 +542,7 @@ async def get_all_cards_endpoint(
 
 
 @router.get("/stats")
-async def get_stats(
+def get_stats(
     current_user: dict = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
@@ -552,7 +552,7 @@ async def get_stats(
 
 
 @router.get("/reviews/difficult")
-async def list_difficult_cards(
+def list_difficult_cards(
     limit: int = Query(50, le=100),
     current_user: dict = Depends(get_current_user),
     db: Session = Depends(get_db)
@@ -6,15 +6,40 @@ the initial admin user. They are designed to work only once.
 """
 from fastapi import APIRouter, Depends, HTTPException
 from pydantic import BaseModel
-from sqlalchemy import text, inspect
-from sqlalchemy.exc import ProgrammingError
+from sqlalchemy import update
+from sqlalchemy.orm import Session
 from app.services.auth import get_current_user
-from app.db.session import SessionLocal
+from app.db.session import get_db
 from app.models.user import UserProfile, UserRole
+import datetime
+import time
 import uuid
 
 router = APIRouter()
 
+# Once an admin exists setup is normally over, so a positive answer is kept
+# in memory and /status (hit on every frontend load) rarely queries the DB.
+# It expires, because the only admin can be demoted (possibly on another
+# worker), and then setup must become available again.
+ADMIN_EXISTS_CACHE_TTL = 60  # seconds
+_admin_exists_until = 0.0  # time.monotonic() deadline
+
+
+def _admin_known_to_exist() -> bool:
+    return time.monotonic() < _admin_exists_until
+
+
+def _remember_admin_exists() -> None:
+    global _admin_exists_until
+    _admin_exists_until = time.monotonic() + ADMIN_EXISTS_CACHE_TTL
+
+
+def _any_admin(db) -> bool:
+    """SELECT EXISTS over the admin partial index instead of fetching a profile row."""
+    return db.query(
+        db.query(UserProfile.id).filter(UserProfile.role == UserRole.ADMIN.value).exists()
+    ).scalar()
+
 
 class SetupResponse(BaseModel):
     """Response for setup operations."""
@@ -22,35 +47,10 @@ class SetupResponse(BaseModel):
     success: bool
 
 
-def table_exists(db, table_name: str) -> bool:
-    """Check if a table exists in the database."""
-    try:
-        inspector = inspect(db.bind)
-        return table_name in inspector.get_table_names()
-    except Exception:
-        return False
-
-
-def ensure_user_profiles_table(db):
-    """Create user_profiles table if it doesn't exist."""
-    if not table_exists(db, 'user_profiles'):
-        db.execute(text("""
-            CREATE TABLE IF NOT EXISTS user_profiles (
-                id UUID PRIMARY KEY DEFAULT gen_random_uuid(),
-                user_id UUID UNIQUE NOT NULL,
-                role VARCHAR(20) NOT NULL DEFAULT 'user',
-                created_at TIMESTAMP DEFAULT now(),
-                updated_at TIMESTAMP DEFAULT now()
-            )
-        """))
-        db.execute(text("CREATE INDEX IF NOT EXISTS ix_user_profiles_user_id ON user_profiles (user_id)"))
-        db.execute(text("CREATE INDEX IF NOT EXISTS ix_user_profiles_role ON user_profiles (role)"))
-        db.commit()
-
-
 @router.post("/make-me-admin", response_model=SetupResponse)
-async def make_first_admin(
-    current_user: dict = Depends(get_current_user)
+def make_first_admin(
+    current_user: dict = Depends(get_current_user),
+    db: Session = Depends(get_db)
 ):
     """
     Make the current user the first admin.
@@ -62,73 +62,54 @@ async def make_first_admin(
     Use this for initial setup only. After the first admin is created,
     use the admin panel to manage other users' roles.
     """
-    db = SessionLocal()
-    try:
-        # Ensure table exists
-        ensure_user_profiles_table(db)
-
-        # Check if any admin exists
-        existing_admin = db.query(UserProfile).filter(
-            UserProfile.role == UserRole.ADMIN.value
-        ).first()
-
-        if existing_admin:
-            raise HTTPException(
-                status_code=400,
-                detail="An admin already exists. Use the admin panel to manage roles."
-            )
-
-        user_id = uuid.UUID(current_user.get("sub"))
-        email = current_user.get("email")
-
-        # Get or create user profile
-        profile = db.query(UserProfile).filter(UserProfile.id == user_id).first()
-
-        if not profile:
-            profile = UserProfile(
-                id=user_id,
-                role=UserRole.ADMIN.value
-            )
-            db.add(profile)
-        else:
-            profile.role = UserRole.ADMIN.value
-
-        db.commit()
-
-        return SetupResponse(
-            message=f"User {email} is now an admin!",
-            success=True
+    # Always ask the DB here: the cached answer can be stale if the only
+    # admin has since been demoted, and this endpoint is rarely called
+    if _any_admin(db):
+        _remember_admin_exists()
+        raise HTTPException(
+            status_code=400,
+            detail="An admin already exists. Use the admin panel to manage roles."
         )
-    finally:
-        db.close()
+
+    user_id = uuid.UUID(current_user.get("sub"))
+    email = current_user.get("email")
+
+    # Profiles are created at registration, so promote the existing row in
+    # one statement
+    result = db.execute(
+        update(UserProfile)
+        .where(UserProfile.id == user_id)
+        .values(role=UserRole.ADMIN.value, updated_at=datetime.datetime.utcnow())
+        .execution_options(synchronize_session=False)
+    )
+    if result.rowcount == 0:
+        db.rollback()
+        raise HTTPException(status_code=404, detail="User profile not found")
+    db.commit()
+    _remember_admin_exists()
+
+    return SetupResponse(
+        message=f"User {email} is now an admin!",
+        success=True
+    )
 
 
 @router.get("/status")
-async def get_setup_status():
+def get_setup_status(db: Session = Depends(get_db)):
     """
     Check if initial setup is needed.
 
     Returns whether an admin exists in the system.
     """
-    db = SessionLocal()
-    try:
-        # Ensure table exists first
-        ensure_user_profiles_table(db)
-
-        admin_exists = db.query(UserProfile).filter(
-            UserProfile.role == UserRole.ADMIN.value
-        ).first() is not None
-
-        return {
-            "admin_exists": admin_exists,
-            "setup_needed": not admin_exists
-        }
-    except Exception as e:
-        # If table doesn't exist, setup is needed
-        return {
-            "admin_exists": False,
-            "setup_needed": True,
-            "error": str(e)
-        }
-    finally:
-        db.close()
+    if _admin_known_to_exist():
+        return {"admin_exists": True, "setup_needed": False}
+
+    admin_exists = _any_admin(db)
+    if admin_exists:
+        _remember_admin_exists()
+
+    return {
+        "admin_exists": admin_exists,
+        "setup_needed": not admin_exists
+    }
+
@@ -3,6 +3,7 @@ Test management endpoints.
 
 Handles test creation from PDF documents, quiz taking, submission and history.
 """
+import traceback
 import uuid
 from fastapi import APIRouter, Depends, HTTPException, Query
 from pydantic import BaseModel, Field
@@ -307,7 +308,7 @@ async def generate_test_from_library(
 
 
 @router.get("/")
-async def list_my_tests(
+def list_my_tests(
     limit: int = Query(50, le=100),
     offset: int = Query(0, ge=0),
     current_user: dict = Depends(get_current_user),
@@ -319,7 +320,7 @@ async def list_my_tests(
 
 
 @router.get("/public")
-async def list_public_tests(
+def list_public_tests(
     limit: int = Query(50, le=100),
     offset: int = Query(0, ge=0),
     db: Session = Depends(get_db)
@@ -329,7 +330,7 @@ async def list_public_tests(
 
 
 @router.get("/stats")
-async def get_user_test_stats(
+def get_user_test_stats(
     current_user: dict = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
@@ -338,20 +339,19 @@ async def get_user_test_stats(
         user_uuid = uuid.UUID(current_user.get("sub"))
         return get_test_stats(db, user_uuid)
     except Exception as e:
-        import traceback
         print(traceback.format_exc())
         raise HTTPException(status_code=500, detail=f"Stats Error: {str(e)}")
 
 
 @router.get("/{test_id}")
-async def get_test(
+def get_test(
     test_id: str,
     current_user: dict = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
     """Get test details with questions (without correct answers for taking)."""
     if test_id == "stats":
-        return await get_user_test_stats(current_user, db)
+        return get_user_test_stats(current_user, db)
         
     user_uuid = uuid.UUID(current_user.get("sub"))
     test_uuid = uuid.UUID(test_id)
@@ -368,7 +368,7 @@ def _test_completed(db: Session, test_id: uuid.UUID) -> bool:
 
 
 @router.post("/{test_id}/submit")
-async def submit_test(
+def submit_test(
     test_id: str,
     request: TestSubmitRequest,
     current_user: dict = Depends(get_current_user),
@@ -385,7 +385,7 @@ async def submit_test(
 
 
 @router.patch("/{test_id}/share")
-async def toggle_test_share(
+def toggle_test_share(
     test_id: str,
     request: TestShareRequest,
     current_user: dict = Depends(get_current_user),
@@ -402,7 +402,7 @@ async def toggle_test_share(
 
 
 @router.delete("/{test_id}")
-async def delete_test(
+def delete_test(
     test_id: str,
     current_user: dict = Depends(get_current_user),
     db: Session = Depends(get_db)
@@ -427,7 +427,7 @@ class TestExplainRequest(BaseModel):
 
 
 @router.get("/{test_id}/attempts")
-async def list_test_attempts(
+def list_test_attempts(
     test_id: str,
     current_user: dict = Depends(get_current_user),
     db: Session = Depends(get_db)
@@ -0,0 +1,24 @@
+"""
+Small helpers shared by the API endpoints.
+"""
+import functools
+import uuid
+
+from fastapi import HTTPException
+
+
+@functools.lru_cache(maxsize=4096)
+def _uuid_or_none(value: str) -> uuid.UUID | None:
+    """Parse a UUID string once; repeat ids (user subs, sessions) hit the cache."""
+    try:
+        return uuid.UUID(value)
+    except ValueError:
+        return None
+
+
+def parse_uuid(value: str | None, field_name: str) -> uuid.UUID:
+    """Parse an id from the request, or raise 400 naming the bad field."""
+    parsed = _uuid_or_none(value) if isinstance(value, str) else None
+    if parsed is None:
+        raise HTTPException(status_code=400, detail=f"Invalid {field_name}")
+    return parsed
@@ -1,3 +1,4 @@
+from functools import cached_property, lru_cache
 from pydantic_settings import BaseSettings
 from typing import List
 
@@ -15,6 +16,13 @@ class Settings(BaseSettings):
     
     # Database (PostgreSQL)
     DATABASE_URL: str
+    # Connection pool, per worker process. Sync endpoints run in a threadpool
+    # (40 threads by default), so the pool should cover that concurrency.
+    DB_POOL_SIZE: int = 10
+    DB_MAX_OVERFLOW: int = 20
+    DB_POOL_RECYCLE: int = 1800  # seconds
+    DB_POOL_TIMEOUT: int = 10  # seconds to wait for a free connection before erroring
+    DB_POOL_USE_LIFO: bool = True
     
     # JWT Auth
     SECRET_KEY: str = "change-me-to-a-random-secret-key"
@@ -23,6 +31,13 @@ class Settings(BaseSettings):
     # AI Services
     GEMINI_API_KEY: str
     DEEPSEEK_API_KEY: str | None = None  # Optional - for economic AI mode
+    # Worker threads for the blocking Gemini SDK calls (chat, OCR, embeddings),
+    # per worker process. DeepSeek uses its async client and needs none.
+    AI_EXECUTOR_WORKERS: int = 8
+    # Embedding batch requests in flight at once while processing a document
+    EMBED_CONCURRENCY: int = 4
+    # Documents processed at once by the background document worker
+    DOCUMENT_CONCURRENCY: int = 4
     
     # File Storage
     UPLOAD_DIR: str = "uploads"
@@ -30,9 +45,21 @@ class Settings(BaseSettings):
     # Debug mode - set to False in production
     DEBUG_MODE: bool = False
 
+    @cached_property
+    def allowed_origins(self) -> List[str]:
+        """ALLOWED_ORIGINS split into a list, parsed once per settings instance."""
+        return [origin.strip() for origin in self.ALLOWED_ORIGINS.split(",") if origin.strip()]
+
     class Config:
         case_sensitive = True
         env_file = ".env"
 
-settings = Settings()
+
+@lru_cache
+def get_settings() -> Settings:
+    """The process-wide Settings, read from the environment / .env once."""
+    return Settings()
+
+
+settings = get_settings()
 
@@ -0,0 +1,36 @@
+"""
+Application logging setup.
+
+Log records from the app.* loggers go onto an in-memory queue and are
+written to stdout by a background QueueListener thread, so request
+handlers never block on formatting or stdout writes.
+"""
+import atexit
+import logging
+import logging.handlers
+import queue
+
+_listener: logging.handlers.QueueListener | None = None
+
+
+def setup_logging(debug: bool = False) -> None:
+    """Attach a queue-backed handler to the "app" logger (idempotent)."""
+    global _listener
+    if _listener is not None:
+        return
+
+    log_queue: queue.SimpleQueue = queue.SimpleQueue()
+
+    stream_handler = logging.StreamHandler()
+    stream_handler.setFormatter(
+        logging.Formatter("%(asctime)s %(levelname)s [%(name)s] %(message)s")
+    )
+
+    _listener = logging.handlers.QueueListener(log_queue, stream_handler, respect_handler_level=True)
+    _listener.start()
+    atexit.register(_listener.stop)
+
+    app_logger = logging.getLogger("app")
+    app_logger.setLevel(logging.DEBUG if debug else logging.INFO)
+    app_logger.addHandler(logging.handlers.QueueHandler(log_queue))
+    app_logger.propagate = False
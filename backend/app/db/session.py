@@ -11,22 +11,46 @@ SQLALCHEMY_DATABASE_URL = settings.DATABASE_URL
 engine = create_engine(
     SQLALCHEMY_DATABASE_URL,
     poolclass=QueuePool,
-    pool_size=5,
-    max_overflow=10,
-    pool_timeout=30,
-    pool_recycle=300,  # Recycle connections every 5 minutes
+    pool_size=settings.DB_POOL_SIZE,
+    max_overflow=settings.DB_MAX_OVERFLOW,
+    pool_timeout=settings.DB_POOL_TIMEOUT,
+    pool_recycle=settings.DB_POOL_RECYCLE,  # Recycle connections every 30 minutes by default
     pool_pre_ping=True,  # Test connection before using it
+    # Hand out the most recently returned connection, so a few warm ones
+    # serve light load and idle overflow connections can be recycled
+    pool_use_lifo=settings.DB_POOL_USE_LIFO,
     connect_args={
         "connect_timeout": 30,
         "keepalives": 1,
         "keepalives_idle": 30,
         "keepalives_interval": 10,
         "keepalives_count": 5,
+        # Identifies this service's connections in pg_stat_activity
+        "application_name": settings.PROJECT_NAME,
     }
 )
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
 
+def warm_pool() -> int:
+    """
+    Open DB_POOL_SIZE connections up front so early requests skip the
+    connect/auth handshake.
+
+    The connections are held together before being returned; opening and
+    closing them one at a time would just reuse the same connection.
+    Returns the number of connections opened.
+    """
+    connections = []
+    try:
+        for _ in range(settings.DB_POOL_SIZE):
+            connections.append(engine.connect())
+    finally:
+        for conn in connections:
+            conn.close()
+    return len(connections)
+
+
 def get_db() -> Generator[Session, None, None]:
     """
     Database session dependency for FastAPI.
@@ -1,42 +1,25 @@
 import os
+from contextlib import asynccontextmanager
 from pathlib import Path
 from fastapi import FastAPI
+from fastapi.responses import ORJSONResponse
 from fastapi.staticfiles import StaticFiles
 from app.core.config import settings
+from app.core.logging_config import setup_logging
+from app.db.session import SessionLocal, engine, warm_pool
+from sqlalchemy import text
 
 from fastapi.middleware.cors import CORSMiddleware
 
-app = FastAPI(
-    title=settings.PROJECT_NAME,
-    version=settings.PROJECT_VERSION,
-    openapi_url=f"{settings.API_V1_STR}/openapi.json"
-)
-
-# Parse CORS origins from config
-origins = [origin.strip() for origin in settings.ALLOWED_ORIGINS.split(",")]
-
-app.add_middleware(
-    CORSMiddleware,
-    allow_origins=origins,
-    allow_credentials=True,
-    allow_methods=["*"],
-    allow_headers=["*"],
-)
+setup_logging(debug=settings.DEBUG_MODE)
 
-# Ensure uploads directory exists and mount it as static files
-uploads_dir = Path(settings.UPLOAD_DIR)
-uploads_dir.mkdir(parents=True, exist_ok=True)
-app.mount("/uploads", StaticFiles(directory=str(uploads_dir)), name="uploads")
-
-@app.on_event("startup")
-async def startup_event():
+@asynccontextmanager
+async def lifespan(app: FastAPI):
     print(f"🚀 {settings.PROJECT_NAME} API starting...")
     print(f"📡 CORS allowed origins: {origins}")
     print(f"📂 Uploads directory: {uploads_dir.resolve()}")
     
     # Ensure pgvector extension exists
-    from app.db.session import SessionLocal
-    from sqlalchemy import text
     db = SessionLocal()
     try:
         print("🔧 Ensuring pgvector extension is enabled...")
@@ -49,6 +32,67 @@ async def startup_event():
     finally:
         db.close()
 
+    # Schema is owned by Alembic; request handlers no longer create tables
+    # or columns on the fly, so flag a database that is behind head
+    try:
+        from alembic.config import Config
+        from alembic.runtime.migration import MigrationContext
+        from alembic.script import ScriptDirectory
+
+        alembic_cfg = Config(str(Path(__file__).resolve().parent.parent / "alembic.ini"))
+        expected_heads = set(ScriptDirectory.from_config(alembic_cfg).get_heads())
+        with engine.connect() as conn:
+            current_heads = set(MigrationContext.configure(conn).get_current_heads())
+        if current_heads != expected_heads:
+            print(f"⚠️ Warning: database schema at {sorted(current_heads)}, expected {sorted(expected_heads)} - run 'alembic upgrade head'")
+        else:
+            print("✅ Database schema is up to date")
+    except Exception as e:
+        print(f"⚠️ Warning: Could not verify database schema version: {e}")
+
+    try:
+        print(f"🔥 Warmed {warm_pool()} database connections")
+    except Exception as e:
+        print(f"⚠️ Warning: Could not warm the connection pool: {e}")
+
+    yield
+
+    # Close pooled connections so the database and DeepSeek see a clean
+    # disconnect
+    engine.dispose()
+    from app.services.deepseek_service import deepseek_service
+    await deepseek_service.aclose()
+
+
+app = FastAPI(
+    title=settings.PROJECT_NAME,
+    version=settings.PROJECT_VERSION,
+    openapi_url=f"{settings.API_V1_STR}/openapi.json",
+    default_response_class=ORJSONResponse,
+    lifespan=lifespan
+)
+
+origins = settings.allowed_origins
+
+app.add_middleware(
+    CORSMiddleware,
+    allow_origins=origins,
+    allow_credentials=True,
+    allow_methods=["*"],
+    # The frontend only sends these; an explicit list gives every preflight
+    # the same cacheable answer instead of echoing the requested headers
+    allow_headers=["Authorization", "Content-Type"],
+    expose_headers=["X-Next-Cursor"],
+    # Let browsers reuse a preflight for up to a day (browsers clamp this to
+    # their own cap) instead of the 10 minute default
+    max_age=86400,
+)
+
+# Ensure uploads directory exists and mount it as static files
+uploads_dir = Path(settings.UPLOAD_DIR)
+uploads_dir.mkdir(parents=True, exist_ok=True)
+app.mount("/uploads", StaticFiles(directory=str(uploads_dir)), name="uploads")
+
 from app.api.api import api_router
 app.include_router(api_router, prefix=settings.API_V1_STR)
 
@@ -1,5 +1,5 @@
 import uuid
-from sqlalchemy import Column, String, ForeignKey, DateTime, Text, Table
+from sqlalchemy import Column, String, ForeignKey, DateTime, Text, Table, Index, text
 from sqlalchemy.dialects.postgresql import UUID
 from sqlalchemy.orm import relationship
 from app.db.base import Base
@@ -9,7 +9,7 @@ class ChatSession(Base):
     __tablename__ = "chat_sessions"
 
     id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4, index=True)
-    user_id = Column(UUID(as_uuid=True), index=True)
+    user_id = Column(UUID(as_uuid=True))
     document_id = Column(UUID(as_uuid=True), ForeignKey("documents.id"))
     title = Column(String)
     updated_at = Column(DateTime, default=datetime.datetime.utcnow)
@@ -17,6 +17,14 @@ class ChatSession(Base):
     document = relationship("Document", back_populates="chat_sessions")
     messages = relationship("ChatMessage", back_populates="session")
 
+    __table_args__ = (
+        # Latest session for a user's document (chat history); the user_id
+        # prefix also covers lookups by user alone
+        Index("ix_chat_sessions_user_document_updated", "user_id", "document_id", text("updated_at DESC")),
+        # Document deletion removes its sessions by document_id
+        Index("ix_chat_sessions_document_id", "document_id"),
+    )
+
 class ChatMessage(Base):
     __tablename__ = "chat_messages"
 
@@ -28,6 +36,11 @@ class ChatMessage(Base):
     
     session = relationship("ChatSession", back_populates="messages")
 
+    __table_args__ = (
+        # Chat history is read per session in created_at order
+        Index("ix_chat_messages_session_created", "session_id", "created_at"),
+    )
+
 
 # Multi-Document Session Models
 # Association table for many-to-many relationship
@@ -51,19 +64,34 @@ class MultiDocumentSession(Base):
     
     # Many-to-many relationship with documents
     documents = relationship("Document", secondary=multi_session_documents, backref="multi_sessions")
-    messages = relationship("MultiSessionMessage", back_populates="session", cascade="all, delete-orphan")
+    messages = relationship(
+        "MultiSessionMessage",
+        back_populates="session",
+        cascade="all, delete-orphan",
+        order_by="MultiSessionMessage.created_at",
+    )
     flashcard_sets = relationship("FlashcardSet", back_populates="session")
 
+    __table_args__ = (
+        # Session list: a user's sessions, most recently updated first
+        Index("ix_multi_document_sessions_user_updated", "user_id", text("updated_at DESC")),
+    )
+
 
 class MultiSessionMessage(Base):
     """Messages in a multi-document chat session."""
     __tablename__ = "multi_session_messages"
 
     id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4, index=True)
-    session_id = Column(UUID(as_uuid=True), ForeignKey("multi_document_sessions.id", ondelete="CASCADE"), nullable=False)
+    session_id = Column(UUID(as_uuid=True), ForeignKey("multi_document_sessions.id", ondelete="CASCADE"), nullable=False, index=True)
     sender = Column(String(10), nullable=False)  # 'user' or 'ai'
     message = Column(Text, nullable=False)
     created_at = Column(DateTime, default=datetime.datetime.utcnow)
     
     session = relationship("MultiDocumentSession", back_populates="messages")
 
+    __table_args__ = (
+        # Messages are read per session in created_at order
+        Index("ix_multi_session_messages_session_created", "session_id", "created_at"),
+    )
+
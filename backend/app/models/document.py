@@ -1,5 +1,5 @@
 import uuid
-from sqlalchemy import Column, String, Boolean, ForeignKey, DateTime, Text, Enum as SQLEnum, Integer
+from sqlalchemy import Column, String, Boolean, ForeignKey, DateTime, Text, Enum as SQLEnum, Integer, Index, and_, or_, text
 from sqlalchemy.dialects.postgresql import UUID
 from sqlalchemy.orm import relationship
 from app.db.base import Base
@@ -13,6 +13,14 @@ class VisibilityType(str, enum.Enum):
     PUBLIC = "public"
 
 
+class DocumentStatus(str, enum.Enum):
+    """Document processing status."""
+    PENDING = "pending"
+    PROCESSING = "processing"
+    COMPLETED = "completed"
+    FAILED = "failed"
+
+
 class DocumentType(str, enum.Enum):
     """Document type options."""
     COURSE = "course"  # Ders dökümanı
@@ -27,6 +35,10 @@ class DocumentCategory(Base):
     non-course documents (e.g., Article, Thesis, Book, Report, etc.)
     """
     __tablename__ = "document_categories"
+    __table_args__ = (
+        # Names are unique case-insensitively
+        Index("ix_document_categories_name_lower", text("lower(name)"), unique=True),
+    )
 
     id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4, index=True)
     name = Column(String(100), unique=True, nullable=False, index=True)
@@ -46,12 +58,42 @@ class Document(Base):
     Public documents require admin approval before becoming visible.
     """
     __tablename__ = "documents"
+    __table_args__ = (
+        # Admin review queue: public, unapproved, processed documents by age
+        Index(
+            "ix_documents_pending_queue", "created_at", "id",
+            postgresql_where=text("visibility = 'public' AND is_approved = false AND status = 'completed'"),
+        ),
+        # Admin dashboard "approved today" count
+        Index(
+            "ix_documents_approved_at", text("approved_at DESC"),
+            postgresql_where=text("is_approved = true"),
+        ),
+        # Community library: approved, processed public documents, newest first
+        Index(
+            "ix_documents_public_feed", text("created_at DESC"),
+            postgresql_where=text("visibility = 'public' AND is_approved = true AND status = 'completed'"),
+        ),
+        # Community library by course/topic: course and topic listings and filters
+        Index(
+            "ix_documents_public_course_topic", "course_name", "topic", "document_type",
+            postgresql_where=text("visibility = 'public' AND is_approved = true AND status = 'completed'"),
+        ),
+        # Community library filtered by category, newest first
+        Index(
+            "ix_documents_public_category", "category_id", text("created_at DESC"),
+            postgresql_where=text("visibility = 'public' AND is_approved = true AND status = 'completed'"),
+        ),
+    )
 
     id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4, index=True)
     user_id = Column(UUID(as_uuid=True), index=True)
     title = Column(String, index=True)
     file_url = Column(String)
-    status = Column(String, default="pending")  # pending, processing, completed, failed
+    status = Column(
+        SQLEnum(*[s.value for s in DocumentStatus], name="document_status"),
+        default=DocumentStatus.PENDING.value
+    )
     created_at = Column(DateTime, default=datetime.datetime.utcnow)
 
     # Document type: course or non-course
@@ -66,7 +108,11 @@ class Document(Base):
     category = relationship("DocumentCategory", back_populates="documents")
 
     # Visibility and approval
-    visibility = Column(String(20), default=VisibilityType.PRIVATE.value, index=True)
+    visibility = Column(
+        SQLEnum(*[v.value for v in VisibilityType], name="document_visibility"),
+        default=VisibilityType.PRIVATE.value,
+        index=True
+    )
     is_approved = Column(Boolean, default=False, index=True)
     approved_at = Column(DateTime, nullable=True)
     approved_by = Column(UUID(as_uuid=True), nullable=True)
@@ -76,15 +122,42 @@ class Document(Base):
     tests = relationship("Test", back_populates="document")
     flashcard_sets = relationship("FlashcardSet", back_populates="document")
 
-from pgvector.sqlalchemy import Vector
+    @classmethod
+    def accessible_to(cls, user_id):
+        """
+        SQL predicate: the user owns the document or it is public and approved.
+
+        Admins can see everything; callers handle that case separately so the
+        role is only looked up when this predicate fails.
+        """
+        return or_(
+            cls.user_id == user_id,
+            and_(cls.visibility == VisibilityType.PUBLIC.value, cls.is_approved == True)
+        )
+
+from pgvector.sqlalchemy import HALFVEC
 
 class DocumentEmbedding(Base):
     __tablename__ = "document_embeddings"
+    __table_args__ = (
+        # ANN index for ORDER BY cosine_distance(...) in RAG lookups
+        Index(
+            "ix_document_embeddings_embedding_hnsw",
+            "embedding",
+            postgresql_using="hnsw",
+            postgresql_with={"m": 16, "ef_construction": 64},
+            postgresql_ops={"embedding": "halfvec_cosine_ops"},
+        ),
+        # Full-document reads: one document's chunks in page order
+        Index("ix_document_embeddings_document_page", "document_id", "page_number"),
+    )
 
     id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4, index=True)
-    document_id = Column(UUID(as_uuid=True), ForeignKey("documents.id"))
+    document_id = Column(UUID(as_uuid=True), ForeignKey("documents.id"), index=True)
     page_number = Column(Integer, nullable=True, default=0, index=True)  # Chunk order for full-doc retrieval
     content = Column(String)
-    embedding = Column(Vector(768))
+    # fp16: half the storage and index memory of vector(768) at no practical
+    # cost to cosine ranking
+    embedding = Column(HALFVEC(768))
     
     document = relationship("Document", back_populates="embeddings")
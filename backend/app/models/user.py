@@ -6,7 +6,7 @@ Handles authentication, roles, and query limits.
 """
 import uuid
 import enum
-from sqlalchemy import Column, String, DateTime, Integer, Date
+from sqlalchemy import Column, String, DateTime, Integer, Date, Enum as SQLEnum, Index, text
 from sqlalchemy.dialects.postgresql import UUID
 from app.db.base import Base
 import datetime
@@ -27,13 +27,23 @@ class UserProfile(Base):
     user_id kept as alias of id for backward compatibility with existing code.
     """
     __tablename__ = "user_profiles"
+    __table_args__ = (
+        # Admin user list: newest first, keyset-paginated on (created_at, id)
+        Index("ix_user_profiles_created_at_id", "created_at", "id"),
+        # "Does any admin exist?" checks in setup: only admin rows are indexed
+        Index("ix_user_profiles_admins", "id", postgresql_where=text("role = 'admin'")),
+    )
 
     id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
     # user_id kept as a computed alias in code — the DB column is 'id'
     email = Column(String(255), unique=True, nullable=False, index=True)
     hashed_password = Column(String(255), nullable=False)
     full_name = Column(String(100), nullable=True)
-    role = Column(String(20), default=UserRole.USER.value, nullable=False)
+    role = Column(
+        SQLEnum(*[r.value for r in UserRole], name="user_role"),
+        default=UserRole.USER.value,
+        nullable=False
+    )
     
     # Daily query limit tracking
     daily_query_count = Column(Integer, default=0, nullable=False)
@@ -7,10 +7,27 @@ based on user preference, providing a consistent interface for chat operations.
 CACHE OPTIMIZATION:
 DeepSeek supports prefix caching. The new generate_answer_multi_doc method
 separates context and question to enable caching of the fixed context prefix.
+
+Full answers are also kept in a small in-process LRU keyed by model, question
+and context, so an identical question over identical context (retries,
+double submits, the same question asked again) skips the model call.
+Identical requests that arrive while the first is still running share its
+model call instead of starting their own.
 """
-from app.services.gemini_service import gemini_service
+import asyncio
+import hashlib
+import logging
+import time
+from collections import OrderedDict
+from typing import AsyncIterator, Awaitable, Callable
+from app.services.gemini_service import NO_ANSWER_TEXT, gemini_service
 from app.services.deepseek_service import deepseek_service
 
+logger = logging.getLogger(__name__)
+
+ANSWER_CACHE_SIZE = 256
+ANSWER_CACHE_TTL = 3600  # seconds
+
 
 class ModelUnavailableError(Exception):
     """Raised when the selected AI model is unavailable or fails."""
@@ -26,13 +43,76 @@ class AIService:
     def __init__(self):
         self.gemini = gemini_service
         self.deepseek = deepseek_service
-        print(f"[AIService] Initialized - DeepSeek enabled: {self.deepseek.enabled}")
+        # sha256(kind, model, question, context) -> (stored_at, answer)
+        self._answer_cache: OrderedDict[str, tuple[float, str]] = OrderedDict()
+        # Same key -> the model call currently producing that answer
+        self._inflight: dict[str, asyncio.Task] = {}
+        logger.info("[AIService] Initialized - DeepSeek enabled: %s", self.deepseek.enabled)
     
     def is_deepseek_available(self) -> bool:
         """Check if DeepSeek is configured and available."""
         return self.deepseek.enabled
     
+    @staticmethod
+    def _answer_key(kind: str, model: str, question: str, context: str) -> str:
+        h = hashlib.sha256()
+        for part in (kind, model, question, context):
+            h.update(part.encode("utf-8"))
+            h.update(b"\0")
+        return h.hexdigest()
+    
+    def _cached_answer(self, key: str) -> str | None:
+        cached = self._answer_cache.get(key)
+        if cached and time.monotonic() - cached[0] < ANSWER_CACHE_TTL:
+            self._answer_cache.move_to_end(key)
+            return cached[1]
+        return None
+    
+    def _store_answer(self, key: str, answer: str) -> None:
+        # Only real answers: an empty reply or the no-answer placeholder is a
+        # transient failure that must not be served to later askers
+        if not answer or answer == NO_ANSWER_TEXT:
+            return
+        self._answer_cache[key] = (time.monotonic(), answer)
+        self._answer_cache.move_to_end(key)
+        while len(self._answer_cache) > ANSWER_CACHE_SIZE:
+            self._answer_cache.popitem(last=False)
+    
+    def _finish_inflight(self, key: str, task: asyncio.Task) -> None:
+        self._inflight.pop(key, None)
+        if not task.cancelled() and task.exception() is None:
+            self._store_answer(key, task.result())
+    
+    async def _answer_once(self, key: str, generate: Callable[[], Awaitable[str]]) -> str:
+        """
+        Return the cached answer for key, or join/start the single model call
+        producing it. The call runs as its own task, so one caller going away
+        doesn't cancel it for the others.
+        """
+        answer = self._cached_answer(key)
+        if answer is not None:
+            return answer
+        task = self._inflight.get(key)
+        if task is None:
+            task = asyncio.ensure_future(generate())
+            self._inflight[key] = task
+            task.add_done_callback(lambda t: self._finish_inflight(key, t))
+        return await asyncio.shield(task)
+    
     async def generate_answer(self, question: str, context: str, model: str = "deepseek") -> str:
+        """
+        Generate an answer, served from the answer cache when the same
+        question was recently answered over the same context.
+        
+        Raises:
+            ModelUnavailableError: If the selected model fails
+        """
+        key = self._answer_key("single", model, question, context)
+        return await self._answer_once(
+            key, lambda: self._generate_answer(question, context, model)
+        )
+    
+    async def _generate_answer(self, question: str, context: str, model: str = "deepseek") -> str:
         """
         Generate an answer using the specified model.
         
@@ -53,14 +133,41 @@ class AIService:
             try:
                 return await self.deepseek.generate_answer(question, context)
             except Exception as e:
-                print(f"[AIService] DeepSeek failed: {e}")
+                logger.warning("[AIService] DeepSeek failed: %s", e)
                 raise ModelUnavailableError("DeepSeek", str(e))
         
         # Gemma / Gemini
         try:
             return await self.gemini.generate_chat_answer(question, context)
         except Exception as e:
-            print(f"[AIService] Gemma failed: {e}")
+            logger.warning("[AIService] Gemma failed: %s", e)
+            raise ModelUnavailableError("Gemma", str(e))
+    
+    async def stream_answer(self, question: str, context: str, model: str = "deepseek") -> AsyncIterator[str]:
+        """
+        Streaming counterpart of generate_answer; yields text deltas.
+        
+        Raises:
+            ModelUnavailableError: If the selected model fails, before or
+                during the stream
+        """
+        if model == "deepseek":
+            if not self.deepseek.enabled:
+                raise ModelUnavailableError("DeepSeek", "DeepSeek API yapılandırılmamış")
+            try:
+                async for delta in self.deepseek.stream_answer(question, context):
+                    yield delta
+            except Exception as e:
+                logger.warning("[AIService] DeepSeek stream failed: %s", e)
+                raise ModelUnavailableError("DeepSeek", str(e))
+            return
+        
+        # Gemma / Gemini
+        try:
+            async for delta in self.gemini.stream_chat_answer(question, context):
+                yield delta
+        except Exception as e:
+            logger.warning("[AIService] Gemma stream failed: %s", e)
             raise ModelUnavailableError("Gemma", str(e))
     
     async def generate_answer_simple(self, prompt: str, model: str = "deepseek") -> str:
@@ -83,14 +190,14 @@ class AIService:
             try:
                 return await self.deepseek.generate_answer_simple(prompt)
             except Exception as e:
-                print(f"[AIService] DeepSeek failed: {e}")
+                logger.warning("[AIService] DeepSeek failed: %s", e)
                 raise ModelUnavailableError("DeepSeek", str(e))
         
         # Gemma / Gemini
         try:
             return await self.gemini.generate_chat_answer_simple(prompt)
         except Exception as e:
-            print(f"[AIService] Gemma failed: {e}")
+            logger.warning("[AIService] Gemma failed: %s", e)
             raise ModelUnavailableError("Gemma", str(e))
     
     async def generate_answer_multi_doc(
@@ -98,6 +205,23 @@ class AIService:
         question: str, 
         combined_context: str, 
         model: str = "deepseek"
+    ) -> str:
+        """
+        Multi-document answer, served from the answer cache when possible.
+        
+        Raises:
+            ModelUnavailableError: If the selected model fails
+        """
+        key = self._answer_key("multi", model, question, combined_context)
+        return await self._answer_once(
+            key, lambda: self._generate_answer_multi_doc(question, combined_context, model)
+        )
+    
+    async def _generate_answer_multi_doc(
+        self, 
+        question: str, 
+        combined_context: str, 
+        model: str = "deepseek"
     ) -> str:
         """
         Cache-optimized answer generation for multi-document chat.
@@ -124,14 +248,14 @@ class AIService:
                 # Use cache-optimized method
                 return await self.deepseek.generate_answer_multi_doc(question, combined_context)
             except Exception as e:
-                print(f"[AIService] DeepSeek failed: {e}")
+                logger.warning("[AIService] DeepSeek failed: %s", e)
                 raise ModelUnavailableError("DeepSeek", str(e))
         
         # Gemma / Gemini
         try:
             return await self.gemini.generate_chat_answer_multi_doc(question, combined_context)
         except Exception as e:
-            print(f"[AIService] Gemma failed: {e}")
+            logger.warning("[AIService] Gemma failed: %s", e)
             raise ModelUnavailableError("Gemma", str(e))
 
 
@@ -5,6 +5,10 @@ Replaces the old Supabase auth with a fully self-hosted solution.
 Handles password hashing, JWT token creation/verification, and
 the FastAPI dependency for protected endpoints.
 """
+import threading
+import time
+import uuid
+from collections import OrderedDict
 from datetime import datetime, timedelta
 from typing import Optional
 
@@ -12,8 +16,11 @@ from fastapi import Depends, HTTPException, status
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from jose import JWTError, jwt
 from passlib.context import CryptContext
+from sqlalchemy.orm import Session
 
 from app.core.config import settings
+from app.db.session import get_db
+from app.models.user import UserProfile
 
 # ---------------------------------------------------------------------------
 # Password hashing
@@ -45,14 +52,40 @@ def create_access_token(data: dict, expires_delta: Optional[timedelta] = None) -
     return jwt.encode(to_encode, settings.SECRET_KEY, algorithm=ALGORITHM)
 
 
+# Verified tokens -> (cached_until, payload). The same token arrives on every
+# request of a session, so its signature and claims are checked once and
+# reused until the token expires (or the TTL runs out, whichever is first).
+VERIFIED_TOKEN_CACHE_SIZE = 4096
+VERIFIED_TOKEN_CACHE_TTL = 300  # seconds
+_verified_tokens: OrderedDict[str, tuple[float, dict]] = OrderedDict()
+# Sync endpoints verify tokens from many threadpool threads at once
+_verified_tokens_lock = threading.Lock()
+
+
 def verify_token(token: str) -> dict | None:
     """Decode and verify a JWT token. Returns the payload or None."""
+    now = time.time()
+    with _verified_tokens_lock:
+        cached = _verified_tokens.get(token)
+        if cached and now < cached[0]:
+            _verified_tokens.move_to_end(token)
+            return cached[1]
+
     try:
         payload = jwt.decode(token, settings.SECRET_KEY, algorithms=[ALGORITHM])
-        return payload
     except JWTError:
         return None
 
+    cached_until = now + VERIFIED_TOKEN_CACHE_TTL
+    if isinstance(payload.get("exp"), (int, float)):
+        cached_until = min(cached_until, payload["exp"])
+    with _verified_tokens_lock:
+        _verified_tokens[token] = (cached_until, payload)
+        _verified_tokens.move_to_end(token)
+        while len(_verified_tokens) > VERIFIED_TOKEN_CACHE_SIZE:
+            _verified_tokens.popitem(last=False)
+    return payload
+
 
 # ---------------------------------------------------------------------------
 # FastAPI dependency — drop-in replacement for the old get_current_user
@@ -78,3 +111,41 @@ def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(securit
         )
 
     return payload
+
+
+def get_current_user_id(current_user: dict = Depends(get_current_user)) -> uuid.UUID:
+    """
+    FastAPI dependency returning the authenticated user's id as a UUID.
+
+    The "sub" claim is parsed once per request (FastAPI caches dependencies
+    within a request) instead of by hand in every handler.
+    """
+    try:
+        return uuid.UUID(current_user["sub"])
+    except (TypeError, ValueError):
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Could not validate credentials",
+            headers={"WWW-Authenticate": "Bearer"},
+        )
+
+
+def get_current_user_profile(
+    user_id: uuid.UUID = Depends(get_current_user_id),
+    db: Session = Depends(get_db)
+) -> UserProfile:
+    """
+    FastAPI dependency returning the authenticated user's profile row.
+
+    Loaded once per request and shared by everything that depends on it.
+    Profiles are created at registration, so a missing row means the
+    account no longer exists.
+    """
+    profile = db.query(UserProfile).filter(UserProfile.id == user_id).first()
+    if not profile:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Could not validate credentials",
+            headers={"WWW-Authenticate": "Bearer"},
+        )
+    return profile
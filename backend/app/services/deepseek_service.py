@@ -15,14 +15,17 @@ Message structure for cache optimization:
 3. User question (VARIABLE) - only this changes
 """
 import asyncio
+import functools
+import logging
 import re
 import unicodedata
-from concurrent.futures import ThreadPoolExecutor
-from openai import OpenAI
+import weakref
+from typing import AsyncIterator
+import httpx
+from openai import AsyncOpenAI
 from app.core.config import settings
 
-# Thread pool for blocking API calls
-executor = ThreadPoolExecutor(max_workers=3)
+logger = logging.getLogger(__name__)
 
 # Fixed system prompts for cache consistency
 SYSTEM_PROMPT_SINGLE = """Sen akademik konularda uzman, yardımcı bir Türkçe asistansın.
@@ -57,6 +60,36 @@ FORMATLAMA:
 - Kod varsa ``` bloğu kullan"""
 
 
+# Whitespace patterns for normalize_text_for_cache. Runs of two or more only,
+# so single spaces aren't matched and rewritten one by one.
+_TRAILING_WS = re.compile(r'[^\S\n]+(?=\n|\Z)')
+_SPACE_RUN = re.compile(r' {2,}')
+_NEWLINE_RUN = re.compile(r'\n{3,}')
+
+# ASCII characters _TRAILING_WS can strip (what str.isspace() accepts, minus \n)
+_ASCII_INLINE_WS = ' \t\r\x0b\x0c\x1c\x1d\x1e\x1f'
+
+
+def _normalize_ascii(text: str) -> str:
+    """
+    normalize_text_for_cache for pure-ASCII text: NFC is a no-op, and each
+    substitution only runs when a substring search (far cheaper than a regex
+    scan) shows it has something to replace. Same output as the full path.
+    """
+    if text[-1:].isspace() or any(ws + '\n' in text for ws in _ASCII_INLINE_WS):
+        text = _TRAILING_WS.sub('', text)
+    if '  ' in text:
+        text = _SPACE_RUN.sub(' ', text)
+    if '\n\n\n' in text:
+        text = _NEWLINE_RUN.sub('\n\n', text)
+    return text.strip()
+
+
+# Follow-up questions in a session send the same document context again;
+# keep the normalized form of recent contexts instead of re-scanning them.
+# Kept small: each entry holds a context of up to MAX_CONTEXT_CHARS twice
+# (key and value), so a few slots cover the sessions active at once
+@functools.lru_cache(maxsize=8)
 def normalize_text_for_cache(text: str) -> str:
     """
     Normalize text to ensure consistent cache hits.
@@ -70,24 +103,69 @@ def normalize_text_for_cache(text: str) -> str:
     """
     if not text:
         return ""
+    if text.isascii():
+        return _normalize_ascii(text)
     
-    # Normalize Unicode (NFC form for consistency)
-    text = unicodedata.normalize('NFC', text)
+    # Normalize Unicode (NFC form for consistency). is_normalized stops at
+    # the first offending character, so most texts skip the normalizing pass
+    if not unicodedata.is_normalized('NFC', text):
+        text = unicodedata.normalize('NFC', text)
+    
+    # Remove trailing whitespace from each line (first, so whitespace-only
+    # lines count as blank for the newline collapse below)
+    text = _TRAILING_WS.sub('', text)
     
     # Replace multiple spaces with single space
-    text = re.sub(r' +', ' ', text)
+    text = _SPACE_RUN.sub(' ', text)
     
     # Replace multiple newlines with double newline (paragraph break)
-    text = re.sub(r'\n{3,}', '\n\n', text)
-    
-    # Remove trailing whitespace from each line
-    lines = [line.rstrip() for line in text.split('\n')]
-    text = '\n'.join(lines)
+    text = _NEWLINE_RUN.sub('\n\n', text)
     
     # Final trim
     return text.strip()
 
 
+# Upper bound on document context sent to deepseek-chat (64K-token window,
+# ~4 chars per token, leaving room for the prompt, history and answer).
+# Applied before normalization so an oversized tail is never scanned; the
+# chat endpoints already budget below this, so it only guards other callers.
+MAX_CONTEXT_CHARS = 200_000
+
+
+# Chat history sent with a question: at most this many recent messages and
+# roughly this many characters (~1000 tokens), dropped from the oldest side
+MAX_HISTORY_MESSAGES = 6
+MAX_HISTORY_CHARS = 4000
+
+
+def _history_messages(chat_history: list[dict]) -> list[dict]:
+    """
+    Normalize recent chat history into API messages. Content is normalized
+    like the document context, so an unchanged turn is sent byte-for-byte
+    the same on the next request and stays in DeepSeek's cached prefix.
+    """
+    messages = []
+    budget = MAX_HISTORY_CHARS
+    for msg in reversed(chat_history[-MAX_HISTORY_MESSAGES:]):
+        # Uncached call: short history turns shouldn't evict cached contexts
+        content = normalize_text_for_cache.__wrapped__(msg.get("content", msg.get("message", "")) or "")
+        budget -= len(content)
+        if budget < 0:
+            break
+        role = "assistant" if msg.get("role") == "assistant" or msg.get("sender") == "ai" else "user"
+        messages.append({"role": role, "content": content})
+    messages.reverse()
+    return messages
+
+
+def _log_cache_usage(response) -> None:
+    """Log how much of the prompt DeepSeek served from its prefix cache."""
+    usage = getattr(response, "usage", None)
+    hit = getattr(usage, "prompt_cache_hit_tokens", None)
+    if hit is not None:
+        logger.info("[DeepSeek] Prompt cache: %s/%s tokens hit", hit, usage.prompt_tokens)
+
+
 class DeepSeekService:
     """
     DeepSeek API service for chat completions with prefix caching optimization.
@@ -103,18 +181,52 @@ class DeepSeekService:
     
     def __init__(self):
         self.enabled = bool(settings.DEEPSEEK_API_KEY)
-        self.client = None
         self.model = "deepseek-chat"  # DeepSeek-V3 (text)
         self.vision_model = "deepseek-vl2"  # DeepSeek Vision (OCR)
+        # Pooled connections belong to the event loop that opened them, and
+        # the API loop and the document worker loop both call DeepSeek, so
+        # each loop gets its own client
+        self._clients: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, AsyncOpenAI]" = weakref.WeakKeyDictionary()
         
         if self.enabled:
-            self.client = OpenAI(
-                api_key=settings.DEEPSEEK_API_KEY,
-                base_url="https://api.deepseek.com"
-            )
-            print("[DeepSeek] Service initialized with cache optimization")
+            logger.info("[DeepSeek] Service initialized with cache optimization")
         else:
-            print("[DeepSeek] Service disabled - no API key configured")
+            logger.info("[DeepSeek] Service disabled - no API key configured")
+    
+    def _create_client(self) -> AsyncOpenAI:
+        # Async client: requests are awaited on the event loop directly,
+        # so concurrent chats aren't capped by a worker thread pool
+        return AsyncOpenAI(
+            api_key=settings.DEEPSEEK_API_KEY,
+            base_url="https://api.deepseek.com",
+            # One pooled connection set for every call, kept alive long
+            # enough that chat follow-ups skip the TLS handshake
+            http_client=httpx.AsyncClient(
+                limits=httpx.Limits(
+                    max_connections=64,
+                    max_keepalive_connections=32,
+                    keepalive_expiry=300.0
+                ),
+                timeout=httpx.Timeout(connect=5.0, read=90.0, write=10.0, pool=5.0)
+            )
+        )
+    
+    @property
+    def client(self) -> AsyncOpenAI | None:
+        """The client for the running event loop (None when disabled)."""
+        if not self.enabled:
+            return None
+        loop = asyncio.get_running_loop()
+        client = self._clients.get(loop)
+        if client is None:
+            client = self._clients[loop] = self._create_client()
+        return client
+    
+    async def aclose(self) -> None:
+        """Close the running loop's pooled HTTP connections (called on app shutdown)."""
+        client = self._clients.pop(asyncio.get_running_loop(), None)
+        if client:
+            await client.close()
     
     async def generate_answer(self, question: str, context: str) -> str:
         """
@@ -129,42 +241,82 @@ class DeepSeekService:
             raise ValueError("DeepSeek service is not enabled")
         
         # Normalize context for consistent cache hits
-        normalized_context = normalize_text_for_cache(context)
+        normalized_context = normalize_text_for_cache(context[:MAX_CONTEXT_CHARS])
         
         try:
-            loop = asyncio.get_event_loop()
+            # Cache-optimized message structure:
+            # 1. System (FIXED) + 2. Context (FIXED per doc) = CACHED
+            # 3. Question (VARIABLE) = Only this is processed fresh
+            messages = [
+                {"role": "system", "content": SYSTEM_PROMPT_SINGLE},
+                {"role": "user", "content": f"DOKÜMAN İÇERİĞİ:\n\n{normalized_context}"},
+                {"role": "user", "content": f"SORU: {question}"}
+            ]
             
-            def _generate():
-                # Cache-optimized message structure:
-                # 1. System (FIXED) + 2. Context (FIXED per doc) = CACHED
-                # 3. Question (VARIABLE) = Only this is processed fresh
-                messages = [
-                    {"role": "system", "content": SYSTEM_PROMPT_SINGLE},
-                    {"role": "user", "content": f"DOKÜMAN İÇERİĞİ:\n\n{normalized_context}"},
-                    {"role": "user", "content": f"SORU: {question}"}
-                ]
-                
-                response = self.client.chat.completions.create(
+            response = await asyncio.wait_for(
+                self.client.chat.completions.create(
                     model=self.model,
                     messages=messages,
                     temperature=0.7,
                     max_tokens=2048
-                )
-                return response.choices[0].message.content
-            
-            result = await asyncio.wait_for(
-                loop.run_in_executor(executor, _generate),
+                ),
                 timeout=60.0
             )
+            _log_cache_usage(response)
+            result = response.choices[0].message.content
             return result.strip() if result else ""
             
         except asyncio.TimeoutError:
-            print("[DeepSeek] TIMEOUT - request took too long")
+            logger.warning("[DeepSeek] TIMEOUT - request took too long")
             raise
         except Exception as e:
-            print(f"[DeepSeek] ERROR: {e}")
+            logger.warning("[DeepSeek] ERROR: %s", e)
             raise
     
+    async def stream_answer(self, question: str, context: str) -> AsyncIterator[str]:
+        """
+        Streaming variant of generate_answer: yields text deltas as DeepSeek
+        produces them. Same cache-optimized message order.
+        """
+        if not self.enabled or not self.client:
+            raise ValueError("DeepSeek service is not enabled")
+
+        normalized_context = normalize_text_for_cache(context[:MAX_CONTEXT_CHARS])
+
+        try:
+            response = await asyncio.wait_for(
+                self.client.chat.completions.create(
+                    model=self.model,
+                    messages=[
+                        {"role": "system", "content": SYSTEM_PROMPT_SINGLE},
+                        {"role": "user", "content": f"DOKÜMAN İÇERİĞİ:\n\n{normalized_context}"},
+                        {"role": "user", "content": f"SORU: {question}"}
+                    ],
+                    temperature=0.7,
+                    max_tokens=2048,
+                    stream=True
+                ),
+                timeout=60.0
+            )
+            # timeout applies to the wait for each chunk, not the whole stream
+            chunks = aiter(response)
+            try:
+                while True:
+                    try:
+                        chunk = await asyncio.wait_for(anext(chunks), timeout=60.0)
+                    except StopAsyncIteration:
+                        break
+                    if chunk.choices and chunk.choices[0].delta.content:
+                        yield chunk.choices[0].delta.content
+            finally:
+                await response.close()
+        except asyncio.TimeoutError:
+            logger.warning("[DeepSeek] TIMEOUT - stream stalled")
+            raise
+        except Exception as e:
+            logger.warning("[DeepSeek] ERROR: %s", e)
+            raise
+
     async def generate_answer_with_context(
         self, 
         question: str, 
@@ -185,46 +337,41 @@ class DeepSeekService:
         if not self.enabled or not self.client:
             raise ValueError("DeepSeek service is not enabled")
         
-        normalized_context = normalize_text_for_cache(context)
+        normalized_context = normalize_text_for_cache(context[:MAX_CONTEXT_CHARS])
         
         try:
-            loop = asyncio.get_event_loop()
+            # Build message list with cache optimization
+            messages = [
+                {"role": "system", "content": SYSTEM_PROMPT_SINGLE},
+                {"role": "user", "content": f"DOKÜMAN İÇERİĞİ:\n\n{normalized_context}"},
+            ]
             
-            def _generate():
-                # Build message list with cache optimization
-                messages = [
-                    {"role": "system", "content": SYSTEM_PROMPT_SINGLE},
-                    {"role": "user", "content": f"DOKÜMAN İÇERİĞİ:\n\n{normalized_context}"},
-                ]
-                
-                # Add chat history if provided (for multi-turn)
-                if chat_history:
-                    for msg in chat_history[-6:]:  # Last 6 messages max
-                        role = "assistant" if msg.get("role") == "assistant" or msg.get("sender") == "ai" else "user"
-                        messages.append({"role": role, "content": msg.get("content", msg.get("message", ""))})
-                
-                # Add current question
-                messages.append({"role": "user", "content": f"SORU: {question}"})
-                
-                response = self.client.chat.completions.create(
+            # Add chat history if provided (for multi-turn), after the fixed
+            # prefix so it never invalidates the cached system + context part
+            if chat_history:
+                messages.extend(_history_messages(chat_history))
+            
+            # Add current question
+            messages.append({"role": "user", "content": f"SORU: {question}"})
+            
+            response = await asyncio.wait_for(
+                self.client.chat.completions.create(
                     model=self.model,
                     messages=messages,
                     temperature=0.7,
                     max_tokens=2048
-                )
-                return response.choices[0].message.content
-            
-            result = await asyncio.wait_for(
-                loop.run_in_executor(executor, _generate),
+                ),
                 timeout=60.0
             )
+            _log_cache_usage(response)
+            result = response.choices[0].message.content
             return result.strip() if result else ""
             
         except asyncio.TimeoutError:
-            print("[DeepSeek] TIMEOUT - request took too long")
+            logger.warning("[DeepSeek] TIMEOUT - request took too long")
             raise
         except Exception as e:
-            print(f"[DeepSeek] ERROR: {e}")
+            logger.warning("[DeepSeek] ERROR: %s", e)
             raise
     
     async def generate_answer_simple(self, prompt: str) -> str:
@@ -239,10 +386,8 @@ class DeepSeekService:
             raise ValueError("DeepSeek service is not enabled")
         
         try:
-            loop = asyncio.get_event_loop()
-            
-            def _generate():
-                response = self.client.chat.completions.create(
+            response = await asyncio.wait_for(
+                self.client.chat.completions.create(
                     model=self.model,
                     messages=[
                         {"role": "system", "content": SYSTEM_PROMPT_MULTI},
@@ -250,20 +395,18 @@ class DeepSeekService:
                     ],
                     temperature=0.7,
                     max_tokens=4096
-                )
-                return response.choices[0].message.content
-            
-            result = await asyncio.wait_for(
-                loop.run_in_executor(executor, _generate),
+                ),
                 timeout=90.0
             )
+            _log_cache_usage(response)
+            result = response.choices[0].message.content
             return result.strip() if result else ""
             
         except asyncio.TimeoutError:
-            print("[DeepSeek] TIMEOUT - request took too long")
+            logger.warning("[DeepSeek] TIMEOUT - request took too long")
             raise
         except Exception as e:
-            print(f"[DeepSeek] ERROR: {e}")
+            logger.warning("[DeepSeek] ERROR: %s", e)
             raise
     
     async def generate_answer_multi_doc(
@@ -282,37 +425,33 @@ class DeepSeekService:
         if not self.enabled or not self.client:
             raise ValueError("DeepSeek service is not enabled")
         
-        normalized_context = normalize_text_for_cache(combined_context)
+        normalized_context = normalize_text_for_cache(combined_context[:MAX_CONTEXT_CHARS])
         
         try:
-            loop = asyncio.get_event_loop()
+            messages = [
+                {"role": "system", "content": SYSTEM_PROMPT_MULTI},
+                {"role": "user", "content": f"KAYNAK MATERYALLERİ:\n\n{normalized_context}"},
+                {"role": "user", "content": f"SORU: {question}"}
+            ]
             
-            def _generate():
-                messages = [
-                    {"role": "system", "content": SYSTEM_PROMPT_MULTI},
-                    {"role": "user", "content": f"KAYNAK MATERYALLERİ:\n\n{normalized_context}"},
-                    {"role": "user", "content": f"SORU: {question}"}
-                ]
-                
-                response = self.client.chat.completions.create(
+            response = await asyncio.wait_for(
+                self.client.chat.completions.create(
                     model=self.model,
                     messages=messages,
                     temperature=0.7,
                     max_tokens=4096
-                )
-                return response.choices[0].message.content
-            
-            result = await asyncio.wait_for(
-                loop.run_in_executor(executor, _generate),
+                ),
                 timeout=90.0
             )
+            _log_cache_usage(response)
+            result = response.choices[0].message.content
             return result.strip() if result else ""
             
         except asyncio.TimeoutError:
-            print("[DeepSeek] TIMEOUT - request took too long")
+            logger.warning("[DeepSeek] TIMEOUT - request took too long")
             raise
         except Exception as e:
-            print(f"[DeepSeek] ERROR: {e}")
+            logger.warning("[DeepSeek] ERROR: %s", e)
             raise
 
 
@@ -324,10 +463,10 @@ class DeepSeekService:
         Gemini'ye fallback için tasarlanmıştır — hata durumunda '' döndürür.
         """
         if not self.enabled or not self.client:
-            print("[DeepSeek OCR] Service not enabled, skipping")
+            logger.info("[DeepSeek OCR] Service not enabled, skipping")
             return ""
         
-        print(f"[DeepSeek OCR] Starting PDF OCR, file size: {len(pdf_bytes)} bytes")
+        logger.info("[DeepSeek OCR] Starting PDF OCR, file size: %s bytes", len(pdf_bytes))
         
         try:
             import fitz  # PyMuPDF
@@ -337,7 +476,7 @@ class DeepSeekService:
             pdf_doc = fitz.open(stream=pdf_bytes, filetype="pdf")
             all_text_parts = []
             
-            print(f"[DeepSeek OCR] PDF has {len(pdf_doc)} pages")
+            logger.info("[DeepSeek OCR] PDF has %s pages", len(pdf_doc))
             
             for page_num in range(len(pdf_doc)):
                 page = pdf_doc[page_num]
@@ -348,13 +487,11 @@ class DeepSeekService:
                 img_bytes = pix.tobytes("png")
                 img_b64 = base64.b64encode(img_bytes).decode("utf-8")
                 
-                print(f"[DeepSeek OCR] Processing page {page_num + 1}/{len(pdf_doc)}")
+                logger.info("[DeepSeek OCR] Processing page %s/%s", page_num + 1, len(pdf_doc))
                 
                 try:
-                    loop = asyncio.get_event_loop()
-                    
-                    def _ocr_page(b64=img_b64, pnum=page_num):
-                        response = self.client.chat.completions.create(
+                    response = await asyncio.wait_for(
+                        self.client.chat.completions.create(
                             model=self.vision_model,
                             messages=[
                                 {
@@ -363,7 +500,7 @@ class DeepSeekService:
                                         {
                                             "type": "image_url",
                                             "image_url": {
-                                                "url": f"data:image/png;base64,{b64}"
+                                                "url": f"data:image/png;base64,{img_b64}"
                                             }
                                         },
                                         {
@@ -384,40 +521,35 @@ Sayfa metni:"""
                                 }
                             ],
                             max_tokens=4096
-                        )
-                        return response.choices[0].message.content or ""
-                    
-                    page_text = await asyncio.wait_for(
-                        loop.run_in_executor(executor, _ocr_page),
+                        ),
                         timeout=60.0
                     )
+                    page_text = response.choices[0].message.content or ""
                     
                     if page_text.strip():
                         all_text_parts.append(page_text.strip())
-                        print(f"[DeepSeek OCR] Page {page_num + 1}: {len(page_text)} chars extracted")
+                        logger.info("[DeepSeek OCR] Page %s: %s chars extracted", page_num + 1, len(page_text))
                     else:
-                        print(f"[DeepSeek OCR] Page {page_num + 1}: no text found")
+                        logger.info("[DeepSeek OCR] Page %s: no text found", page_num + 1)
                         
                 except asyncio.TimeoutError:
-                    print(f"[DeepSeek OCR] Page {page_num + 1} TIMEOUT, skipping")
+                    logger.warning("[DeepSeek OCR] Page %s TIMEOUT, skipping", page_num + 1)
                     continue
                 except Exception as page_err:
-                    print(f"[DeepSeek OCR] Page {page_num + 1} ERROR: {page_err}")
+                    logger.warning("[DeepSeek OCR] Page %s ERROR: %s", page_num + 1, page_err)
                     continue
             
             pdf_doc.close()
             
             full_text = "\n\n".join(all_text_parts)
-            print(f"[DeepSeek OCR] Complete: {len(full_text)} total chars from {len(all_text_parts)} pages")
+            logger.info("[DeepSeek OCR] Complete: %s total chars from %s pages", len(full_text), len(all_text_parts))
             return full_text
             
         except ImportError:
-            print("[DeepSeek OCR] PyMuPDF not installed. Run: pip install PyMuPDF")
+            logger.warning("[DeepSeek OCR] PyMuPDF not installed. Run: pip install PyMuPDF")
             return ""
         except Exception as e:
-            print(f"[DeepSeek OCR] FAILED: {e}")
-            import traceback
-            traceback.print_exc()
+            logger.exception("[DeepSeek OCR] FAILED: %s", e)
             return ""
 
 
@@ -6,13 +6,17 @@ This service handles:
 - Spaced Repetition (SM-2 algorithm)
 - Flashcard set and progress management
 """
+import asyncio
 import uuid
 import json
 import re
 from datetime import datetime, timedelta
+from sqlalchemy import desc
 from sqlalchemy.orm import Session
 from app.models.flashcard import FlashcardSet, Flashcard, FlashcardProgress, FlashcardStatus, FlashcardReviewHistory
 from app.models.document import Document, DocumentEmbedding
+from app.models.chat import MultiDocumentSession, multi_session_documents
+from app.models.user import UserProfile, UserRole
 from app.services.deepseek_service import deepseek_service
 from app.services.gemini_service import gemini_service
 
@@ -42,7 +46,7 @@ JSON formatında dön:
 
 def extract_document_content(db: Session, document_id: uuid.UUID) -> str:
     """Extract full text content from document embeddings for flashcard generation."""
-    embeddings = db.query(DocumentEmbedding).filter(
+    embeddings = db.query(DocumentEmbedding.content).filter(
         DocumentEmbedding.document_id == document_id
     ).order_by(DocumentEmbedding.page_number).all()
 
@@ -50,17 +54,15 @@ def extract_document_content(db: Session, document_id: uuid.UUID) -> str:
         return ""
 
     content_parts = []
-    for emb in embeddings:
-        if emb.content:
-            content_parts.append(emb.content)
+    for (content,) in embeddings:
+        if content:
+            content_parts.append(content)
 
     return "\n\n".join(content_parts)
 
 
 def extract_session_content(db: Session, session_id: uuid.UUID) -> str:
     """Extract combined content from all documents in a multi-document session."""
-    from app.models.chat import MultiDocumentSession, multi_session_documents
-
     session = db.query(MultiDocumentSession).filter(MultiDocumentSession.id == session_id).first()
     if not session:
         raise ValueError("Session not found")
@@ -76,21 +78,19 @@ def extract_session_content(db: Session, session_id: uuid.UUID) -> str:
 
     contents = []
     for doc_id in doc_ids:
-        doc_embeddings = db.query(DocumentEmbedding).filter(
+        doc_embeddings = db.query(DocumentEmbedding.content).filter(
             DocumentEmbedding.document_id == doc_id
         ).order_by(DocumentEmbedding.page_number).all()
 
-        for emb in doc_embeddings:
-            if emb.content:
-                contents.append(emb.content)
+        for (content,) in doc_embeddings:
+            if content:
+                contents.append(content)
 
     return "\n\n---\n\n".join(contents) if contents else ""
 
 
 def extract_public_documents_content(db: Session, document_ids: list[uuid.UUID]) -> str:
     """Extract combined content from multiple public documents (for library multi-select)."""
-    from app.models.document import Document
-
     contents = []
 
     for doc_id in document_ids:
@@ -98,14 +98,14 @@ def extract_public_documents_content(db: Session, document_ids: list[uuid.UUID])
         if not doc:
             continue
 
-        doc_embeddings = db.query(DocumentEmbedding).filter(
+        doc_embeddings = db.query(DocumentEmbedding.content).filter(
             DocumentEmbedding.document_id == doc_id
         ).order_by(DocumentEmbedding.page_number).all()
 
         content_parts = []
-        for emb in doc_embeddings:
-            if emb.content:
-                content_parts.append(emb.content)
+        for (content,) in doc_embeddings:
+            if content:
+                content_parts.append(content)
 
         if content_parts:
             contents.append(f"--- {doc.title} ---\n\n" + "\n\n".join(content_parts))
@@ -193,9 +193,6 @@ DERS İÇERİĞİ:
     result = None
 
     try:
-        import asyncio
-        loop = asyncio.get_event_loop()
-
         if model == "gemma" or model == "gemini":
             result = await gemini_service.generate_structured_content(
                 system_prompt=FLASHCARD_SYSTEM_PROMPT,
@@ -206,8 +203,8 @@ DERS İÇERİĞİ:
             if not deepseek_service.enabled:
                 raise ValueError("DeepSeek service is not enabled")
 
-            def _generate():
-                response = deepseek_service.client.chat.completions.create(
+            response = await asyncio.wait_for(
+                deepseek_service.client.chat.completions.create(
                     model=deepseek_service.model,
                     messages=[
                         {"role": "system", "content": FLASHCARD_SYSTEM_PROMPT},
@@ -215,13 +212,10 @@ DERS İÇERİĞİ:
                     ],
                     temperature=0.7,
                     max_tokens=max_tokens
-                )
-                return response.choices[0].message.content
-
-            result = await asyncio.wait_for(
-                loop.run_in_executor(None, _generate),
+                ),
                 timeout=180.0
             )
+            result = response.choices[0].message.content
 
         if not result:
             raise ValueError("Empty response from AI")
@@ -290,8 +284,6 @@ async def generate_flashcards(
     batch_size_1 = card_count // 2
     batch_size_2 = card_count - batch_size_1
 
-    import asyncio
-
     results = await asyncio.gather(
         _generate_flashcard_batch(document_content, batch_size_1, model, 0, 2),
         _generate_flashcard_batch(document_content, batch_size_2, model, 1, 2),
@@ -471,15 +463,12 @@ def get_set_with_cards(
     user_id: uuid.UUID
 ) -> dict:
     """Get flashcard set details with cards and user progress."""
-    from sqlalchemy import desc
-
     flashcard_set = db.query(FlashcardSet).filter(FlashcardSet.id == set_id).first()
 
     if not flashcard_set:
         raise ValueError("Flashcard set not found")
 
     if flashcard_set.user_id != user_id and not flashcard_set.is_public:
-        from app.models.user import UserProfile, UserRole
         user = db.query(UserProfile).filter(UserProfile.id == user_id).first()
         if not user or user.role != UserRole.ADMIN:
             raise ValueError("Access denied")
@@ -837,8 +826,6 @@ def get_user_stats(db: Session, user_id: uuid.UUID) -> dict:
 
 def get_difficult_cards(db: Session, user_id: uuid.UUID, limit: int = 50) -> list[dict]:
     """Get cards where user last rated 1-2 (difficult cards for review)."""
-    from sqlalchemy import func
-
     # Find cards where the most recent review had quality <= 2
     # We look at cards with progress status 'learning' and low ease_factor
     difficult_progs = db.query(FlashcardProgress).join(Flashcard).join(FlashcardSet).filter(
@@ -873,8 +860,6 @@ def get_set_difficult_cards(db: Session, set_id: uuid.UUID, user_id: uuid.UUID,
     2. ease_factor <= 2.0
     3. status = "learning"
     """
-    from sqlalchemy import desc, func
-
     flashcard_set = db.query(FlashcardSet).filter(FlashcardSet.id == set_id).first()
     if not flashcard_set:
         raise ValueError("Flashcard set not found")
@@ -934,8 +919,6 @@ def get_set_difficult_cards(db: Session, set_id: uuid.UUID, user_id: uuid.UUID,
 
 def get_all_cards_with_stats(db: Session, set_id: uuid.UUID, user_id: uuid.UUID) -> list[dict]:
     """Get ALL cards from a set with review statistics."""
-    from sqlalchemy import desc
-
     flashcard_set = db.query(FlashcardSet).filter(FlashcardSet.id == set_id).first()
     if not flashcard_set:
         raise ValueError("Flashcard set not found")
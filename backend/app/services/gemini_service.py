@@ -1,16 +1,165 @@
 import google.generativeai as genai
 from app.core.config import settings
 import asyncio
+import hashlib
+import logging
+import random
+import re
+import threading
 import time
+import weakref
+from array import array
+from collections import OrderedDict
 from concurrent.futures import ThreadPoolExecutor
+from typing import AsyncIterator, Awaitable, Callable
 from google import genai as genai_new
 from google.genai import types
+from app.services.streaming import iterate_in_executor
+
+logger = logging.getLogger(__name__)
 
 # Configure Gemini (legacy SDK for embeddings)
 genai.configure(api_key=settings.GEMINI_API_KEY)
 
-# Thread pool for blocking Gemini calls
-executor = ThreadPoolExecutor(max_workers=5)
+# The process's only pool for blocking AI SDK calls (DeepSeek is async)
+executor = ThreadPoolExecutor(
+    max_workers=settings.AI_EXECUTOR_WORKERS,
+    thread_name_prefix="gemini"
+)
+
+# Characters of a text that are embedded (the rest is ignored)
+EMBEDDING_MAX_CHARS = 9000
+
+# Max contents per batch embedding request (API limit)
+EMBEDDING_BATCH_SIZE = 100
+
+# Query embeddings requested within this window share one batch request
+EMBEDDING_BATCH_WINDOW = 0.025  # seconds
+
+# Query embeddings are reused for repeated questions (LRU with a TTL)
+QUERY_EMBEDDING_CACHE_SIZE = 1024
+QUERY_EMBEDDING_CACHE_TTL = 3600  # seconds
+
+# Embeddings by (task, content) hash, so re-uploaded or duplicate chunks
+# don't go back to the API. Stored as packed float32 (~3 KB per vector).
+EMBEDDING_CACHE_SIZE = 4096
+
+# Fixed Gemma chat instructions. Sent as its own content part so the
+# (potentially very large) context is never copied into a formatted prompt.
+GEMMA_CHAT_INSTRUCTIONS = """Sen yardımcı bir çalışma asistanısın. Aşağıdaki bağlamı OKUYACAK, ANLAYACAK, ve KENDI CÜMLELERINLE AÇIKLAYACAKSIN.
+
+KURALLAR:
+- Türkçe yanıt ver
+- Markdown formatı kullan
+- Açık ve anlaşılır ol
+- Bağlamda bilgi yoksa, bunu belirt
+
+Bağlam:
+"""
+
+# Returned instead of an answer when the model sends back no text
+NO_ANSWER_TEXT = "Yanıt oluşturulamadı."
+
+# Trailing question part shared by the chat prompts
+QUESTION_TEMPLATE = "\n\nKullanıcı Sorusu: {question}\n\nYanıt:"
+
+# Legacy Gemini 2.5 Flash answer instructions (context follows)
+LEGACY_ANSWER_INSTRUCTIONS = """Sen yardımcı bir çalışma asistanısın...
+
+Bağlam:
+"""
+
+
+# Retry backoff: exponential from RETRY_BASE_DELAY up to RETRY_MAX_DELAY plus
+# up to a second of jitter, so callers that failed together don't retry in
+# lockstep. A delay the API asks for ("retry in 37s", retry_delay) wins,
+# up to RETRY_AFTER_MAX.
+RETRY_BASE_DELAY = 0.5  # seconds
+RETRY_MAX_DELAY = 16.0
+RETRY_AFTER_MAX = 60.0
+_RETRY_AFTER_RE = re.compile(
+    r"retry(?:[_ ]?delay| in)\W*(?:seconds:\s*)?(\d+(?:\.\d+)?)", re.IGNORECASE
+)
+
+
+def _retry_delay(attempt: int, error: BaseException | None = None) -> float:
+    """Seconds to wait before retry number attempt + 1."""
+    if error is not None:
+        match = _RETRY_AFTER_RE.search(str(error))
+        if match:
+            return min(float(match.group(1)), RETRY_AFTER_MAX)
+    return min(RETRY_MAX_DELAY, RETRY_BASE_DELAY * 2 ** attempt) + random.uniform(0, 1.0)
+
+
+_RETRYABLE_MARKERS = ("500", "503", "INTERNAL", "UNAVAILABLE", "429", "RESOURCE_EXHAUSTED")
+
+
+def _is_retryable_error(error_str: str) -> bool:
+    """Transient server errors and rate limits are worth retrying; 4xx are not."""
+    return any(marker in error_str for marker in _RETRYABLE_MARKERS)
+
+
+# Leading bytes -> MIME type for page images handed to the vision model
+_IMAGE_MAGIC = (
+    (b"\x89PNG\r\n\x1a\n", "image/png"),
+    (b"\xff\xd8\xff", "image/jpeg"),
+    (b"GIF8", "image/gif"),
+    (b"BM", "image/bmp"),
+    (b"II*\x00", "image/tiff"),
+    (b"MM\x00*", "image/tiff"),
+)
+
+
+def _image_mime_type(data: bytes) -> str:
+    """Sniff an image's MIME type from its magic bytes (PNG if unknown)."""
+    if data[:4] == b"RIFF" and data[8:12] == b"WEBP":
+        return "image/webp"
+    return next((mime for magic, mime in _IMAGE_MAGIC if data.startswith(magic)), "image/png")
+
+
+class _EmbedBatcher:
+    """
+    Collects embedding requests made on one event loop and sends them as a
+    single batch request once EMBEDDING_BATCH_WINDOW has passed or
+    EMBEDDING_BATCH_SIZE texts are waiting, whichever comes first.
+    """
+
+    def __init__(self, embed_batch: Callable[..., Awaitable[list[list[float]]]]):
+        self._embed_batch = embed_batch
+        # task type -> waiting (text, future) pairs, and the pending flush timer
+        self._pending: dict[str, list[tuple[str, asyncio.Future]]] = {}
+        self._timers: dict[str, asyncio.TimerHandle] = {}
+
+    def submit(self, text: str, task: str) -> asyncio.Future:
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        batch = self._pending.setdefault(task, [])
+        batch.append((text, future))
+        if len(batch) >= EMBEDDING_BATCH_SIZE:
+            self._flush(task)
+        elif task not in self._timers:
+            self._timers[task] = loop.call_later(EMBEDDING_BATCH_WINDOW, self._flush, task)
+        return future
+
+    def _flush(self, task: str) -> None:
+        timer = self._timers.pop(task, None)
+        if timer:
+            timer.cancel()
+        batch = self._pending.pop(task, None)
+        if batch:
+            asyncio.ensure_future(self._send(task, batch))
+
+    async def _send(self, task: str, batch: list[tuple[str, asyncio.Future]]) -> None:
+        try:
+            embeddings = await self._embed_batch([text for text, _ in batch], task=task)
+        except Exception as e:
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+        for (_, future), embedding in zip(batch, embeddings):
+            if not future.done():
+                future.set_result(embedding)
 
 
 class GeminiService:
@@ -26,16 +175,27 @@ class GeminiService:
         self.gemma_model = "gemma-4-31b-it"
         self.gemma_max_retries = 3
 
+        # sha256(question) -> (stored_at, embedding)
+        self._query_embedding_cache: OrderedDict[str, tuple[float, list[float]]] = OrderedDict()
+        # blake2b(task, text) -> embedding. Shared with the document
+        # processing thread, hence the lock
+        self._embedding_cache: OrderedDict[bytes, array] = OrderedDict()
+        self._embedding_cache_lock = threading.Lock()
+        # One batcher per event loop: document processing runs on its own
+        # loop in a background thread, next to the server's loop
+        self._embed_batchers: weakref.WeakKeyDictionary = weakref.WeakKeyDictionary()
+
     # =====================================================================
     # GEMMA-4 RETRY HELPER
     # =====================================================================
     async def _gemma_call_with_retry(self, generate_fn, timeout: float = 120.0) -> str:
         """
-        Execute a Gemma-4 API call with exponential backoff retry.
+        Execute a Gemma-4 API call with jittered exponential backoff retry.
         Google's Gemma API can return transient 500 INTERNAL errors,
-        retrying after a short delay usually succeeds.
+        retrying after a short delay usually succeeds. Timeouts are retried
+        straight away: the server wasn't pushing back, the call was slow.
         """
-        loop = asyncio.get_event_loop()
+        loop = asyncio.get_running_loop()
         last_error = None
 
         for attempt in range(self.gemma_max_retries):
@@ -47,20 +207,22 @@ class GeminiService:
                 return result if result else ""
             except asyncio.TimeoutError:
                 last_error = TimeoutError(f"Gemma timeout after {timeout}s")
-                print(f"[Gemma] Timeout (attempt {attempt+1}/{self.gemma_max_retries})")
+                logger.warning("[Gemma] Timeout (attempt %s/%s)", attempt+1, self.gemma_max_retries)
+                continue
             except Exception as e:
                 last_error = e
                 error_str = str(e)
-                # Only retry on 500/503 server errors
-                if '500' in error_str or '503' in error_str or 'INTERNAL' in error_str:
-                    print(f"[Gemma] Server error (attempt {attempt+1}/{self.gemma_max_retries}): {error_str[:100]}")
+                # Retry server errors (500/503) and rate limits (429); the
+                # backoff honours any retry delay the API sends with a 429
+                if _is_retryable_error(error_str):
+                    logger.warning("[Gemma] Retryable error (attempt %s/%s): %s", attempt+1, self.gemma_max_retries, error_str[:100])
                 else:
                     # Non-retryable error (400, 404, etc.) - fail immediately
                     raise
 
             if attempt < self.gemma_max_retries - 1:
-                wait_time = 2 ** (attempt + 1)  # 2s, 4s
-                print(f"[Gemma] Retrying in {wait_time}s...")
+                wait_time = _retry_delay(attempt + 1, last_error)
+                logger.info("[Gemma] Retrying in %.1fs...", wait_time)
                 await asyncio.sleep(wait_time)
 
         raise last_error or Exception("Gemma API call failed after all retries")
@@ -68,17 +230,47 @@ class GeminiService:
     # =====================================================================
     # EMBEDDING (Legacy SDK - unchanged)
     # =====================================================================
+    @staticmethod
+    def _embedding_key(text: str, task: str) -> bytes:
+        h = hashlib.blake2b(task.encode("utf-8"), digest_size=16)
+        h.update(b"\0")
+        h.update(text.encode("utf-8"))
+        return h.digest()
+
+    def _cached_embedding(self, key: bytes) -> list[float] | None:
+        with self._embedding_cache_lock:
+            cached = self._embedding_cache.get(key)
+            if cached is None:
+                return None
+            self._embedding_cache.move_to_end(key)
+        return cached.tolist()
+
+    def _store_embedding(self, key: bytes, embedding: list[float]) -> None:
+        packed = array("f", embedding)
+        with self._embedding_cache_lock:
+            self._embedding_cache[key] = packed
+            self._embedding_cache.move_to_end(key)
+            while len(self._embedding_cache) > EMBEDDING_CACHE_SIZE:
+                self._embedding_cache.popitem(last=False)
+
     async def generate_embedding(self, text: str, *, task: str = "retrieval_document", retry_count: int = 3) -> list[float]:
         """Generate embedding with retry logic and timeout"""
+        # Truncate once; the cache key and the request see the same text
+        text = text[:EMBEDDING_MAX_CHARS]
+        key = self._embedding_key(text, task)
+        cached = self._cached_embedding(key)
+        if cached is not None:
+            return cached
+
         for attempt in range(retry_count):
             try:
-                loop = asyncio.get_event_loop()
+                loop = asyncio.get_running_loop()
 
                 def _embed():
                     task_type = "RETRIEVAL_DOCUMENT" if task == "retrieval_document" else "RETRIEVAL_QUERY"
                     result = genai.embed_content(
                         model=self.embedding_model,
-                        content=text[:9000],
+                        content=text,
                         task_type=task_type
                     )
                     embedding = result['embedding']
@@ -90,74 +282,157 @@ class GeminiService:
                     loop.run_in_executor(executor, _embed),
                     timeout=30.0
                 )
+                self._store_embedding(key, result)
                 return result
             except asyncio.TimeoutError:
-                print(f"Embedding timeout (attempt {attempt+1}/{retry_count}): {text[:50]}...")
+                logger.warning("Embedding timeout (attempt %s/%s): %s...", attempt+1, retry_count, text[:50])
+                if attempt < retry_count - 1:
+                    continue
+                raise
+            except Exception as e:
+                logger.warning("Error generating embedding (attempt %s/%s): %s", attempt+1, retry_count, e)
+                if attempt < retry_count - 1:
+                    await asyncio.sleep(_retry_delay(attempt, e))
+                    continue
+                raise
+
+    async def generate_embeddings_batch(
+        self,
+        texts: list[str],
+        *,
+        task: str = "retrieval_document",
+        retry_count: int = 3
+    ) -> list[list[float]]:
+        """
+        Embed several texts in one request (the API takes up to
+        EMBEDDING_BATCH_SIZE contents per call). Same retry/timeout policy as
+        generate_embedding; raises if the whole batch keeps failing, so the
+        caller can fall back to embedding items one by one.
+        """
+        texts = [text[:EMBEDDING_MAX_CHARS] for text in texts]
+        keys = [self._embedding_key(text, task) for text in texts]
+        embeddings = [self._cached_embedding(key) for key in keys]
+        # Positions still needing an embedding, grouped by key so repeated
+        # texts (boilerplate pages, duplicate chunks) are sent only once
+        missing: dict[bytes, list[int]] = {}
+        for i, embedding in enumerate(embeddings):
+            if embedding is None:
+                missing.setdefault(keys[i], []).append(i)
+        if not missing:
+            return embeddings
+        to_embed = [texts[positions[0]] for positions in missing.values()]
+
+        for attempt in range(retry_count):
+            try:
+                loop = asyncio.get_running_loop()
+
+                def _embed():
+                    task_type = "RETRIEVAL_DOCUMENT" if task == "retrieval_document" else "RETRIEVAL_QUERY"
+                    result = genai.embed_content(
+                        model=self.embedding_model,
+                        content=to_embed,
+                        task_type=task_type
+                    )
+                    return [embedding[:768] for embedding in result['embedding']]
+
+                result = await asyncio.wait_for(
+                    loop.run_in_executor(executor, _embed),
+                    timeout=60.0
+                )
+                for (key, positions), embedding in zip(missing.items(), result):
+                    self._store_embedding(key, embedding)
+                    for i in positions:
+                        embeddings[i] = embedding
+                return embeddings
+            except asyncio.TimeoutError:
+                logger.warning("Batch embedding timeout (attempt %s/%s): %s texts", attempt+1, retry_count, len(to_embed))
                 if attempt < retry_count - 1:
-                    await asyncio.sleep(2 ** attempt)
                     continue
                 raise
             except Exception as e:
-                print(f"Error generating embedding (attempt {attempt+1}/{retry_count}): {e}")
+                logger.warning("Error generating batch embedding (attempt %s/%s): %s", attempt+1, retry_count, e)
                 if attempt < retry_count - 1:
-                    await asyncio.sleep(2 ** attempt)
+                    await asyncio.sleep(_retry_delay(attempt, e))
                     continue
                 raise
 
     async def generate_query_embedding(self, text: str) -> list[float]:
-        return await self.generate_embedding(text, task="retrieval_query")
+        """Query embedding, served from the in-process cache when the same question was embedded recently."""
+        key = hashlib.sha256(text.encode("utf-8")).hexdigest()
+        cached = self._query_embedding_cache.get(key)
+        if cached and time.monotonic() - cached[0] < QUERY_EMBEDDING_CACHE_TTL:
+            self._query_embedding_cache.move_to_end(key)
+            return cached[1]
+
+        # Concurrent chat requests are embedded together in one batch request
+        loop = asyncio.get_running_loop()
+        batcher = self._embed_batchers.get(loop)
+        if batcher is None:
+            batcher = self._embed_batchers[loop] = _EmbedBatcher(self.generate_embeddings_batch)
+        embedding = await batcher.submit(text, "retrieval_query")
+
+        self._query_embedding_cache[key] = (time.monotonic(), embedding)
+        self._query_embedding_cache.move_to_end(key)
+        while len(self._query_embedding_cache) > QUERY_EMBEDDING_CACHE_SIZE:
+            self._query_embedding_cache.popitem(last=False)
+        return embedding
 
     # =====================================================================
     # GEMMA-4 CHAT METHODS (New SDK)
     # =====================================================================
     async def generate_chat_answer(self, question: str, context: str) -> str:
         """Generate chat answer using Gemma-4 with retry."""
-        prompt = f"""Sen yardımcı bir çalışma asistanısın. Aşağıdaki bağlamı OKUYACAK, ANLAYACAK, ve KENDI CÜMLELERINLE AÇIKLAYACAKSIN.
-
-KURALLAR:
-- Türkçe yanıt ver
-- Markdown formatı kullan
-- Açık ve anlaşılır ol
-- Bağlamda bilgi yoksa, bunu belirt
-
-Bağlam:
-{context}
-
-Kullanıcı Sorusu: {question}
-
-Yanıt:"""
-
-        def _generate():
-            response = self.genai_client.models.generate_content(
-                model=self.gemma_model,
-                contents=[prompt]
-            )
-            return response.text
-
-        result = await self._gemma_call_with_retry(_generate, timeout=120.0)
-        return result if result else "Yanıt oluşturulamadı."
+        return await self._generate_chat_parts([
+            GEMMA_CHAT_INSTRUCTIONS,
+            context,
+            QUESTION_TEMPLATE.format(question=question)
+        ])
 
     async def generate_chat_answer_simple(self, prompt: str) -> str:
         """Direct prompt to Gemma-4 with retry."""
+        return await self._generate_chat_parts([prompt])
+
+    async def generate_chat_answer_multi_doc(self, question: str, combined_context: str) -> str:
+        """Gemma-4 with multi-document context."""
+        return await self._generate_chat_parts([
+            "Kaynak Materyalleri:\n",
+            combined_context,
+            QUESTION_TEMPLATE.format(question=question)
+        ])
+
+    async def _generate_chat_parts(self, parts: list[str]) -> str:
+        """Send prompt pieces as separate parts of one user turn (no big concat)."""
         def _generate():
             response = self.genai_client.models.generate_content(
                 model=self.gemma_model,
-                contents=[prompt]
+                contents=parts
             )
             return response.text
 
         result = await self._gemma_call_with_retry(_generate, timeout=120.0)
-        return result if result else "Yanıt oluşturulamadı."
-
-    async def generate_chat_answer_multi_doc(self, question: str, combined_context: str) -> str:
-        """Gemma-4 with multi-document context."""
-        prompt = f"""Kaynak Materyalleri:
-{combined_context}
+        return result if result else NO_ANSWER_TEXT
 
-Kullanıcı Sorusu: {question}
+    async def stream_chat_answer(self, question: str, context: str) -> AsyncIterator[str]:
+        """
+        Streaming variant of generate_chat_answer. Not retried: once text
+        has reached the client a retry would duplicate it.
+        """
+        parts = [
+            GEMMA_CHAT_INSTRUCTIONS,
+            context,
+            QUESTION_TEMPLATE.format(question=question)
+        ]
+
+        def _stream():
+            for chunk in self.genai_client.models.generate_content_stream(
+                model=self.gemma_model,
+                contents=parts
+            ):
+                if chunk.text:
+                    yield chunk.text
 
-Yanıt:"""
-        return await self.generate_chat_answer_simple(prompt)
+        async for delta in iterate_in_executor(executor, _stream, timeout=120.0):
+            yield delta
 
     # =====================================================================
     # STRUCTURED CONTENT (Test & Flashcard JSON generation)
@@ -188,48 +463,82 @@ Yanıt:"""
         Use Gemma-4 multimodal vision to extract text from a PDF.
         Converts each page to high-res PNG and sends to Gemma-4.
         """
+        return "\n\n".join([text async for text in self.iter_ocr_pages(pdf_bytes)])
+
+    async def iter_ocr_pages(self, pdf_bytes: bytes) -> AsyncIterator[str]:
+        """
+        Yield the OCR text of each page as soon as it is read (pages with no
+        text are skipped). The next page is rendered while the current one
+        is being read, so rendering and the API call overlap.
+        """
+        async for _, text in self._iter_ocr(pdf_bytes):
+            yield text
+
+    async def ocr_pdf_pages(self, pdf_bytes: bytes, page_numbers: list[int]) -> dict[int, str]:
+        """
+        OCR only the given (0-based) pages, e.g. scanned pages in an otherwise
+        digital PDF. Returns page number -> text for the pages that had text.
+        """
+        return {page_num: text async for page_num, text in self._iter_ocr(pdf_bytes, page_numbers)}
+
+    async def _iter_ocr(
+        self, pdf_bytes: bytes, page_numbers: list[int] | None = None
+    ) -> AsyncIterator[tuple[int, str]]:
         import fitz  # PyMuPDF
 
         pdf_doc = fitz.open(stream=pdf_bytes, filetype="pdf")
-        all_text_parts = []
+        if page_numbers is None:
+            page_numbers = list(range(len(pdf_doc)))
+        page_count = len(page_numbers)
+        loop = asyncio.get_running_loop()
 
-        for page_num in range(len(pdf_doc)):
-            page = pdf_doc[page_num]
+        def _render(page_num: int) -> bytes:
             mat = fitz.Matrix(200/72, 200/72)  # 200 DPI
-            pix = page.get_pixmap(matrix=mat)
-            page_img_bytes = pix.tobytes("png")
-
-            def _make_ocr_fn(img_data):
-                def _ocr_page():
-                    response = self.genai_client.models.generate_content(
-                        model=self.gemma_model,
-                        contents=[
-                            types.Part.from_bytes(data=img_data, mime_type="image/png"),
-                            "Bu PDF sayfasındaki TÜM metni oku ve yaz. Metni olduğu gibi oku, yorum ekleme. Tablo varsa düzgün formatla. Başlıkları ve alt başlıkları koru. Liste varsa madde işaretlerini koru."
-                        ]
-                    )
-                    return response.text
-                return _ocr_page
-
-            try:
-                result = await self._gemma_call_with_retry(_make_ocr_fn(page_img_bytes), timeout=60.0)
-                if result:
-                    all_text_parts.append(result.strip())
-            except Exception as e:
-                print(f"[OCR] Page {page_num + 1} failed after retries: {e}")
-                continue
+            return pdf_doc[page_num].get_pixmap(matrix=mat).tobytes("png")
+
+        def _make_ocr_fn(img_data):
+            def _ocr_page():
+                response = self.genai_client.models.generate_content(
+                    model=self.gemma_model,
+                    contents=[
+                        types.Part.from_bytes(data=img_data, mime_type="image/png"),
+                        "Bu PDF sayfasındaki TÜM metni oku ve yaz. Metni olduğu gibi oku, yorum ekleme. Tablo varsa düzgün formatla. Başlıkları ve alt başlıkları koru. Liste varsa madde işaretlerini koru."
+                    ]
+                )
+                return response.text
+            return _ocr_page
 
-        return "\n\n".join(all_text_parts)
+        next_render = loop.run_in_executor(executor, _render, page_numbers[0]) if page_count else None
+        try:
+            for i, page_num in enumerate(page_numbers):
+                page_img_bytes = await next_render
+                if i + 1 < page_count:
+                    next_render = loop.run_in_executor(executor, _render, page_numbers[i + 1])
+
+                try:
+                    result = await self._gemma_call_with_retry(_make_ocr_fn(page_img_bytes), timeout=60.0)
+                    if result:
+                        yield page_num, result.strip()
+                except Exception as e:
+                    logger.warning("[OCR] Page %s failed after retries: %s", page_num + 1, e)
+                    continue
+        finally:
+            # Don't close the document under a render that is still running
+            if next_render is not None and not next_render.done():
+                await asyncio.wait([next_render])
+            pdf_doc.close()
 
     async def ocr_pdf_page(self, image_bytes: bytes) -> str:
         """
         Use Gemma-4 vision to extract text from a single page image with retry.
         """
+        mime_type = _image_mime_type(image_bytes)
+
         def _ocr():
             response = self.genai_client.models.generate_content(
                 model=self.gemma_model,
                 contents=[
-                    types.Part.from_bytes(data=image_bytes, mime_type="image/png"),
+                    types.Part.from_bytes(data=image_bytes, mime_type=mime_type),
                     "Bu bir PDF sayfasının görüntüsü. Lütfen bu sayfadaki TÜM metni aynen oku ve yaz. Tablo varsa düzgün formatla. Başlıkları ve alt başlıkları koru."
                 ]
             )
@@ -239,7 +548,7 @@ Yanıt:"""
             result = await self._gemma_call_with_retry(_ocr, timeout=60.0)
             return result.strip() if result else ""
         except Exception as e:
-            print(f"[OCR] Single page failed after retries: {e}")
+            logger.warning("[OCR] Single page failed after retries: %s", e)
             return ""
 
     # =====================================================================
@@ -264,10 +573,10 @@ Temizlenmiş metin:"""
     # =====================================================================
     # LEGACY GEMINI 2.5 FLASH METHODS (kept for direct use if needed)
     # =====================================================================
-    async def generate_answer_simple(self, prompt: str) -> str:
-        """Legacy: Direct prompt to Gemini 2.5 Flash."""
+    async def generate_answer_simple(self, prompt: str | list[str]) -> str:
+        """Legacy: Direct prompt (or prompt parts) to Gemini 2.5 Flash."""
         try:
-            loop = asyncio.get_event_loop()
+            loop = asyncio.get_running_loop()
 
             def _generate():
                 response = self.model.generate_content(prompt)
@@ -285,15 +594,11 @@ Temizlenmiş metin:"""
 
     async def generate_answer(self, question: str, context: str) -> str:
         """Legacy: Gemini 2.5 Flash answer."""
-        prompt = f"""Sen yardımcı bir çalışma asistanısın...
-
-Bağlam:
-{context}
-
-Kullanıcı Sorusu: {question}
-
-Yanıt:"""
-        return await self.generate_answer_simple(prompt)
+        return await self.generate_answer_simple([
+            LEGACY_ANSWER_INSTRUCTIONS,
+            context,
+            QUESTION_TEMPLATE.format(question=question)
+        ])
 
 
 gemini_service = GeminiService()
@@ -1,70 +1,233 @@
 import asyncio
 import os
-import requests
 import io
+import logging
+import tempfile
+import threading
+import httpx
 from pypdf import PdfReader
+from sqlalchemy import insert
 from sqlalchemy.orm import Session
+from app.core.config import settings
 from app.models.document import Document, DocumentEmbedding
-from app.services.gemini_service import gemini_service
+from app.services.gemini_service import EMBEDDING_BATCH_SIZE, gemini_service
 from app.services.deepseek_service import deepseek_service
 from app.db.session import SessionLocal
 import uuid
 
+logger = logging.getLogger(__name__)
+
+# Downloaded PDFs stay in memory up to this size, then spill to a temp file
+DOWNLOAD_SPOOL_MAX_BYTES = 8 * 1024 * 1024
+DOWNLOAD_CHUNK_BYTES = 64 * 1024
+
+# OCR output is split into chunks of about this many characters, cut at a
+# paragraph, line, sentence or word boundary where one is near the limit
+OCR_CHUNK_CHARS = 4000
+_SPLIT_SEPARATORS = ("\n\n", "\n", ". ", " ")
+
+def _split_text(text: str, chunk_size: int = OCR_CHUNK_CHARS) -> list[str]:
+    """
+    Split text into chunks of at most chunk_size characters, preferring to
+    cut at the largest boundary in the second half of each window. Chunks
+    don't overlap, so joining them in order (full-document chat) gives the
+    text back without repeats.
+    """
+    chunks = []
+    start = 0
+    while start < len(text):
+        end = min(start + chunk_size, len(text))
+        if end < len(text):
+            for sep in _SPLIT_SEPARATORS:
+                cut = text.rfind(sep, start + chunk_size // 2, end)
+                if cut != -1:
+                    end = cut + len(sep)
+                    break
+        chunk = text[start:end]
+        if len(chunk.strip()) >= 20:
+            chunks.append(chunk)
+        start = end
+    return chunks
+
+def _keep_pages(texts) -> tuple[list[str], int]:
+    """Pages with some content, and their total stripped length."""
+    page_texts = []
+    total_text_chars = 0
+
+    for text in texts:
+        if text and len(text.strip()) >= 10:
+            page_texts.append(text)
+            total_text_chars += len(text.strip())
+
+    return page_texts, total_text_chars
+
+def _extract_page_texts(pdf_file) -> tuple[list[str], list[int]]:
+    """
+    Extract the text of every page with PyMuPDF, which is several times
+    faster than pypdf and recovers text from more PDFs (fewer OCR fallbacks).
+    pypdf is the fallback when PyMuPDF isn't installed.
+
+    Also returns the (0-based) pages that look scanned: no usable text layer
+    but an embedded image. Only found with PyMuPDF, which the OCR path needs
+    for rendering anyway.
+    """
+    pdf_file.seek(0)
+    try:
+        import fitz  # PyMuPDF
+    except ImportError:
+        return [page.extract_text() or "" for page in PdfReader(pdf_file).pages], []
+
+    texts = []
+    scanned_pages = []
+    with fitz.open(stream=pdf_file.read(), filetype="pdf") as pdf_doc:
+        for page_num, page in enumerate(pdf_doc):
+            text = page.get_text("text")
+            if len(text.strip()) < 10 and page.get_images():
+                scanned_pages.append(page_num)
+            texts.append(text)
+    return texts, scanned_pages
+
+# Documents are processed on one long-lived event loop in a background thread
+# rather than a fresh asyncio.run() loop per document, so the download client
+# and the AI clients keep their pooled (TLS) connections between documents
+_worker_loop: asyncio.AbstractEventLoop | None = None
+_worker_loop_lock = threading.Lock()
+
+# Only used on the worker loop
+_http_client = httpx.AsyncClient(timeout=60.0, follow_redirects=True)
+
+def _get_worker_loop() -> asyncio.AbstractEventLoop:
+    global _worker_loop
+    with _worker_loop_lock:
+        if _worker_loop is None:
+            try:
+                # Same loop implementation uvicorn picks for the API when installed
+                import uvloop
+                loop = uvloop.new_event_loop()
+            except ImportError:
+                loop = asyncio.new_event_loop()
+            threading.Thread(target=loop.run_forever, name="document-worker", daemon=True).start()
+            _worker_loop = loop
+    return _worker_loop
+
+# Escapes for PostgreSQL COPY text format
+_COPY_ESCAPES = str.maketrans({"\\": "\\\\", "\t": "\\t", "\n": "\\n", "\r": "\\r"})
+
+def _save_embeddings(db: Session, rows: list[dict]) -> None:
+    """
+    Write embedding rows with a single COPY on the session's connection (same
+    transaction as the status update), which skips per-row statement binding
+    for these wide rows. Falls back to a multi-row INSERT when the driver
+    isn't psycopg2.
+    """
+    connection = db.connection()
+    if connection.dialect.driver != "psycopg2":
+        db.execute(insert(DocumentEmbedding), rows)
+        return
+
+    buffer = io.StringIO()
+    for row in rows:
+        vector = "[" + ",".join(str(float(v)) for v in row["embedding"]) + "]"
+        buffer.write(
+            f"{uuid.uuid4()}\t{row['document_id']}\t{row['page_number']}\t"
+            f"{row['content'].translate(_COPY_ESCAPES)}\t{vector}\n"
+        )
+    buffer.seek(0)
+
+    with connection.connection.cursor() as cursor:
+        cursor.copy_expert(
+            f"COPY {DocumentEmbedding.__tablename__} "
+            "(id, document_id, page_number, content, embedding) FROM STDIN",
+            buffer
+        )
+
+# Documents processed at once on the worker loop; the rest wait their turn
+_document_slots = asyncio.Semaphore(settings.DOCUMENT_CONCURRENCY)
+
+async def _process_document_in_slot(document_id: str, file_path: str | None = None):
+    async with _document_slots:
+        await _process_document(document_id, file_path)
+
+def _report_failure(future) -> None:
+    # _process_document handles its own errors; this catches anything that
+    # escapes it, which would otherwise vanish with the discarded future
+    if not future.cancelled() and future.exception() is not None:
+        logger.error("Document processing crashed", exc_info=future.exception())
+
 def process_document(document_id: str, file_path: str | None = None):
-    asyncio.run(_process_document(document_id, file_path))
+    """
+    Queue the document on the worker loop and return straight away, so the
+    background task doesn't hold a request threadpool thread for minutes.
+    """
+    future = asyncio.run_coroutine_threadsafe(
+        _process_document_in_slot(document_id, file_path), _get_worker_loop()
+    )
+    future.add_done_callback(_report_failure)
 
 async def _process_document(document_id: str, file_path: str | None = None):
     db: Session = SessionLocal()
     document = None
+    pdf_file = None
     try:
         doc_uuid = uuid.UUID(document_id)
         document = db.query(Document).filter(Document.id == doc_uuid).first()
         if not document:
-            print(f"Document {document_id} not found")
+            logger.warning("Document %s not found", document_id)
             return
 
+        # Read what's needed up front: the commit expires the instance, and
+        # touching it again would open a transaction that sits idle on a
+        # pooled connection through the download and AI calls
+        file_url = document.file_url
         document.status = "processing"
         db.commit()
 
-        pdf_file = None
-
         # Priority 1: Use the explicit file_path argument (local disk path)
         if file_path and os.path.isfile(file_path):
-            print(f"[PDF] Reading local file: {file_path}")
+            logger.info("[PDF] Reading local file: %s", file_path)
             with open(file_path, "rb") as f:
                 pdf_file = io.BytesIO(f.read())
 
         # Priority 2: If file_url is an HTTP URL, download it
-        elif document.file_url and document.file_url.startswith("http"):
+        elif file_url and file_url.startswith("http"):
             max_retries = 3
             for attempt in range(max_retries):
+                # Stream the body into one spooled buffer instead of
+                # holding the response and a copy of it in memory
+                buffer = tempfile.SpooledTemporaryFile(max_size=DOWNLOAD_SPOOL_MAX_BYTES)
                 try:
-                    response = requests.get(document.file_url, timeout=60)
-                    response.raise_for_status()
-                    pdf_file = io.BytesIO(response.content)
+                    async with _http_client.stream("GET", file_url) as response:
+                        response.raise_for_status()
+                        async for data in response.aiter_bytes(DOWNLOAD_CHUNK_BYTES):
+                            buffer.write(data)
+                    buffer.seek(0)
+                    pdf_file = buffer
                     break
-                except (requests.exceptions.Timeout, requests.exceptions.ConnectionError) as e:
+                except (httpx.TimeoutException, httpx.NetworkError) as e:
+                    buffer.close()
                     if attempt < max_retries - 1:
-                        print(f"Download attempt {attempt + 1} failed, retrying: {e}")
+                        logger.warning("Download attempt %d failed, retrying: %s", attempt + 1, e)
                         await asyncio.sleep(2 ** attempt)
                     else:
                         raise
+                except BaseException:
+                    buffer.close()
+                    raise
 
         # Priority 3: If file_url is a relative /uploads/ path, resolve it locally
-        elif document.file_url and document.file_url.startswith("/uploads/"):
-            from app.core.config import settings
-            local_path = os.path.join(settings.UPLOAD_DIR, document.file_url.replace("/uploads/", "", 1))
+        elif file_url and file_url.startswith("/uploads/"):
+            local_path = os.path.join(settings.UPLOAD_DIR, file_url.replace("/uploads/", "", 1))
             if os.path.isfile(local_path):
-                print(f"[PDF] Reading from uploads dir: {local_path}")
+                logger.info("[PDF] Reading from uploads dir: %s", local_path)
                 with open(local_path, "rb") as f:
                     pdf_file = io.BytesIO(f.read())
 
         if not pdf_file:
-            if document.file_url and "mock_url" in document.file_url:
+            if file_url and "mock_url" in file_url:
                 text = "This is a sample text from the PDF (Real AI Processing Active but File was Mock)."
                 embedding = await gemini_service.generate_embedding(text)
                 db_embedding = DocumentEmbedding(
-                    document_id=document.id,
+                    document_id=doc_uuid,
                     content=text,
                     embedding=embedding
                 )
@@ -73,158 +236,163 @@ async def _process_document(document_id: str, file_path: str | None = None):
                 db.commit()
                 return
 
-        reader = PdfReader(pdf_file)
-        
-        # First, try normal text extraction
-        page_texts = []
-        total_text_chars = 0
-        
-        for page_num, page in enumerate(reader.pages):
-            text = page.extract_text() or ""
-            if text and len(text.strip()) >= 10:
-                page_texts.append(text)
-                total_text_chars += len(text.strip())
+        # First, try normal text extraction (CPU-bound; off the event loop)
+        texts, scanned_pages = await asyncio.to_thread(_extract_page_texts, pdf_file)
+        page_texts, total_text_chars = _keep_pages(texts)
         
-        print(f"Normal extraction: {len(page_texts)} pages, {total_text_chars} total chars")
+        logger.info("Normal extraction: %d pages, %d total chars", len(page_texts), total_text_chars)
+
+        # Mostly digital PDF with a few scanned pages: OCR just those pages
+        # and put their text back in page order
+        if total_text_chars >= 100 and scanned_pages:
+            logger.info("[PDF] OCR for %d scanned pages...", len(scanned_pages))
+            try:
+                pdf_file.seek(0)
+                ocr_pages = await gemini_service.ocr_pdf_pages(pdf_file.read(), scanned_pages)
+                for page_num, text in ocr_pages.items():
+                    texts[page_num] = text
+                page_texts, total_text_chars = _keep_pages(texts)
+                logger.info("[PDF] Page OCR recovered %d pages", len(ocr_pages))
+            except Exception as e:
+                logger.warning("[PDF] Page OCR FAILED, continuing with extracted text: %s", e)
         
         # If we got very little text, try OCR — DeepSeek first, Gemini fallback
         if total_text_chars < 100:
-            print(f"[PDF] Insufficient text ({total_text_chars} chars < 100), triggering OCR...")
+            logger.info("[PDF] Insufficient text (%d chars < 100), triggering OCR...", total_text_chars)
             ocr_text = ""
 
             # --- Önce DeepSeek Vision ile dene ---
             if deepseek_service.enabled:
-                print("[PDF] Trying DeepSeek Vision OCR...")
+                logger.info("[PDF] Trying DeepSeek Vision OCR...")
                 try:
                     pdf_file.seek(0)
                     pdf_bytes = pdf_file.read()
                     ocr_text = await deepseek_service.ocr_pdf_file(pdf_bytes)
                     if ocr_text and len(ocr_text.strip()) >= 50:
-                        print(f"[PDF] DeepSeek OCR SUCCESS: {len(ocr_text)} chars")
+                        logger.info("[PDF] DeepSeek OCR SUCCESS: %d chars", len(ocr_text))
                     else:
-                        print(f"[PDF] DeepSeek OCR returned insufficient text ({len(ocr_text) if ocr_text else 0} chars), falling back to Gemini...")
+                        logger.warning("[PDF] DeepSeek OCR returned insufficient text (%d chars), falling back to Gemini...", len(ocr_text) if ocr_text else 0)
                         ocr_text = ""
                 except Exception as ds_err:
-                    print(f"[PDF] DeepSeek OCR FAILED: {ds_err}, falling back to Gemini...")
+                    logger.warning("[PDF] DeepSeek OCR FAILED: %s, falling back to Gemini...", ds_err)
                     ocr_text = ""
             else:
-                print("[PDF] DeepSeek not configured, skipping to Gemini OCR")
+                logger.info("[PDF] DeepSeek not configured, skipping to Gemini OCR")
 
             # --- DeepSeek başarısız olduysa Gemini'ye fallback ---
             if not ocr_text:
-                print("[PDF] Calling Gemini OCR as fallback...")
+                logger.info("[PDF] Calling Gemini OCR as fallback...")
                 try:
                     pdf_file.seek(0)
                     pdf_bytes = pdf_file.read()
-                    print(f"[PDF] Read {len(pdf_bytes)} bytes from PDF file")
+                    logger.debug("[PDF] Read %d bytes from PDF file", len(pdf_bytes))
                     ocr_text = await gemini_service.ocr_pdf_file(pdf_bytes)
-                    print(f"[PDF] Gemini OCR returned: {len(ocr_text) if ocr_text else 0} chars")
+                    logger.info("[PDF] Gemini OCR returned: %d chars", len(ocr_text) if ocr_text else 0)
                 except Exception as e:
-                    print(f"[PDF] Gemini OCR FAILED: {e}")
-                    import traceback
-                    traceback.print_exc()
+                    logger.exception("[PDF] Gemini OCR FAILED: %s", e)
 
             # --- OCR sonucunu chunk'lara böl ---
             if ocr_text and len(ocr_text.strip()) >= 50:
-                chunk_size = 2000
-                ocr_chunks = []
-                for i in range(0, len(ocr_text), chunk_size):
-                    chunk = ocr_text[i:i+chunk_size]
-                    if len(chunk.strip()) >= 20:
-                        ocr_chunks.append(chunk)
-                page_texts = ocr_chunks
-                print(f"[PDF] OCR text split into {len(page_texts)} chunks")
+                page_texts = _split_text(ocr_text)
+                logger.info("[PDF] OCR text split into %d chunks", len(page_texts))
             else:
-                print(f"[PDF] OCR failed entirely: {len(ocr_text) if ocr_text else 0} chars")
+                logger.warning("[PDF] OCR failed entirely: %d chars", len(ocr_text) if ocr_text else 0)
 
-        print(f"Processing {len(page_texts)} pages for document {document_id}")
+        logger.info("Processing %d pages for document %s", len(page_texts), document_id)
 
-        # Process embeddings in parallel chunks (max 3 concurrent to avoid API rate limiting)
-        chunk_size = 3
-        page_index = 0  # Track page/chunk order for hybrid context retrieval
-        for i in range(0, len(page_texts), chunk_size):
-            chunk = page_texts[i:i+chunk_size]
-            print(f"Processing chunk {i//chunk_size + 1}: pages {i} to {i+len(chunk)-1}")
+        # Embed each distinct text once: repeated pages and chunks (compared
+        # ignoring case and whitespace) share the first one's embedding
+        unique_slots: dict[str, int] = {}
+        unique_texts: list[str] = []
+        page_slots: list[int] = []
+        for text in page_texts:
+            key = " ".join(text.split()).lower()
+            slot = unique_slots.get(key)
+            if slot is None:
+                slot = unique_slots[key] = len(unique_texts)
+                unique_texts.append(text)
+            page_slots.append(slot)
+        if len(unique_texts) < len(page_texts):
+            logger.info("%d duplicate pages reuse an earlier embedding", len(page_texts) - len(unique_texts))
 
-            # Create concurrent embedding tasks with retry logic
-            embedding_tasks = []
-            for text in chunk:
-                task = gemini_service.generate_embedding(text)
-                embedding_tasks.append(task)
+        # Embed in batches: one API request per batch instead of one per
+        # page, with up to EMBED_CONCURRENCY batches in flight at once
+        chunk_size = EMBEDDING_BATCH_SIZE
+        batches = [unique_texts[i:i+chunk_size] for i in range(0, len(unique_texts), chunk_size)]
+        embed_slots = asyncio.Semaphore(settings.EMBED_CONCURRENCY)
 
-            # Wait for all embeddings in this chunk to complete with timeout
-            try:
-                embeddings = await asyncio.gather(*embedding_tasks, return_exceptions=True)
-            except Exception as e:
-                print(f"Error in embedding batch: {e}")
-                document.status = "failed"
-                db.commit()
-                return
+        async def _embed_batch(batch: list[str]) -> list:
+            async with embed_slots:
+                try:
+                    return await gemini_service.generate_embeddings_batch(batch)
+                except Exception as batch_error:
+                    # Fall back to embedding pages one by one, so a single bad
+                    # page doesn't fail the whole batch
+                    logger.warning("Batch embedding failed, embedding pages individually: %s", batch_error)
+                    return await asyncio.gather(
+                        *(gemini_service.generate_embedding(text) for text in batch),
+                        return_exceptions=True
+                    )
 
-            # Save embeddings to database
-            for idx, (text, embedding) in enumerate(zip(chunk, embeddings)):
-                # If embedding failed, try OCR fallback
-                if isinstance(embedding, Exception):
-                    print(f"Embedding failed for page, attempting OCR fallback: {embedding}")
-                    try:
-                        # Use Gemini to clean/extract text from problematic content
-                        ocr_text = await gemini_service.extract_text_with_vision(text)
-                        if ocr_text and len(ocr_text.strip()) >= 10:
-                            # Retry embedding with OCR-extracted text
-                            embedding = await gemini_service.generate_embedding(ocr_text)
-                            text = ocr_text  # Use the cleaned text
-                            print(f"OCR fallback successful, got embedding")
-                        else:
-                            print(f"OCR fallback returned insufficient text, skipping page")
-                            continue
-                    except Exception as ocr_error:
-                        print(f"OCR fallback also failed: {ocr_error}")
-                        continue
+        batch_embeddings = await asyncio.gather(*(_embed_batch(batch) for batch in batches))
+        embeddings = [embedding for batch in batch_embeddings for embedding in batch]
 
-                db_embedding = DocumentEmbedding(
-                    document_id=document.id,
-                    page_number=page_index + idx,  # Track order for full-doc retrieval
-                    content=text,
-                    embedding=embedding
-                )
-                db.add(db_embedding)
-            
-            # Update page_index for next chunk
-            page_index += len(chunk)
-
-            # Commit after each chunk
+        # If embedding failed, try OCR fallback (None marks a skipped text)
+        cleaned_texts: dict[int, str] = {}
+        for slot, embedding in enumerate(embeddings):
+            if not isinstance(embedding, Exception):
+                continue
+            logger.warning("Embedding failed for page, attempting OCR fallback: %s", embedding)
+            embeddings[slot] = None
             try:
-                db.commit()
-                print(f"Committed chunk {i//chunk_size + 1}")
-            except Exception as e:
-                print(f"Error committing chunk: {e}")
-                db.rollback()
+                # Use Gemini to clean/extract text from problematic content
+                ocr_text = await gemini_service.extract_text_with_vision(unique_texts[slot])
+                if ocr_text and len(ocr_text.strip()) >= 10:
+                    # Retry embedding with OCR-extracted text
+                    embeddings[slot] = await gemini_service.generate_embedding(ocr_text)
+                    cleaned_texts[slot] = ocr_text  # Use the cleaned text
+                    logger.debug("OCR fallback successful, got embedding")
+                else:
+                    logger.warning("OCR fallback returned insufficient text, skipping page")
+            except Exception as ocr_error:
+                logger.warning("OCR fallback also failed: %s", ocr_error)
 
-            # Small delay between chunks to avoid rate limiting
-            await asyncio.sleep(1)
+        # Collect rows for the database, one per page in document order
+        embedding_rows: list[dict] = []
+        for page_index, (text, slot) in enumerate(zip(page_texts, page_slots)):
+            if embeddings[slot] is None:
+                continue
+            embedding_rows.append({
+                "document_id": doc_uuid,
+                "page_number": page_index,  # Track order for full-doc retrieval
+                "content": cleaned_texts.get(slot, text),
+                "embedding": embeddings[slot]
+            })
 
+        # One bulk write and one commit for the whole document, together
+        # with the status change, instead of a commit per chunk
+        if embedding_rows:
+            _save_embeddings(db, embedding_rows)
         document.status = "completed"
         db.commit()
-        print(f"Successfully processed document {document_id}")
+        logger.info("Saved %d embeddings for document %s", len(embedding_rows), document_id)
 
     except Exception as e:
-        print(f"Error processing document {document_id}: {e}")
+        logger.exception("Error processing document %s: %s", document_id, e)
         if document:
             try:
-                # Try to rollback any pending transaction first
+                # Roll back the failed transaction and reuse the same session
+                # (a dead connection is swapped for a fresh pooled one)
                 db.rollback()
-                # Create a fresh session to update status
-                fresh_db = SessionLocal()
-                try:
-                    doc = fresh_db.query(Document).filter(Document.id == doc_uuid).first()
-                    if doc:
-                        doc.status = "failed"
-                        fresh_db.commit()
-                finally:
-                    fresh_db.close()
+                db.query(Document).filter(Document.id == doc_uuid).update(
+                    {"status": "failed"}, synchronize_session=False
+                )
+                db.commit()
             except Exception as status_error:
-                print(f"Failed to update document status: {status_error}")
+                logger.error("Failed to update document status: %s", status_error)
     finally:
+        if pdf_file is not None:
+            pdf_file.close()
         try:
             db.close()
         except Exception:
@@ -2,64 +2,114 @@
 Query limit service for tracking and enforcing daily query limits.
 """
 import datetime
+import time
 import uuid
+from collections import OrderedDict
+from sqlalchemy import case, func, or_, update
 from sqlalchemy.orm import Session
 from app.models.user import UserProfile
 
 # Daily query limit per user
 DAILY_QUERY_LIMIT = 10
 
+# Users seen at their limit, so repeat requests are refused without a DB
+# round trip: user_id -> (date, monotonic expiry). Per process and short-lived
+# because a refunded slot elsewhere can free up room again. Oldest entries are
+# dropped beyond EXHAUSTED_CACHE_SIZE.
+EXHAUSTED_CACHE_TTL = 60  # seconds
+EXHAUSTED_CACHE_SIZE = 4096
+_exhausted_users: OrderedDict[uuid.UUID, tuple[datetime.date, float]] = OrderedDict()
 
-def check_query_limit(user_profile: UserProfile, db: Session) -> dict:
-    """
-    Check if user has remaining queries and return status.
-    
-    Returns:
-        dict with 'allowed', 'remaining', 'limit', 'reset_time'
-    """
-    today = datetime.date.today()
-    
-    # Reset counter if it's a new day
-    if user_profile.last_query_date != today:
-        user_profile.daily_query_count = 0
-        user_profile.last_query_date = today
-        db.commit()
-    
-    remaining = DAILY_QUERY_LIMIT - user_profile.daily_query_count
-    
-    return {
-        "allowed": remaining > 0,
-        "remaining": max(0, remaining),
-        "limit": DAILY_QUERY_LIMIT,
-        "used": user_profile.daily_query_count
-    }
+
+class ProfileNotFoundError(LookupError):
+    """Raised when a query slot is claimed for a user with no profile row."""
+
+
+def _known_exhausted(user_id: uuid.UUID, today: datetime.date) -> bool:
+    entry = _exhausted_users.get(user_id)
+    if entry is None:
+        return False
+    day, expires_at = entry
+    if day != today or time.monotonic() >= expires_at:
+        _exhausted_users.pop(user_id, None)
+        return False
+    return True
 
 
-def increment_query_count(user_profile: UserProfile, db: Session) -> dict:
+def _remember_exhausted(user_id: uuid.UUID, today: datetime.date) -> None:
+    # Re-inserting puts the entry at the end, so the front is always oldest
+    _exhausted_users.pop(user_id, None)
+    _exhausted_users[user_id] = (today, time.monotonic() + EXHAUSTED_CACHE_TTL)
+    while len(_exhausted_users) > EXHAUSTED_CACHE_SIZE:
+        _exhausted_users.popitem(last=False)
+
+
+def claim_query_slot(user_id: uuid.UUID, db: Session) -> tuple[dict, str] | None:
     """
-    Increment the user's query count and return updated status.
-    Should be called AFTER a successful AI query.
-    
+    Atomically consume one of today's queries for the user.
+
+    A single UPDATE ... RETURNING resets the counter on a new day, checks the
+    limit and increments it, so concurrent requests can't both take the
+    last slot. Commits immediately so the row lock isn't held while the
+    AI call runs. The user's role comes back in the same statement, so
+    callers don't need a separate profile SELECT.
+
     Returns:
-        dict with 'remaining', 'limit', 'used'
+        (dict with 'remaining', 'limit', 'used', role), or None if the limit
+        is reached
+
+    Raises:
+        ProfileNotFoundError: If the user has no profile
     """
     today = datetime.date.today()
-    
-    # Reset counter if it's a new day
-    if user_profile.last_query_date != today:
-        user_profile.daily_query_count = 0
-        user_profile.last_query_date = today
-    
-    user_profile.daily_query_count += 1
+    if _known_exhausted(user_id, today):
+        return None
+
+    is_new_day = UserProfile.last_query_date.is_distinct_from(today)
+
+    row = db.execute(
+        update(UserProfile)
+        .where(
+            UserProfile.id == user_id,
+            or_(is_new_day, UserProfile.daily_query_count < DAILY_QUERY_LIMIT)
+        )
+        .values(
+            daily_query_count=case((is_new_day, 1), else_=UserProfile.daily_query_count + 1),
+            last_query_date=today
+        )
+        .returning(UserProfile.daily_query_count, UserProfile.role)
+        .execution_options(synchronize_session=False)
+    ).one_or_none()
     db.commit()
-    
-    remaining = DAILY_QUERY_LIMIT - user_profile.daily_query_count
-    
+
+    if row is None:
+        # Refused: tell a missing profile apart from a used-up limit
+        if db.query(UserProfile.id).filter(UserProfile.id == user_id).first() is None:
+            raise ProfileNotFoundError(user_id)
+        _remember_exhausted(user_id, today)
+        return None
+
+    used, role = row
     return {
-        "remaining": max(0, remaining),
+        "remaining": max(0, DAILY_QUERY_LIMIT - used),
         "limit": DAILY_QUERY_LIMIT,
-        "used": user_profile.daily_query_count
-    }
+        "used": used
+    }, role
+
+
+def release_query_slot(user_id: uuid.UUID, db: Session) -> None:
+    """Give back a slot taken by claim_query_slot when the request failed."""
+    _exhausted_users.pop(user_id, None)
+    db.execute(
+        update(UserProfile)
+        .where(
+            UserProfile.id == user_id,
+            UserProfile.last_query_date == datetime.date.today()
+        )
+        .values(daily_query_count=func.greatest(UserProfile.daily_query_count - 1, 0))
+        .execution_options(synchronize_session=False)
+    )
+    db.commit()
 
 
 def get_query_status(user_profile: UserProfile) -> dict:
@@ -94,23 +144,10 @@ def check_and_consume_query(user_id: uuid.UUID, db: Session) -> tuple[bool, str]
         If can_use is True, query was consumed.
         If can_use is False, message explains why.
     """
-    import uuid
-    user_profile = db.query(UserProfile).filter(UserProfile.id == user_id).first()
-
-    if not user_profile:
+    try:
+        if claim_query_slot(user_id, db) is not None:
+            return True, ""
+    except ProfileNotFoundError:
         return False, "Kullanıcı bulunamadı"
 
-    today = datetime.date.today()
-
-    if user_profile.last_query_date != today:
-        user_profile.daily_query_count = 0
-        user_profile.last_query_date = today
-
-    if user_profile.daily_query_count >= DAILY_QUERY_LIMIT:
-        remaining = 0
-        return False, f"Günlük sorgu limiti doldu. Yarin tekrar deneyin. (Limit: {DAILY_QUERY_LIMIT})"
-
-    user_profile.daily_query_count += 1
-    db.commit()
-
-    return True, ""
+    return False, f"Günlük sorgu limiti doldu. Yarin tekrar deneyin. (Limit: {DAILY_QUERY_LIMIT})"
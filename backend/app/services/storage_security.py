@@ -4,6 +4,7 @@ Storage security — validates that file URLs point to our own uploads directory
 Replaces the old Supabase bucket URL validation.
 """
 import os
+from functools import lru_cache
 from pathlib import Path
 
 from app.core.config import settings
@@ -13,6 +14,12 @@ class InvalidStorageURLError(ValueError):
     """Raised when a document URL points outside the allowed storage."""
 
 
+@lru_cache(maxsize=1)
+def _upload_root() -> Path:
+    """UPLOAD_DIR resolved once; it doesn't change while the process runs."""
+    return Path(settings.UPLOAD_DIR).resolve()
+
+
 def ensure_allowed_storage_url(file_url: str) -> str:
     """
     Ensure that the given URL or path targets a safe location.
@@ -25,13 +32,13 @@ def ensure_allowed_storage_url(file_url: str) -> str:
         raise InvalidStorageURLError("File URL is empty")
 
     # If it's a full URL, just ensure it contains /uploads/
-    if file_url.startswith("http://") or file_url.startswith("https://"):
+    if file_url.startswith(("http://", "https://")):
         if "/uploads/" not in file_url:
             raise InvalidStorageURLError("Document URL must target the uploads directory")
         return file_url
 
     # If it's a local path, resolve it and make sure it stays inside UPLOAD_DIR
-    upload_root = Path(settings.UPLOAD_DIR).resolve()
+    upload_root = _upload_root()
     requested = (upload_root / file_url).resolve()
 
     if not str(requested).startswith(str(upload_root)):
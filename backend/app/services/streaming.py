@@ -0,0 +1,64 @@
+"""
+Bridge blocking SDK streams (google-genai) onto the event loop.
+
+The SDK clients used here are synchronous, so their token iterators are
+consumed in a worker thread and handed to the loop through a queue.
+"""
+import asyncio
+import threading
+from concurrent.futures import Executor
+from typing import AsyncIterator, Callable, Iterable
+
+_DONE = object()
+
+
+class _StreamError:
+    def __init__(self, error: BaseException):
+        self.error = error
+
+
+async def iterate_in_executor(
+    executor: Executor,
+    make_iterator: Callable[[], Iterable[str]],
+    timeout: float = 60.0
+) -> AsyncIterator[str]:
+    """
+    Yield the items of a blocking iterator without blocking the event loop.
+
+    timeout applies to the wait for each item, not to the whole stream.
+    Stopping early (client disconnect, cancellation) tells the worker thread
+    to stop pulling from the SDK.
+    """
+    loop = asyncio.get_running_loop()
+    queue: asyncio.Queue = asyncio.Queue()
+    stop = threading.Event()
+
+    def _put(item) -> None:
+        try:
+            loop.call_soon_threadsafe(queue.put_nowait, item)
+        except RuntimeError:
+            # Loop already closed; nobody is listening any more
+            stop.set()
+
+    def _produce() -> None:
+        try:
+            for item in make_iterator():
+                if stop.is_set():
+                    break
+                _put(item)
+        except Exception as e:
+            _put(_StreamError(e))
+        finally:
+            _put(_DONE)
+
+    loop.run_in_executor(executor, _produce)
+    try:
+        while True:
+            item = await asyncio.wait_for(queue.get(), timeout=timeout)
+            if item is _DONE:
+                break
+            if isinstance(item, _StreamError):
+                raise item.error
+            yield item
+    finally:
+        stop.set()
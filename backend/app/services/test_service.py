@@ -6,12 +6,16 @@ This service handles:
 - Test submission and scoring
 - Test history management
 """
+import asyncio
+import re
 import uuid
 import json
 from datetime import datetime
 from sqlalchemy.orm import Session
 from app.models.test import Test, TestQuestion, TestAttempt
 from app.models.document import Document, DocumentEmbedding
+from app.models.chat import MultiDocumentSession, multi_session_documents
+from app.models.user import UserProfile, UserRole
 from app.services.deepseek_service import deepseek_service
 from app.services.gemini_service import gemini_service
 
@@ -43,7 +47,7 @@ JSON formatında dön (açıklama alanı Türkçe ve 1-2 cümle olsun):
 
 def extract_document_content(db: Session, document_id: uuid.UUID) -> str:
     """Extract full text content from document embeddings for test generation."""
-    embeddings = db.query(DocumentEmbedding).filter(
+    embeddings = db.query(DocumentEmbedding.content).filter(
         DocumentEmbedding.document_id == document_id
     ).order_by(DocumentEmbedding.page_number).all()
 
@@ -51,17 +55,15 @@ def extract_document_content(db: Session, document_id: uuid.UUID) -> str:
         return ""
 
     content_parts = []
-    for emb in embeddings:
-        if emb.content:
-            content_parts.append(emb.content)
+    for (content,) in embeddings:
+        if content:
+            content_parts.append(content)
 
     return "\n\n".join(content_parts)
 
 
 def extract_session_content(db: Session, session_id: uuid.UUID) -> str:
     """Extract combined content from all documents in a multi-document session."""
-    from app.models.chat import MultiDocumentSession, multi_session_documents
-
     session = db.query(MultiDocumentSession).filter(MultiDocumentSession.id == session_id).first()
     if not session:
         raise ValueError("Session not found")
@@ -77,13 +79,13 @@ def extract_session_content(db: Session, session_id: uuid.UUID) -> str:
 
     contents = []
     for doc_id in doc_ids:
-        doc_embeddings = db.query(DocumentEmbedding).filter(
+        doc_embeddings = db.query(DocumentEmbedding.content).filter(
             DocumentEmbedding.document_id == doc_id
         ).order_by(DocumentEmbedding.page_number).all()
 
-        for emb in doc_embeddings:
-            if emb.content:
-                contents.append(emb.content)
+        for (content,) in doc_embeddings:
+            if content:
+                contents.append(content)
 
     return "\n\n---\n\n".join(contents) if contents else ""
 
@@ -97,14 +99,14 @@ def extract_public_documents_content(db: Session, document_ids: list[uuid.UUID])
         if not doc:
             continue
 
-        doc_embeddings = db.query(DocumentEmbedding).filter(
+        doc_embeddings = db.query(DocumentEmbedding.content).filter(
             DocumentEmbedding.document_id == doc_id
         ).order_by(DocumentEmbedding.page_number).all()
 
         content_parts = []
-        for emb in doc_embeddings:
-            if emb.content:
-                content_parts.append(emb.content)
+        for (content,) in doc_embeddings:
+            if content:
+                content_parts.append(content)
 
         if content_parts:
             contents.append(f"--- {doc.title} ---\n\n" + "\n\n".join(content_parts))
@@ -139,7 +141,6 @@ def _calculate_max_tokens(question_count: int) -> int:
 
 def _extract_partial_questions(text: str) -> list[dict]:
     """Extract complete questions from partial/malformed JSON response."""
-    import re
     questions = []
     
     pattern = r'\{[^{}]*"question"\s*:\s*"[^"]*"[^{}]*"options"\s*:\s*\[[^\]]*\][^{}]*"correct_answer"\s*:\s*"[^"]*"[^{}]*"explanation"\s*:\s*"[^"]*"[^{}]*\}'
@@ -195,9 +196,6 @@ DERS İÇERİĞİ:
     result = None
 
     try:
-        import asyncio
-        loop = asyncio.get_event_loop()
-
         if model == "gemma" or model == "gemini":
             result = await gemini_service.generate_structured_content(
                 system_prompt=TEST_SYSTEM_PROMPT,
@@ -208,8 +206,8 @@ DERS İÇERİĞİ:
             if not deepseek_service.enabled:
                 raise ValueError("DeepSeek service is not enabled")
 
-            def _generate():
-                response = deepseek_service.client.chat.completions.create(
+            response = await asyncio.wait_for(
+                deepseek_service.client.chat.completions.create(
                     model=deepseek_service.model,
                     messages=[
                         {"role": "system", "content": TEST_SYSTEM_PROMPT},
@@ -217,13 +215,10 @@ DERS İÇERİĞİ:
                     ],
                     temperature=0.7,
                     max_tokens=max_tokens
-                )
-                return response.choices[0].message.content
-
-            result = await asyncio.wait_for(
-                loop.run_in_executor(None, _generate),
+                ),
                 timeout=180.0
             )
+            result = response.choices[0].message.content
 
         if not result:
             raise ValueError("Empty response from AI")
@@ -292,8 +287,6 @@ async def generate_test_questions(
     batch_size_1 = question_count // 2
     batch_size_2 = question_count - batch_size_1
 
-    import asyncio
-
     results = await asyncio.gather(
         _generate_test_batch(document_content, batch_size_1, model, 0, 2),
         _generate_test_batch(document_content, batch_size_2, model, 1, 2),
@@ -475,7 +468,6 @@ def get_test_with_questions(
         raise ValueError("Test not found")
 
     if not test.is_public and test.user_id != user_id:
-        from app.models.user import UserProfile, UserRole
         user = db.query(UserProfile).filter(UserProfile.id == user_id).first()
         if not user or user.role != UserRole.ADMIN:
             raise ValueError("Access denied")
@@ -612,8 +604,6 @@ def toggle_test_public(
 
 def get_test_stats(db: Session, user_id: uuid.UUID) -> dict:
     """Get comprehensive test statistics for a user."""
-    from sqlalchemy import func
-
     total_tests = db.query(Test).filter(Test.user_id == user_id).count()
     completed_tests = db.query(Test).filter(
         Test.user_id == user_id,
@@ -741,9 +731,6 @@ Lütfen şu başlıklar altında açıkla:
 Markdown formatında, başlıkları kalın (**Başlık**) olarak yaz."""
 
     try:
-        import asyncio
-        loop = asyncio.get_event_loop()
-
         if model == "gemma" or model == "gemini":
             result = await gemini_service.generate_structured_content(
                 system_prompt=EXPLAIN_SYSTEM_PROMPT,
@@ -755,8 +742,8 @@ Markdown formatında, başlıkları kalın (**Başlık**) olarak yaz."""
         if not deepseek_service.enabled:
             raise ValueError("DeepSeek service is not enabled")
 
-        def _generate():
-            response = deepseek_service.client.chat.completions.create(
+        response = await asyncio.wait_for(
+            deepseek_service.client.chat.completions.create(
                 model=deepseek_service.model,
                 messages=[
                     {"role": "system", "content": EXPLAIN_SYSTEM_PROMPT},
@@ -764,13 +751,10 @@ Markdown formatında, başlıkları kalın (**Başlık**) olarak yaz."""
                 ],
                 temperature=0.7,
                 max_tokens=2048
-            )
-            return response.choices[0].message.content
-
-        result = await asyncio.wait_for(
-            loop.run_in_executor(None, _generate),
+            ),
             timeout=120.0
         )
+        result = response.choices[0].message.content
 
         return result or "Açıklama oluşturulamadı."
 